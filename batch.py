@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+'''Run overleaf2word over a list of sources, optionally across a process pool.
+
+Each repo sync and each file conversion is a separate job that reports a
+:class:`JobResult`. A job that fails is recorded and the rest of the batch
+carries on. The repos are synced concurrently by a :class:`sync.SyncEngine`
+and the files of each repo are converted as soon as its sync finishes.'''
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+import os
+import traceback
+
+from diagnostics import Diagnostics
+from manifest import Manifest
+from overleaf2word import sync_target, find_bib, tex_to_word
+import profiling
+from sync import SyncEngine
+
+OK = 'ok'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+# *path* is None for the repo sync job, the latex path for conversion jobs.
+# *profile* is the profiling.Profile.as_dict() of the job if it was profiled.
+# *diagnostics* is the diagnostics.Diagnostics.as_dict() of a conversion.
+# *written* is whether a conversion wrote its .docx, False if the output was
+# the same as the one already there.
+JobResult = namedtuple('JobResult',['project','path','status','error','profile',
+    'diagnostics','written'])
+
+def _result(project,path,status,error=None,profile=None,diagnostics=None,
+    written=False) :
+    if isinstance(profile,profiling.Profile) :
+        profile = profile.as_dict()
+    else :
+        profile = None
+    if diagnostics is not None :
+        diagnostics = diagnostics.as_dict()
+    return JobResult(project,path,status,error,profile,diagnostics,written)
+
+def project_name(source) :
+    return source.get('name') or source['git_clone_url']
+
+async def sync_job(engine,source,profile=False) :
+    '''Sync one source repo with the :class:`sync.SyncEngine` *engine*.
+    Returns a (JobResult, SyncResult, bib_fn) tuple, the last two are None if
+    the sync failed. The JobResult is SKIPPED if the remote has not moved
+    since the repo was last converted. If *profile* is True the time spent
+    syncing, waiting for a free git slot included, is in the JobResult.'''
+    project = project_name(source)
+    prof = profiling.Profile(repo=project) if profile else profiling.NULL
+    try :
+        with prof.run(), prof.stage('sync') :
+            url = source['git_clone_url']
+            repo_dir, manifest, last_commit = sync_target(url,
+                source.get('name'),
+                source.get('latex_paths',[])
+            )
+            synced = await engine.sync_repo(url,repo_dir,last_commit)
+            bib_fn = find_bib(synced.repo_dir)
+    except Exception :
+        return _result(project,None,FAILED,traceback.format_exc(),prof), None, None
+    if not synced.changed :
+        msg = 'up to date at {}'.format(synced.commit)
+        return _result(project,None,SKIPPED,msg,prof), synced, bib_fn
+    return _result(project,None,OK,None,prof), synced, bib_fn
+
+def convert_job(project,repo_dir,fn,bib_fn=None,manifest=None,profile=False,
+    cprofile_dir=None,stream=False,verbosity=None,template=None,writer=None) :
+    '''Convert one latex file of a synced repo. Returns a (JobResult, hashes)
+    tuple, *hashes* is the manifest entry to record for the file or None if
+    nothing new should be recorded.
+
+    Files whose inputs are unchanged according to *manifest* are skipped.
+    Workers get a copy of the manifest, so it is up to the caller to record
+    the returned hashes and save it. If *profile* is True the stage timings
+    are in the JobResult, and with a *cprofile_dir* a cProfile capture of the
+    conversion is written there. *stream*, the .docx *template* and the
+    output backend *writer* are passed on to tex_to_word. The diagnostics of
+    the conversion are in the JobResult, and printed as *verbosity* says, see
+    :mod:`diagnostics`.'''
+    tex_fn = os.path.join(repo_dir,fn)
+    if not os.path.exists(tex_fn) :
+        return _result(project,fn,SKIPPED,'{} does not exist'.format(tex_fn)), None
+    # always timed, it counts whether the .docx was written too
+    prof = profiling.Profile(repo=project,file=fn,cprofile_dir=cprofile_dir)
+    report = prof if profile or cprofile_dir else None
+    diag = Diagnostics(fn,verbosity)
+    try :
+        written = tex_to_word(tex_fn,repo_dir,bib_fn,manifest=manifest,
+            profile=prof,
+            stream=stream,
+            diagnostics=diag,
+            template=template,
+            writer=writer
+        )
+    except Exception :
+        return _result(project,fn,FAILED,traceback.format_exc(),report,diag), None
+    if not written :
+        return _result(project,fn,SKIPPED,'unchanged',report), None
+    hashes = manifest.entries.get(manifest.key(tex_fn)) if manifest else None
+    return _result(project,fn,OK,None,report,diag,
+        prof.counts.get('docs_written',0) > 0), hashes
+
+class _InlineExecutor(object) :
+    '''Stands in for the process pool with *jobs* <= 1, runs each job in
+    this process as it is submitted'''
+
+    def submit(self,fn,*args) :
+        fut = Future()
+        try :
+            fut.set_result(fn(*args))
+        except Exception as e :
+            fut.set_exception(e)
+        return fut
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self,*exc) :
+        pass
+
+def _init_worker(cache_dir) :
+    # the files of the batch are already converted in parallel, don't start
+    # another pool per file to tokenize its sub-files
+    import cache
+    import includes
+    includes.TOKEN_WORKERS = 1
+    # the workers are not forked, use the cache dir of the parent even if it
+    # was changed after import
+    cache.CACHE_DIR = cache_dir
+
+def _pool(jobs) :
+    '''Return a pool of *jobs* processes for the file jobs. The sync engine
+    runs its event loop in a thread, and forking a process with other threads
+    running can deadlock, so the workers are started by a fork server, or
+    spawned where there is none.'''
+    import cache
+    if 'forkserver' in multiprocessing.get_all_start_methods() :
+        context = multiprocessing.get_context('forkserver')
+    else :
+        context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=jobs,mp_context=context,
+        initializer=_init_worker,initargs=(cache.CACHE_DIR,))
+
+class _Project(object) :
+    '''Parent side bookkeeping for the file jobs of one synced repo. The
+    manifest is only written here, and the synced commit is recorded once
+    every file of the repo converted without failing.'''
+
+    def __init__(self,source,sync_result,synced,bib_fn) :
+        self.project = sync_result.project
+        self.files = []
+        if sync_result.status == OK :
+            self.files = list(source.get('latex_paths',[]))
+        self.synced = synced
+        self.bib_fn = bib_fn
+        # "stream": true in the source streams its files, for huge documents
+        self.stream = bool(source.get('stream',False))
+        # "writer": "ooxml" in the source picks the output backend, see
+        # overleaf2word.WRITERS
+        self.writer = source.get('writer')
+        # "template": "house.docx" in the source makes its documents from
+        # that template instead of the one given to run_sources
+        self.template = source.get('template')
+        self.manifest = Manifest(synced.repo_dir) if self.files else None
+        self.remaining = len(self.files)
+        self.failed = False
+
+    def jobs(self,profile=False,cprofile_dir=None,verbosity=None,template=None,
+        writer=None) :
+        '''List the convert_job argument tuples for the repo'''
+        return [(self.project,self.synced.repo_dir,fn,self.bib_fn,self.manifest,
+                 profile,cprofile_dir,self.stream,verbosity,
+                 self.template or template,self.writer or writer)
+                for fn in self.files]
+
+    def record(self,res,hashes) :
+        if hashes is not None :
+            self.manifest.record(os.path.join(self.synced.repo_dir,res.path),hashes)
+        self.failed = self.failed or res.status == FAILED
+        self.remaining -= 1
+        if self.remaining == 0 :
+            if not self.failed :
+                self.manifest.commit = self.synced.commit
+            self.manifest.save()
+
+def run_sources(sources,jobs=1,profile=False,cprofile_dir=None,verbosity=None,
+    template=None,sync_jobs=4,sync_timeout=300,sync_retries=2,writer=None,
+    sync_per_host=2) :
+    '''Sync and convert every source in *sources*, a list of dicts as found in
+    sources.json. The repos are synced concurrently, at most *sync_jobs* git
+    commands at a time and *sync_per_host* against the same host, each killed
+    after *sync_timeout* seconds and the ones talking to the remote retried
+    *sync_retries* times, see
+    :class:`sync.SyncEngine`. The files of a repo are converted as soon as
+    its sync finishes, in this process or with *jobs* > 1 in a pool of that
+    many processes. Returns a list of JobResults in the order the jobs
+    finished.
+
+    With *profile* True, or if any hooks are registered with
+    :func:`profiling.register_hook`, every job is timed by stage and the hooks
+    are called in this process as the jobs finish. See :func:`profile_report`.
+    With *cprofile_dir* a cProfile capture of each conversion is written
+    there. *verbosity* sets how much of the diagnostics of each conversion
+    is printed, see :func:`diagnostics_report` for all of them. The documents
+    are made from the .docx *template*, unless a source names its own, or
+    python-docx's default one, and written with the output backend *writer*
+    unless a source names its own, see :func:`overleaf2word.tex_to_word`.'''
+    profile = profile or profiling.has_hooks()
+    results = []
+    def add(res) :
+        results.append(res)
+        if res.profile is not None :
+            profiling.notify(res.profile)
+
+    if jobs <= 1 :
+        pool = _InlineExecutor()
+    else :
+        pool = _pool(jobs)
+    engine = SyncEngine(concurrency=sync_jobs,per_host=sync_per_host,
+        timeout=sync_timeout,retries=sync_retries)
+    with engine, pool :
+        # future -> source dict for sync jobs, (_Project, path) for file jobs
+        pending = {}
+        for source in sources :
+            pending[engine.run(sync_job(engine,source,profile))] = source
+
+        while pending :
+            done, _ = wait(pending,return_when=FIRST_COMPLETED)
+            # in the order the jobs were submitted, so that the results of
+            # the inline jobs keep the order of the files
+            for fut in [_ for _ in pending if _ in done] :
+                source = pending.pop(fut)
+                is_file_job = isinstance(source,tuple)
+                try :
+                    res = fut.result()
+                except Exception :
+                    # the worker itself died, jobs catch their own errors
+                    if is_file_job :
+                        proj, path = source
+                        res = _result(proj.project,path,FAILED,traceback.format_exc())
+                        proj.record(res,None)
+                    else :
+                        res = _result(project_name(source),None,FAILED,traceback.format_exc())
+                    add(res)
+                    continue
+                if is_file_job :
+                    res, hashes = res
+                    add(res)
+                    source[0].record(res,hashes)
+                    continue
+                res, synced, bib_fn = res
+                add(res)
+                if synced is None :
+                    continue
+                proj = _Project(source,res,synced,bib_fn)
+                for args in proj.jobs(profile,cprofile_dir,verbosity,template,
+                                      writer) :
+                    pending[pool.submit(convert_job,*args)] = (proj,args[2])
+
+    return results
+
+def profile_report(results) :
+    '''Return the stage timings of profiled *results* broken down by repo and
+    file, as a JSON serializable dict::
+
+        {'repos': [{'repo': name, 'total': seconds,
+                    'sync': {profile of the sync},
+                    'files': [{profile of each file}, ...]}, ...],
+         'stages': {stage: total seconds over all jobs},
+         'counts': {counter: total over all jobs}}
+    '''
+    repos = {}
+    stages = {}
+    counts = {}
+    for res in results :
+        if res.profile is None :
+            continue
+        repo = repos.setdefault(res.project,
+            {'repo':res.project,'total':0.,'sync':None,'files':[]}
+        )
+        prof = dict(res.profile,status=res.status)
+        if res.path is None :
+            repo['sync'] = prof
+        else :
+            repo['files'].append(prof)
+        repo['total'] += prof['total']
+        for name, seconds in prof['stages'].items() :
+            stages[name] = stages.get(name,0.)+seconds
+        for name, n in prof.get('counts',{}).items() :
+            counts[name] = counts.get(name,0)+n
+    return {
+        'repos':sorted(repos.values(),key=lambda _: -_['total']),
+        'stages':stages,
+        'counts':counts,
+    }
+
+def diagnostics_report(results) :
+    '''Return the diagnostics of the converted files in *results* as a JSON
+    serializable dict::
+
+        {'files': [{'repo': name, diagnostics.Diagnostics.as_dict()}, ...],
+         'counts': {kind: total over all files}}
+    '''
+    files = []
+    counts = {}
+    for res in results :
+        if res.diagnostics is None :
+            continue
+        files.append(dict(res.diagnostics,repo=res.project))
+        for d in res.diagnostics['diagnostics'] :
+            counts[d['kind']] = counts.get(d['kind'],0)+d['count']
+    return {'files':files,'counts':counts}
+
+def summarize(results) :
+    '''Return a dict of counts of results by status'''
+    counts = {OK:0,FAILED:0,SKIPPED:0}
+    for res in results :
+        counts[res.status] += 1
+    return counts
+
+def count_written(results) :
+    '''Return the number of .docx files *results* actually wrote, conversions
+    whose output was the same as before leave the file alone'''
+    return sum(1 for res in results if res.written)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Time decoding a large corpus of .tex files in mixed encodings.
+
+Most of the files are UTF-8 and the rest Latin-1 or Windows-1252, like the
+sources of older projects. The whole corpus is decoded with
+:func:`decoding.decode` with an empty encoding cache and with a warm one,
+and for comparison by running chardet over each whole file, and by decoding
+everything as UTF-8 with errors replaced, which is as fast as it gets but
+garbles the files that aren't UTF-8.
+
+Results are written as JSON, to stdout or --output, e.g.::
+
+    python benchmarks/bench_decoding.py --files 200 --size 200000
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+from bench_stages import best_of
+
+WORDS = ['r\u00e9sultats','donn\u00e9es','\u00e9tude','tr\u00e8s','na\u00efve',
+    'Gr\u00f6\u00dfe','\u00fcber','an\u00e1lisis','se\u00f1al','the','model','of',
+    'results','\\textbf{data}','\\cite{key}','$x^2$','\u2013','\u201cquoted\u201d']
+
+def make_corpus(files,size,foreign=0.2,seed=0) :
+    '''Return *files* file contents of about *size* bytes, a *foreign*
+    fraction of them in Latin-1 or Windows-1252 and the rest UTF-8'''
+    rnd = random.Random(seed)
+    corpus = []
+    for i in range(files) :
+        words = []
+        n = 0
+        while n < size :
+            line = ' '.join(rnd.choice(WORDS) for _ in range(12))+'\n'
+            words.append(line)
+            n += len(line)
+        text = ''.join(words)
+        if rnd.random() < foreign :
+            if rnd.random() < 0.5 :
+                text = text.replace('\u2013','-').replace('\u201c','"').replace('\u201d','"')
+                corpus.append(('latin-1',text.encode('latin-1')))
+            else :
+                corpus.append(('cp1252',text.encode('cp1252')))
+        else :
+            corpus.append(('utf-8',text.encode('utf-8')))
+    return corpus
+
+def run(files=100,size=100000,foreign=0.2,repeat=3,chardet_files=10) :
+    '''Decode a corpus of *files* files of about *size* bytes, *foreign* of
+    them not UTF-8. chardet over whole files is only timed on the first
+    *chardet_files* of them as it is slow. Returns the results as a JSON
+    serializable dict.'''
+    import chardet
+    import cache
+    import decoding
+
+    corpus = make_corpus(files,size,foreign)
+    total = sum(len(_[1]) for _ in corpus)
+    cache_dir = cache.CACHE_DIR
+    with tempfile.TemporaryDirectory() as work_dir :
+        # keep the on-disk caches out of the user's cache dir
+        cache.CACHE_DIR = os.path.join(work_dir,'cache')
+        try :
+            def cold() :
+                decoding._detected.clear()
+                shutil.rmtree(cache.CACHE_DIR,ignore_errors=True)
+                return [decoding.decode(data) for _, data in corpus]
+            def warm() :
+                return [decoding.decode(data) for _, data in corpus]
+            def replace() :
+                return [data.decode('utf-8','replace') for _, data in corpus]
+            sample = corpus[:chardet_files]
+            def whole() :
+                return [data.decode(chardet.detect(data)['encoding'] or 'utf-8','replace')
+                        for _, data in sample]
+            t_cold, texts = best_of(repeat,cold)
+            t_warm, _ = best_of(repeat,warm)
+            t_replace, _ = best_of(repeat,replace)
+            t_whole, _ = best_of(1,whole)
+        finally :
+            cache.CACHE_DIR = cache_dir
+
+    correct = sum(1 for (enc,data), text in zip(corpus,texts)
+                  if text == decoding.normalize(data.decode(enc)))
+    sample_total = sum(len(_[1]) for _ in sample)
+    mb = lambda n,t: n/t/1e6
+    return {
+        'benchmark':'decoding',
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'files':files,
+        'bytes':total,
+        'foreign':sum(1 for _ in corpus if _[0] != 'utf-8'),
+        'correct':correct,
+        'mb_per_second':{
+            'decode_cold':mb(total,t_cold),
+            'decode_warm':mb(total,t_warm),
+            'utf8_replace':mb(total,t_replace),
+            'chardet_whole_file':mb(sample_total,t_whole),
+        },
+    }
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Time decoding files in mixed encodings')
+    parser.add_argument('--files',type=int,default=100,
+        help='number of files (default: %(default)s)')
+    parser.add_argument('--size',type=int,default=100000,
+        help='bytes per file (default: %(default)s)')
+    parser.add_argument('--foreign',type=float,default=0.2,
+        help='fraction of files that are not UTF-8 (default: %(default)s)')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.files,args.size,args.foreign,args.repeat)
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
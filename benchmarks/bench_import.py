@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Measure how long importing the converter modules takes in a fresh
+interpreter, and which heavy dependencies the import drags in.
+
+Each module is imported --repeat times in a new ``python -X importtime``
+process and the median cumulative import time is reported as JSON. Point
+--path at another checkout to compare against it, e.g.::
+
+    git worktree add /tmp/old v0.1.0
+    python benchmarks/bench_import.py --path /tmp/old --output old.json
+    python benchmarks/bench_import.py --output new.json
+'''
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+HEAVY = ('docx','git','PIL','bibtexparser','chardet','lxml','ply.yacc')
+
+def import_time(path,module) :
+    '''Return (cumulative import microseconds, heavy modules loaded) for
+    importing *module* from *path* in a fresh interpreter'''
+    code = ('import sys; import {}; '
+            'print(",".join(_ for _ in {!r} if _ in sys.modules))').format(module,HEAVY)
+    proc = subprocess.run([sys.executable,'-X','importtime','-c',code],
+        cwd=path,stdout=subprocess.PIPE,stderr=subprocess.PIPE,
+        universal_newlines=True,check=True
+    )
+    usecs = None
+    for line in proc.stderr.splitlines() :
+        # import time: self [us] | cumulative | imported package
+        parts = [_.strip() for _ in line.split('|')]
+        if len(parts) == 3 and parts[2] == module :
+            usecs = int(parts[1])
+    heavy = [_ for _ in proc.stdout.strip().split(',') if _]
+    return usecs, heavy
+
+def run(path,modules,repeat=5) :
+    results = {}
+    for module in modules :
+        times, heavy = [], []
+        for _ in range(repeat) :
+            usecs, heavy = import_time(path,module)
+            times.append(usecs)
+        results[module] = {
+            'median_ms':statistics.median(times)/1000.,
+            'min_ms':min(times)/1000.,
+            'heavy_modules':heavy,
+        }
+    return {
+        'benchmark':'import',
+        'python':platform.python_version(),
+        'path':os.path.abspath(path),
+        'repeat':repeat,
+        'results':results,
+    }
+
+if __name__ == '__main__' :
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Time importing the converter')
+    parser.add_argument('--path',default=here,
+        help='checkout to import from (default: this one)')
+    parser.add_argument('--modules',nargs='+',default=['overleaf2word','tex2word'])
+    parser.add_argument('--repeat',type=int,default=5)
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.path,args.modules,args.repeat)
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
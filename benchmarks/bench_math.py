@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Time converting equations to Word math on math heavy documents.
+
+Each document has *paragraphs* paragraphs of text with inline equations
+and a display equation every few paragraphs. The equations are drawn from
+a pool of formulas with a few common ones used much more often than the
+rest, like the symbols and expressions a paper keeps repeating. The
+equations are converted on their own and the whole document with
+tex_to_word, without the paragraph render cache, three ways: with no
+formula cache, with an empty one per conversion and with one kept from the
+conversions before.
+
+Results are written as JSON, to stdout or --output, e.g.::
+
+    python benchmarks/bench_math.py --sizes 200 1000
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+from bench_stages import best_of
+from bench_stream import _quiet
+
+FORMULAS = [
+    r'x_{{{i}}}',
+    r'\alpha_{{{i}}} + \beta',
+    r'\frac{{\partial f}}{{\partial x_{{{i}}}}}',
+    r'\sum_{{j=1}}^{{{i}}} w_j x_j',
+    r'\mathbb{{E}}\left[ X_{{{i}}}^2 \right]',
+    r'\int_0^{{{i}}} e^{{-t^2}}\,dt',
+    r'\sqrt{{\sigma^2 + {i}}}',
+    r'\hat{{\theta}}_{{{i}}} \leq \lambda \|x\|',
+    r'\mathcal{{O}}(n^{{{i}}} \log n)',
+    r'\begin{{pmatrix}} a_{{{i}}} & b \\ c & d \end{{pmatrix}}',
+]
+
+def make_tex(paragraphs,per_paragraph=5,pool=200,seed=0) :
+    '''Return a document of *paragraphs* paragraphs with *per_paragraph*
+    inline equations each, drawn from *pool* formulas, and the number of
+    equations in it'''
+    rnd = random.Random(seed)
+    pool = [FORMULAS[i%len(FORMULAS)].format(i=i//len(FORMULAS))
+            for i in range(pool)]
+    # a few formulas are used much more often than the rest
+    weights = [1.0/(i+1) for i in range(len(pool))]
+    lines = ['\\begin{document}']
+    equations = 0
+    for p in range(paragraphs) :
+        words = []
+        for tex in rnd.choices(pool,weights,k=per_paragraph) :
+            words.append('some words about ${}$ and'.format(tex))
+            equations += 1
+        lines.append(' '.join(words)+' more.')
+        lines.append('')
+        if p%5 == 4 :
+            lines.append('\\begin{equation}')
+            lines.append(rnd.choices(pool,weights)[0])
+            lines.append('\\end{equation}')
+            lines.append('')
+            equations += 1
+    lines.append('\\end{document}')
+    return '\n'.join(lines)+'\n', equations
+
+def formulas_of(tex) :
+    from overleaf2word import tokenize
+    return [tok.value[1:-1] for tok in tokenize(tex,'scan')
+            if tok.type == 'EQUATION']
+
+def bench_size(work_dir,paragraphs,repeat) :
+    import omml
+    import overleaf2word
+
+    tex, equations = make_tex(paragraphs)
+    tex_fn = os.path.join(work_dir,'math{}.tex'.format(paragraphs))
+    with open(tex_fn,'w') as f :
+        f.write(tex)
+    inline = formulas_of(tex)
+
+    result = {'paragraphs':paragraphs,'equations':equations,
+        'distinct':len(set(inline))}
+    formulas = omml.formulas
+    try :
+        for name, size, keep in (('uncached',0,False),('cold',omml.CACHE_SIZE,False),
+                                 ('warm',omml.CACHE_SIZE,True)) :
+            omml.formulas = omml.FormulaCache(size)
+            def convert_formulas() :
+                if not keep :
+                    omml.formulas.clear()
+                for f in inline :
+                    omml.convert(f)
+            def convert_doc() :
+                if not keep :
+                    omml.formulas.clear()
+                _quiet(lambda: overleaf2word.tex_to_word(tex_fn,work_dir,
+                    render_cache=False))
+            t_formulas, _ = best_of(repeat,convert_formulas)
+            t_doc, _ = best_of(repeat,convert_doc)
+            result[name] = dict(
+                formulas_per_second=len(inline)/t_formulas,
+                doc_seconds=t_doc,
+                equations_per_second=equations/t_doc,
+            )
+    finally :
+        omml.formulas = formulas
+    return result
+
+def run(sizes,repeat=3) :
+    '''Run the benchmark for every size in *sizes*, a list of paragraph
+    counts. Returns the results as a JSON serializable dict.'''
+    import cache
+    cache_dir = cache.CACHE_DIR
+    with tempfile.TemporaryDirectory() as work_dir :
+        # keep the on-disk caches out of the user's cache dir
+        cache.CACHE_DIR = os.path.join(work_dir,'cache')
+        try :
+            results = [bench_size(work_dir,n,repeat) for n in sizes]
+        finally :
+            cache.CACHE_DIR = cache_dir
+    return {
+        'benchmark':'math',
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'repeat':repeat,
+        'results':results,
+    }
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Time converting equations to Word math')
+    parser.add_argument('--sizes',type=int,nargs='+',default=[200,1000],
+        help='document sizes in paragraphs (default: %(default)s)')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.sizes,args.repeat)
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
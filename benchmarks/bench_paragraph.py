@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Time add_paragraph on single paragraphs of growing size.
+
+Each paragraph is made of plain words with a bold word every --fmt-every words
+and a \\newline every --newline-every words, like the long generated blocks
+some documents have. Paragraph assembly should be linear in the number of
+words, so ``us_per_word`` should stay about the same as the size grows.
+
+Results are written as JSON, to stdout or --output, e.g.::
+
+    python benchmarks/bench_paragraph.py --sizes 1000 10000 100000
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+from bench_stages import best_of
+
+def make_words(n,fmt_every=10,newline_every=50) :
+    '''Return a paragraph of *n* Texts with some formatting mixed in'''
+    from overleaf2word import Text, Word
+    words = []
+    for i in range(n) :
+        if fmt_every and i % fmt_every == fmt_every-1 :
+            words.append(Text(text='bold{}'.format(i),type='textbf',
+                style=None,props={'bold':True}))
+        elif newline_every and i % newline_every == newline_every-1 :
+            words.append(Word(text='\n'))
+        else :
+            words.append(Word(text='word{}'.format(i)))
+    return words
+
+def bench_size(n,repeat,fmt_every,newline_every) :
+    import docx
+    import overleaf2word
+
+    words = make_words(n,fmt_every,newline_every)
+    t, runs = best_of(repeat,lambda: overleaf2word.coalesce(words))
+    coalesce = dict(seconds=t,runs=len(runs))
+
+    # only time the paragraph, not loading the template
+    docs = [docx.Document() for _ in range(repeat)]
+    def build() :
+        doc = docs.pop()
+        overleaf2word.add_paragraph(doc,words)
+        return doc
+    t, _ = best_of(repeat,build)
+    return {
+        'words':n,
+        'coalesce':coalesce,
+        'add_paragraph':dict(seconds=t,
+            us_per_word=t/n*1e6 if n else None,
+            words_per_sec=n/t if t else None
+        ),
+    }
+
+def run(sizes,repeat=3,fmt_every=10,newline_every=50) :
+    '''Run the benchmark for every paragraph size in *sizes*, in words.
+    Returns the results as a JSON serializable dict.'''
+    return {
+        'benchmark':'paragraph',
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'repeat':repeat,
+        'results':[bench_size(n,repeat,fmt_every,newline_every) for n in sizes],
+    }
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Time add_paragraph on large paragraphs')
+    parser.add_argument('--sizes',type=int,nargs='+',default=[1000,10000,100000],
+        help='paragraph sizes in words (default: %(default)s)')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--fmt-every',type=int,default=10)
+    parser.add_argument('--newline-every',type=int,default=50)
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.sizes,args.repeat,args.fmt_every,args.newline_every)
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Time the tex2word parser engines on texts of growing size.
+
+Each text is made of words and \\\\ newlines with a command with nested
+arguments every --cmd-every tokens and a comment every --comment-every
+tokens, by default about as often as in a real document. The yacc engine
+copies the rest of the expression at every step, the iterative one should
+take the same time per token at every size. The yacc engine is skipped for
+texts longer than --yacc-max tokens. The depth of the tree, which stays that
+of the nested arguments however many commands there are, is reported too.
+
+Results are written as JSON, to stdout or --output, e.g.::
+
+    python benchmarks/bench_parser.py --sizes 1000 10000 100000
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+from bench_stages import best_of
+
+def make_tex(n,cmd_every=10,comment_every=50,seed=0) :
+    '''Return a text of about *n* tokens tex2word can parse'''
+    rnd = random.Random(seed)
+    parts = []
+    for i in range(n) :
+        if cmd_every and i % cmd_every == cmd_every-1 :
+            parts.append(r'\cmd{arg \textbf{nested} word}[opt]{last}')
+        elif comment_every and i % comment_every == comment_every-1 :
+            parts.append('% a comment\n')
+        elif rnd.random() < 0.05 :
+            parts.append(r'\\')
+        else :
+            parts.append('word{}'.format(i))
+    return ' '.join(parts)
+
+def depth(tree) :
+    '''Return how deep the lists of *tree* nest, command arguments included'''
+    deepest = 0
+    todo = [(tree,1)]
+    while todo :
+        items, level = todo.pop()
+        deepest = max(deepest,level)
+        for item in items or () :
+            if isinstance(item,list) :
+                todo.append((item,level+1))
+            elif type(item).__name__ == 'Command' :
+                todo.extend((_,level+1) for _ in (item.arg1,item.arg2,item.opts)
+                            if _ is not None)
+    return deepest
+
+def bench_size(n,repeat,yacc_max,cmd_every,comment_every) :
+    import tex2word
+
+    tex = make_tex(n,cmd_every,comment_every)
+    lexer = tex2word.lexer.clone()
+    lexer.input(tex)
+    ntoks = sum(1 for _ in iter(lexer.token,None))
+
+    result = {'tokens':ntoks,'tex_bytes':len(tex)}
+    engines = ['iterative']
+    if ntoks <= yacc_max :
+        engines.append('yacc')
+    for engine in engines :
+        t, tree = best_of(repeat,lambda: tex2word.tex_to_word(tex,engine))
+        result[engine] = dict(seconds=t,
+            us_per_token=t/ntoks*1e6 if ntoks else None,
+            tokens_per_sec=ntoks/t if t else None,
+            depth=depth(tree)
+        )
+    return result
+
+def run(sizes,repeat=3,yacc_max=20000,cmd_every=10,comment_every=50) :
+    '''Run the benchmark for every size in *sizes*, in tokens. Returns the
+    results as a JSON serializable dict.'''
+    return {
+        'benchmark':'parser',
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'repeat':repeat,
+        'results':[bench_size(n,repeat,yacc_max,cmd_every,comment_every)
+                   for n in sizes],
+    }
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Time the tex2word parser engines')
+    parser.add_argument('--sizes',type=int,nargs='+',default=[1000,10000,100000],
+        help='text sizes in tokens (default: %(default)s)')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--yacc-max',type=int,default=20000,
+        help='skip the yacc engine above this many tokens (default: %(default)s)')
+    parser.add_argument('--cmd-every',type=int,default=10)
+    parser.add_argument('--comment-every',type=int,default=50)
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.sizes,args.repeat,args.yacc_max,args.cmd_every,
+        args.comment_every
+    )
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
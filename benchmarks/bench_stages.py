@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Time the stages of a conversion on synthetic documents of growing size.
+
+For each size a project is generated with :mod:`corpus` and these stages are
+timed separately, best of --repeat runs:
+
+- ``lex``: running the ply lexer in overleaf2word over main.tex
+- ``bib_parse``: parsing refs.bib with bibtexparser
+- ``bib_load``: loading refs.bib through the bibcache, i.e. a cache hit
+- ``paragraphs``: add_paragraph/add_run for every paragraph of text
+- ``save``: doc.save of the finished document
+- ``tex_to_word``: the whole conversion
+
+Results are written as JSON, to stdout or --output, e.g.::
+
+    python benchmarks/bench_stages.py --sizes 100 1000 --output bench.json
+'''
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import corpus
+
+def best_of(repeat,func) :
+    '''Return (best time, result of the last call) of calling *func*'''
+    best = None
+    for _ in range(repeat) :
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter()-start
+        best = elapsed if best is None else min(best,elapsed)
+    return best, result
+
+def paragraphs_of(toks) :
+    '''Group the WORD tokens of a token list into paragraphs of Words'''
+    from overleaf2word import Word
+    paragraphs, words, prev = [], [], None
+    for tok in toks :
+        if tok.type == 'WORD' :
+            words.append(Word(text=tok.value))
+        elif tok.type == 'NEWLINE' and prev == 'NEWLINE' and words :
+            paragraphs.append(words)
+            words = []
+        prev = tok.type
+    if words :
+        paragraphs.append(words)
+    return paragraphs
+
+def bench_size(work_dir,paragraphs,repeat,bib_entries,images) :
+    import bibcache
+    import docx
+    import overleaf2word
+
+    proj_dir = os.path.join(work_dir,'p{}'.format(paragraphs))
+    tex_fn = corpus.make_corpus(proj_dir,paragraphs=paragraphs,
+        sections=max(1,paragraphs//10),bib_entries=bib_entries,
+        lists=max(1,paragraphs//20),images=images
+    )
+    bib_fn = os.path.join(proj_dir,'refs.bib')
+    with open(tex_fn) as f :
+        tex = f.read()
+    with open(bib_fn) as f :
+        bib = f.read()
+
+    stages = {}
+    def record(name,seconds,**extra) :
+        stages[name] = dict(seconds=seconds,**extra)
+
+    def lex() :
+        lexer = overleaf2word.lexer.clone()
+        lexer.input(tex)
+        return list(iter(lexer.token,None))
+    t, toks = best_of(repeat,lex)
+    record('lex',t,tokens=len(toks),tokens_per_sec=len(toks)/t if t else None)
+
+    t, bibdb = best_of(repeat,lambda: bibcache.parse_bib(bib))
+    record('bib_parse',t,entries=len(bibdb))
+    bibcache.load_bib(bib_fn)
+    t, _ = best_of(repeat,lambda: bibcache.load_bib(bib_fn))
+    record('bib_load',t,entries=len(bibdb))
+
+    paras = paragraphs_of(toks)
+    nwords = sum(len(_) for _ in paras)
+    def build() :
+        doc = docx.Document()
+        for words in paras :
+            overleaf2word.add_paragraph(doc,list(words))
+        return doc
+    t, doc = best_of(repeat,build)
+    record('paragraphs',t,paragraphs=len(paras),words=nwords,
+        words_per_sec=nwords/t if t else None)
+
+    t, size = best_of(repeat,lambda: _save(doc))
+    record('save',t,bytes=size)
+
+    def convert() :
+        overleaf2word.tex_to_word(tex_fn,proj_dir,bib_fn)
+    # the per file banner would drown out the results
+    with open(os.devnull,'w') as devnull :
+        stdout, sys.stdout = sys.stdout, devnull
+        try :
+            t, _ = best_of(repeat,convert)
+        finally :
+            sys.stdout = stdout
+    record('tex_to_word',t,tex_bytes=len(tex.encode('utf-8')))
+
+    return {'paragraphs':paragraphs,'bib_entries':bib_entries,
+            'images':images,'stages':stages}
+
+def _save(doc) :
+    buf = io.BytesIO()
+    doc.save(buf)
+    return len(buf.getvalue())
+
+def run(sizes,repeat=3,bib_entries=1000,images=2,work_dir=None) :
+    '''Run the benchmark for every size in *sizes*, a list of paragraph
+    counts. Returns the results as a JSON serializable dict.'''
+    import cache
+    cache_dir = cache.CACHE_DIR
+    with tempfile.TemporaryDirectory() as tmp :
+        work_dir = work_dir or tmp
+        # keep the on-disk caches out of the user's cache dir
+        cache.CACHE_DIR = os.path.join(work_dir,'cache')
+        try :
+            results = [bench_size(work_dir,n,repeat,bib_entries,images)
+                       for n in sizes]
+        finally :
+            cache.CACHE_DIR = cache_dir
+    return {
+        'benchmark':'stages',
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'repeat':repeat,
+        'results':results,
+    }
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Time the stages of tex_to_word')
+    parser.add_argument('--sizes',type=int,nargs='+',default=[100,1000],
+        help='document sizes in paragraphs (default: %(default)s)')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--bib-entries',type=int,default=1000)
+    parser.add_argument('--images',type=int,default=2)
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.sizes,args.repeat,args.bib_entries,args.images)
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Compare the time and peak memory of tex_to_word with and without stream.
+
+For each size a document is generated with :mod:`corpus` and converted both
+ways, the peak memory is measured with tracemalloc in a separate run from
+the timing. tracemalloc only sees memory allocated by python, the lxml tree
+python-docx keeps of the whole document is not counted, so this shows the
+source text and token list that streaming does not hold on to.
+
+Results are written as JSON, to stdout or --output, e.g.::
+
+    python benchmarks/bench_stream.py --sizes 500 2000
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import corpus
+from bench_stages import best_of
+
+def _quiet(func) :
+    with open(os.devnull,'w') as devnull :
+        stdout, sys.stdout = sys.stdout, devnull
+        try :
+            return func()
+        finally :
+            sys.stdout = stdout
+
+def peak_memory(func) :
+    '''Return the peak traced memory in bytes while calling *func*'''
+    tracemalloc.start()
+    try :
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally :
+        tracemalloc.stop()
+
+def bench_size(work_dir,paragraphs,repeat) :
+    import overleaf2word
+
+    proj_dir = os.path.join(work_dir,'p{}'.format(paragraphs))
+    tex_fn = corpus.make_corpus(proj_dir,paragraphs=paragraphs,
+        sections=max(1,paragraphs//10),lists=max(1,paragraphs//20),images=0
+    )
+    bib_fn = os.path.join(proj_dir,'refs.bib')
+
+    result = {'paragraphs':paragraphs,'tex_bytes':os.path.getsize(tex_fn)}
+    for stream in (False,True) :
+        # the same writer both ways, bench_writer.py compares those
+        convert = lambda: _quiet(lambda: overleaf2word.tex_to_word(tex_fn,
+            proj_dir,bib_fn,stream=stream,writer='docx'))
+        t, _ = best_of(repeat,convert)
+        result['stream' if stream else 'whole'] = dict(seconds=t,
+            peak_bytes=peak_memory(convert)
+        )
+    return result
+
+def run(sizes,repeat=3) :
+    '''Run the benchmark for every size in *sizes*, a list of paragraph
+    counts. Returns the results as a JSON serializable dict.'''
+    import cache
+    cache_dir = cache.CACHE_DIR
+    with tempfile.TemporaryDirectory() as work_dir :
+        # keep the on-disk caches out of the user's cache dir
+        cache.CACHE_DIR = os.path.join(work_dir,'cache')
+        try :
+            results = [bench_size(work_dir,n,repeat) for n in sizes]
+        finally :
+            cache.CACHE_DIR = cache_dir
+    return {
+        'benchmark':'stream',
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'repeat':repeat,
+        'results':results,
+    }
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Compare tex_to_word with and without stream')
+    parser.add_argument('--sizes',type=int,nargs='+',default=[500,2000],
+        help='document sizes in paragraphs (default: %(default)s)')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.sizes,args.repeat)
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Compare the rows per second of converting large tabular environments.
+
+For each size a document holding a single tabular of that many rows, with
+``\\hline``s and ``\\textbf`` cells, is converted with tex_to_word and the
+python-docx and streaming ooxml writers, which both build the table as one
+piece of XML in a single pass over the rows. For comparison the same cells
+are also filled in through python-docx's table API, a cell at a time, which
+is what the converter would do otherwise. The parsing of the table body is
+timed on its own too.
+
+Results are written as JSON, to stdout or --output, e.g.::
+
+    python benchmarks/bench_tables.py --sizes 1000 10000
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+from bench_stages import best_of
+from bench_stream import _quiet
+
+COLUMNS = 4
+
+def make_table(rows) :
+    '''Return the latex of a tabular of *rows* rows and COLUMNS columns'''
+    lines = [r'\begin{tabular}{|l|'+'r'*(COLUMNS-1)+'|}',r'\hline',
+        ' & '.join(r'\textbf{{Column {}}}'.format(_) for _ in range(COLUMNS))
+        +r' \\ \hline']
+    for i in range(rows) :
+        cells = ['item {}'.format(i)]+[str(i*(_+1)) for _ in range(1,COLUMNS)]
+        if i%10 == 0 :
+            cells[1] = r'\textbf{{{}}}'.format(cells[1])
+        lines.append(' & '.join(cells)+r' \\'+(r' \hline' if i%100 == 99 else ''))
+    lines.append(r'\hline')
+    lines.append(r'\end{tabular}')
+    return '\n'.join(lines)
+
+def make_document(path,rows) :
+    tex = '\n'.join([r'\documentclass{article}',r'\begin{document}',
+        r'\section{Results}','The results are below.','',make_table(rows),'',
+        r'\end{document}',''])
+    with open(path,'w') as f :
+        f.write(tex)
+    return len(tex)
+
+def cell_api(rows,doc_fn) :
+    '''Fill a table of the same cells with python-docx's table API'''
+    import docx
+    import tabular
+    table = tabular.parse('tabular',make_table(rows)[len(r'\begin{tabular}'):
+        -len(r'\end{tabular}')])
+    doc = docx.Document()
+    t = doc.add_table(rows=len(table.rows),cols=len(table.columns))
+    for row, cells in zip(t.rows,table.rows) :
+        for cell, tex in zip(row.cells,cells.cells) :
+            if tex.content.startswith(r'\textbf') :
+                cell.paragraphs[0].add_run(tex.content[8:-1]).bold = True
+            else :
+                cell.text = tex.content
+    doc.save(doc_fn)
+
+def bench_size(work_dir,rows,repeat) :
+    import overleaf2word
+    import tabular
+
+    tex_fn = os.path.join(work_dir,'t{}.tex'.format(rows))
+    tex_bytes = make_document(tex_fn,rows)
+    body = make_table(rows)[len(r'\begin{tabular}'):-len(r'\end{tabular}')]
+
+    result = {'rows':rows,'columns':COLUMNS,'tex_bytes':tex_bytes}
+    t, _ = best_of(repeat,lambda: tabular.parse('tabular',body))
+    result['parse'] = dict(seconds=t,rows_per_second=rows/t)
+    t, _ = best_of(repeat,lambda: cell_api(rows,
+        os.path.join(work_dir,'cells.docx')))
+    result['cell_api'] = dict(seconds=t,rows_per_second=rows/t)
+    for writer in sorted(overleaf2word.WRITERS) :
+        doc_fn = os.path.join(work_dir,'{}.docx'.format(writer))
+        convert = lambda: _quiet(lambda: overleaf2word.tex_to_word(tex_fn,
+            work_dir,doc_fn=doc_fn,writer=writer))
+        t, _ = best_of(repeat,convert)
+        result[writer] = dict(seconds=t,rows_per_second=rows/t,
+            docx_bytes=os.path.getsize(doc_fn))
+    return result
+
+def run(sizes,repeat=3) :
+    '''Run the benchmark for every size in *sizes*, a list of row counts.
+    Returns the results as a JSON serializable dict.'''
+    import cache
+    cache_dir = cache.CACHE_DIR
+    with tempfile.TemporaryDirectory() as work_dir :
+        # keep the on-disk caches out of the user's cache dir
+        cache.CACHE_DIR = os.path.join(work_dir,'cache')
+        try :
+            results = [bench_size(work_dir,n,repeat) for n in sizes]
+        finally :
+            cache.CACHE_DIR = cache_dir
+    return {
+        'benchmark':'tables',
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'repeat':repeat,
+        'results':results,
+    }
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Compare converting large tables')
+    parser.add_argument('--sizes',type=int,nargs='+',default=[1000,10000],
+        help='table sizes in rows (default: %(default)s)')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.sizes,args.repeat)
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
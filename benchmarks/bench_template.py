@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Time the per document setup of many small conversions.
+
+Every document starts from a .docx template. The template can be loaded and
+parsed for each document, like python-docx's ``docx.Document()`` does, or
+parsed once and copied, like the writers do with
+:func:`ooxml.load_template`. Both are timed per document, and a small
+generated document is converted *files* times over with the template cache
+kept and with it emptied before each conversion.
+
+Results are written as JSON, to stdout or --output, e.g.::
+
+    python benchmarks/bench_template.py --files 200 --template house.docx
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import corpus
+from bench_stream import _quiet
+
+def per_file(files,func) :
+    '''Return the mean seconds of calling *func* *files* times'''
+    start = time.perf_counter()
+    for i in range(files) :
+        func()
+    return (time.perf_counter()-start)/files
+
+def run(files=100,template=None,paragraphs=3) :
+    '''Convert a document of *paragraphs* paragraphs *files* times from the
+    .docx *template*, python-docx's default one if None. Returns the results
+    as a JSON serializable dict.'''
+    import docx
+    import cache
+    import ooxml
+    import overleaf2word
+
+    fn = template or os.path.join(os.path.dirname(docx.__file__),'templates',
+        'default.docx')
+    ooxml._templates.clear()
+    start = time.perf_counter()
+    tmpl = ooxml.load_template(fn)
+    first_load = time.perf_counter()-start
+
+    setup = {
+        'load':per_file(files,lambda: docx.Document(fn)),
+        'copy':per_file(files,tmpl.document),
+    }
+
+    cache_dir = cache.CACHE_DIR
+    with tempfile.TemporaryDirectory() as work_dir :
+        # keep the on-disk caches out of the user's cache dir
+        cache.CACHE_DIR = os.path.join(work_dir,'cache')
+        try :
+            tex_fn = corpus.make_corpus(work_dir,paragraphs=paragraphs,
+                sections=1,lists=1,bib_entries=5,images=0
+            )
+            def convert() :
+                overleaf2word.tex_to_word(tex_fn,work_dir,
+                    os.path.join(work_dir,'refs.bib'),template=template
+                )
+            def convert_uncached() :
+                ooxml._templates.clear()
+                convert()
+            convert_time = {
+                'cached':_quiet(lambda: per_file(files,convert)),
+                'uncached':_quiet(lambda: per_file(files,convert_uncached)),
+            }
+        finally :
+            cache.CACHE_DIR = cache_dir
+
+    return {
+        'benchmark':'template',
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'template':template,
+        'files':files,
+        'paragraphs':paragraphs,
+        'first_load_seconds':first_load,
+        'setup_seconds_per_file':setup,
+        'convert_seconds_per_file':convert_time,
+    }
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Time the per document template setup')
+    parser.add_argument('--files',type=int,default=100,
+        help='number of documents converted (default: %(default)s)')
+    parser.add_argument('--paragraphs',type=int,default=3,
+        help='paragraphs in each document (default: %(default)s)')
+    parser.add_argument('--template',help='house style .docx to start from')
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.files,args.template,args.paragraphs)
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
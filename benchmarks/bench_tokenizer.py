@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Compare the tokens per second of the overleaf2word tokenizer backends.
+
+For each size a document is generated with :mod:`corpus` and tokenized with
+the ply lexer and with the hand written :mod:`tokenizer`, best of --repeat
+runs.
+
+Results are written as JSON, to stdout or --output, e.g.::
+
+    python benchmarks/bench_tokenizer.py --sizes 100 1000 10000
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import corpus
+from bench_stages import best_of
+
+def bench_size(work_dir,paragraphs,repeat) :
+    import overleaf2word
+
+    tex_fn = corpus.make_corpus(os.path.join(work_dir,'p{}'.format(paragraphs)),
+        paragraphs=paragraphs,sections=max(1,paragraphs//10),
+        lists=max(1,paragraphs//20),images=0
+    )
+    with open(tex_fn) as f :
+        tex = f.read()
+
+    result = {'paragraphs':paragraphs,'tex_bytes':len(tex.encode('utf-8'))}
+    for tokenizer in ('ply','scan') :
+        t, toks = best_of(repeat,lambda: overleaf2word.tokenize(tex,tokenizer))
+        result[tokenizer] = dict(seconds=t,tokens=len(toks),
+            tokens_per_sec=len(toks)/t if t else None
+        )
+    if result['scan']['seconds'] :
+        result['speedup'] = result['ply']['seconds']/result['scan']['seconds']
+    return result
+
+def run(sizes,repeat=3) :
+    '''Run the benchmark for every size in *sizes*, a list of paragraph
+    counts. Returns the results as a JSON serializable dict.'''
+    with tempfile.TemporaryDirectory() as work_dir :
+        results = [bench_size(work_dir,n,repeat) for n in sizes]
+    return {
+        'benchmark':'tokenizer',
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'repeat':repeat,
+        'results':results,
+    }
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Compare the tokenizer backends')
+    parser.add_argument('--sizes',type=int,nargs='+',default=[100,1000,10000],
+        help='document sizes in paragraphs (default: %(default)s)')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.sizes,args.repeat)
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Compare the memory and time per word of holding a paragraph's words.
+
+A paragraph of each size is tokenized with the hand written tokenizer and
+its words are collected two ways: as a list of Word tuples with their text
+sliced out of the source and unescaped, like tex_to_word used to, and in a
+WordBuffer holding offsets into the source. The peak memory of holding the
+words is measured with tracemalloc and the time to collect them and turn
+them into runs is timed.
+
+Results are written as JSON, to stdout or --output, e.g.::
+
+    python benchmarks/bench_words.py --sizes 10000 100000
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+from bench_stages import best_of
+
+def make_tex(n,seed=0) :
+    '''Return a paragraph of *n* words, a few with escapes'''
+    rnd = random.Random(seed)
+    words = []
+    for i in range(n) :
+        word = 'word{}'.format(rnd.randint(0,n))
+        if rnd.random() < 0.01 :
+            word += r'\%'
+        words.append(word)
+    return ' '.join(words)
+
+def as_words(toks) :
+    from overleaf2word import Word, _unescape
+    return [Word(text=_unescape(tok.value)) for tok in toks]
+
+def as_buffer(toks) :
+    from overleaf2word import WordBuffer
+    words = WordBuffer()
+    for tok in toks :
+        words.add_token(tok)
+    return words
+
+def peak_memory(func) :
+    '''Return the peak memory in bytes allocated while calling *func* and
+    still held by what it returns'''
+    tracemalloc.start()
+    try :
+        held = func()
+        size = tracemalloc.get_traced_memory()[0]
+        del held
+        return size
+    finally :
+        tracemalloc.stop()
+
+def bench_size(n,repeat) :
+    from overleaf2word import coalesce
+    from tokenizer import tokenize
+
+    tex = make_tex(n)
+    toks = list(tokenize(tex))
+    result = {'words':len(toks),'tex_bytes':len(tex)}
+    for name, collect, runs in (
+        ('tuples',as_words,coalesce),
+        ('buffer',as_buffer,lambda words: words.runs()),
+    ) :
+        t, _ = best_of(repeat,lambda: runs(collect(toks)))
+        size = peak_memory(lambda: collect(toks))
+        result[name] = dict(seconds=t,us_per_word=t/len(toks)*1e6,
+            bytes=size,bytes_per_word=size/len(toks)
+        )
+    return result
+
+def run(sizes,repeat=3) :
+    '''Run the benchmark for every size in *sizes*, in words. Returns the
+    results as a JSON serializable dict.'''
+    return {
+        'benchmark':'words',
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'repeat':repeat,
+        'results':[bench_size(n,repeat) for n in sizes],
+    }
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Compare the memory and time per word of a paragraph')
+    parser.add_argument('--sizes',type=int,nargs='+',default=[10000,100000],
+        help='paragraph sizes in words (default: %(default)s)')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.sizes,args.repeat)
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
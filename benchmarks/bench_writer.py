@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''Compare the time and peak memory of the tex_to_word output backends.
+
+For each size a document is generated with :mod:`corpus` and converted with
+the python-docx writer and the streaming ooxml one, timed in this process.
+The peak memory is the maximum resident size of a separate interpreter
+doing a single conversion, so unlike tracemalloc it includes the lxml tree
+python-docx keeps of the whole document. With --stream the source is also
+read and tokenized a chunk at a time, see bench_stream.py.
+
+Results are written as JSON, to stdout or --output, e.g.::
+
+    python benchmarks/bench_writer.py --sizes 500 2000
+'''
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import corpus
+from bench_stages import best_of
+from bench_stream import _quiet
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# converts argv[1] with the writer argv[2], streaming if argv[3] is 1, and
+# prints the peak rss in kB. on linux ru_maxrss keeps the peak of the parent
+# that forked it, VmHWM starts over at exec
+_PEAK_SCRIPT = '''
+import os, resource, sys
+sys.stdout = open(os.devnull,'w')
+import overleaf2word
+tex_fn, writer, stream = sys.argv[1:4]
+proj_dir = os.path.dirname(tex_fn)
+overleaf2word.tex_to_word(tex_fn,proj_dir,os.path.join(proj_dir,'refs.bib'),
+    writer=writer,stream=stream == '1')
+sys.stdout = sys.__stdout__
+try :
+    with open('/proc/self/status') as f :
+        print([_ for _ in f if _.startswith('VmHWM:')][0].split()[1])
+except (IOError,IndexError) :
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+def peak_rss(tex_fn,writer,stream,cache_dir) :
+    '''Return the peak resident size in bytes of converting *tex_fn* in a
+    fresh interpreter, None where that can't be measured'''
+    # the script needs resource where there is no /proc
+    if importlib.util.find_spec('resource') is None :
+        return None
+    env = dict(os.environ,OVERLEAF2WORD_CACHE=cache_dir,
+        PYTHONPATH=os.pathsep.join([PACKAGE_DIR,os.environ.get('PYTHONPATH','')])
+    )
+    out = subprocess.check_output([sys.executable,'-c',_PEAK_SCRIPT,tex_fn,
+        writer,'1' if stream else '0'],env=env,cwd=PACKAGE_DIR)
+    return int(out.split()[-1])*1024
+
+def bench_size(work_dir,paragraphs,repeat,stream) :
+    import cache
+    import overleaf2word
+
+    proj_dir = os.path.join(work_dir,'p{}'.format(paragraphs))
+    tex_fn = corpus.make_corpus(proj_dir,paragraphs=paragraphs,
+        sections=max(1,paragraphs//10),lists=max(1,paragraphs//20),
+        images=0
+    )
+    bib_fn = os.path.join(proj_dir,'refs.bib')
+
+    result = {'paragraphs':paragraphs,'tex_bytes':os.path.getsize(tex_fn)}
+    for writer in sorted(overleaf2word.WRITERS) :
+        convert = lambda: _quiet(lambda: overleaf2word.tex_to_word(tex_fn,
+            proj_dir,bib_fn,stream=stream,writer=writer))
+        t, _ = best_of(repeat,convert)
+        result[writer] = dict(seconds=t,
+            peak_rss_bytes=peak_rss(tex_fn,writer,stream,cache.CACHE_DIR),
+            docx_bytes=os.path.getsize(overleaf2word.docx_path(tex_fn))
+        )
+    return result
+
+def run(sizes,repeat=3,stream=False) :
+    '''Run the benchmark for every size in *sizes*, a list of paragraph
+    counts, with or without *stream*. Returns the results as a JSON
+    serializable dict.'''
+    import cache
+    cache_dir = cache.CACHE_DIR
+    with tempfile.TemporaryDirectory() as work_dir :
+        # keep the on-disk caches out of the user's cache dir
+        cache.CACHE_DIR = os.path.join(work_dir,'cache')
+        try :
+            results = [bench_size(work_dir,n,repeat,stream) for n in sizes]
+        finally :
+            cache.CACHE_DIR = cache_dir
+    return {
+        'benchmark':'writer',
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'repeat':repeat,
+        'stream':stream,
+        'results':results,
+    }
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Compare the tex_to_word output backends')
+    parser.add_argument('--sizes',type=int,nargs='+',default=[500,2000],
+        help='document sizes in paragraphs (default: %(default)s)')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--stream',action='store_true',
+        help='also read and tokenize the source a chunk at a time')
+    parser.add_argument('--output',help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    results = run(args.sizes,args.repeat,args.stream)
+    if args.output :
+        with open(args.output,'w') as f :
+            json.dump(results,f,indent=2)
+    else :
+        json.dump(results,sys.stdout,indent=2)
+        print()
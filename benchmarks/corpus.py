@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+'''Generate synthetic LaTeX projects of any size for benchmarking.
+
+A generated project has a main.tex with sections of paragraphs, citations
+against a .bib file, nested itemize/enumerate lists and figures, all in the
+subset of LaTeX that overleaf2word understands. The output only depends on
+the arguments, so runs can be compared against each other.'''
+import argparse
+import io
+import os
+import random
+
+VOCAB = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+         'tempor incididunt ut labore et dolore magna aliqua enim ad minim '
+         'veniam quis nostrud exercitation ullamco laboris nisi aliquip ex ea '
+         'commodo consequat duis aute irure in reprehenderit voluptate velit '
+         'esse cillum fugiat nulla pariatur excepteur sint occaecat cupidatat '
+         'non proident sunt culpa qui officia deserunt mollit anim id est '
+         'laborum').split()
+
+def bib_entry(i,rng) :
+    last = rng.choice(VOCAB).capitalize()
+    return (
+        '@article{{ref{i},\n'
+        '  author = {{{last}, {first} and Other, Author}},\n'
+        '  title = {{{title}}},\n'
+        '  journal = {{Journal of {journal}}},\n'
+        '  year = {{{year}}},\n'
+        '  volume = {{{vol}}},\n'
+        '  pages = {{{p}--{q}}},\n'
+        '}}\n'
+    ).format(i=i,last=last,first=rng.choice(VOCAB).capitalize(),
+        title=' '.join(rng.choice(VOCAB) for _ in range(8)).capitalize(),
+        journal=rng.choice(VOCAB).capitalize(),year=1990+i%30,vol=i%50+1,
+        p=i%300+1,q=i%300+12
+    )
+
+def sentence(rng,words,bib_entries,cite_rate) :
+    '''One line of text. Cites go at the end of the line since overleaf2word
+    drops whatever follows a command on the same line.'''
+    out = []
+    for _ in range(words) :
+        r = rng.random()
+        if r < 0.03 :
+            out.append('\\textbf{{{}}}'.format(rng.choice(VOCAB)))
+        elif r < 0.06 :
+            out.append('\\textit{{{}}}'.format(rng.choice(VOCAB)))
+        elif r < 0.07 :
+            out.append('50\\%')
+        else :
+            out.append(rng.choice(VOCAB))
+    line = ' '.join(out)+'.'
+    if bib_entries and rng.random() < cite_rate :
+        keys = ','.join('ref{}'.format(rng.randrange(bib_entries))
+                        for _ in range(rng.randint(1,3)))
+        line += ' \\cite{{{}}}'.format(keys)
+    return line
+
+def item_list(rng,depth,items=3) :
+    env = 'itemize' if depth%2 else 'enumerate'
+    lines = ['\\begin{{{}}}'.format(env)]
+    for i in range(items) :
+        lines.append('\\item '+' '.join(rng.choice(VOCAB) for _ in range(6)))
+        if depth > 1 and i == 0 :
+            lines.extend(item_list(rng,depth-1,items))
+    lines.append('\\end{{{}}}'.format(env))
+    return lines
+
+def make_image(path,width,height) :
+    from PIL import Image
+    img = Image.new('RGB',(width,height))
+    # some structure so the images don't compress to nothing
+    img.putdata([((x*7)%256,(y*3)%256,(x*y)%256)
+                 for y in range(height) for x in range(width)])
+    img.save(path)
+
+def make_corpus(out_dir,paragraphs=100,sections=10,words=15,lines=4,
+    bib_entries=100,cite_rate=0.3,list_depth=2,lists=5,images=2,
+    image_size=(600,400),seed=0) :
+    '''Write a synthetic project to *out_dir* and return the path of its
+    main.tex.
+
+    :param paragraphs: number of text paragraphs
+    :param sections: number of sections the paragraphs are spread over
+    :param words: words per line of text
+    :param lines: lines per paragraph
+    :param bib_entries: number of entries in refs.bib, cites are drawn from them
+    :param cite_rate: fraction of lines ending in a \\cite
+    :param list_depth: nesting depth of the itemize/enumerate lists
+    :param lists: number of lists spread over the document
+    :param images: number of figures, each a separate image file
+    :param image_size: (width, height) of the figures in pixels
+    '''
+    rng = random.Random(seed)
+    os.makedirs(out_dir,exist_ok=True)
+
+    if bib_entries :
+        with open(os.path.join(out_dir,'refs.bib'),'w') as f :
+            for i in range(bib_entries) :
+                f.write(bib_entry(i,rng))
+
+    for i in range(images) :
+        make_image(os.path.join(out_dir,'fig{}.png'.format(i)),*image_size)
+
+    body = []
+    sections = max(1,sections)
+    per_section = max(1,paragraphs//sections)
+    list_every = max(1,paragraphs//lists) if lists else None
+    image_every = max(1,paragraphs//images) if images else None
+    for p in range(paragraphs) :
+        if p%per_section == 0 :
+            level = 'sub'*(p//per_section%2)
+            body.append('\\{}section{{Section {}}}'.format(level,p//per_section))
+        body.extend(sentence(rng,words,bib_entries,cite_rate) for _ in range(lines))
+        body.append('')
+        if list_every and p%list_every == list_every-1 :
+            body.extend(item_list(rng,list_depth))
+            body.append('')
+        if image_every and p%image_every == image_every-1 :
+            body.append('\\includegraphics{{fig{}.png}}'.format(p//image_every))
+            body.append('')
+
+    tex = '\n'.join([
+        '\\documentclass{article}',
+        '\\title{Synthetic document}',
+        '\\begin{document}',
+    ]+body+[
+        '\\bibliography{refs}',
+        '\\end{document}',
+        ''
+    ])
+    tex_fn = os.path.join(out_dir,'main.tex')
+    with io.open(tex_fn,'w',encoding='utf-8') as f :
+        f.write(tex)
+    return tex_fn
+
+if __name__ == '__main__' :
+    parser = argparse.ArgumentParser(description='Write a synthetic LaTeX project')
+    parser.add_argument('out_dir')
+    parser.add_argument('--paragraphs',type=int,default=100)
+    parser.add_argument('--sections',type=int,default=10)
+    parser.add_argument('--bib-entries',type=int,default=100)
+    parser.add_argument('--list-depth',type=int,default=2)
+    parser.add_argument('--images',type=int,default=2)
+    args = parser.parse_args()
+    print(make_corpus(args.out_dir,paragraphs=args.paragraphs,
+        sections=args.sections,bib_entries=args.bib_entries,
+        list_depth=args.list_depth,images=args.images
+    ))
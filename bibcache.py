@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+'''Parsed, ID-indexed BibTeX databases cached by file content hash.
+
+Parsing a large .bib file with bibtexparser takes seconds, so the parsed
+database is pickled into the cache the first time a given file content is
+seen, and kept in memory for the rest of the run. The ``author year`` text of
+a citation and the pieces of its References entry are computed once per entry
+when the database is built.'''
+from collections import namedtuple
+
+import cache
+import decoding
+
+# bump when the layout of BibEntry, the formatting below or decoding changes
+CACHE_VERSION = 2
+
+# fields is the bibtexparser entry dict, cite the text used for \cite and ref
+# the list of strings making up its References entry after the number
+BibEntry = namedtuple('BibEntry',['fields','cite','ref'])
+
+# content hash -> database, for the lifetime of the process
+_loaded = {}
+
+def cite_text(entry) :
+    author = entry.get('author',entry.get('title','')).split(',')[0]
+    year = entry.get('year','')
+    return ' '.join([author,year])
+
+def ref_text(entry) :
+    author = ''
+    if 'author' in entry :
+        author = entry['author'].split(' and ')
+        author = author[0]+u' et al. '
+    title = (entry.get('title','')
+        .replace('{','')
+        .replace('}','')
+        .replace('\n',' ')
+    )
+    ref = [author,title+u'. ']
+
+    def fmt(key,pref='',suff='') :
+        if key in entry :
+            return pref+entry[key]+suff
+
+    ref.extend([
+        fmt('journal',suff=u'. '),
+        fmt('booktitle',suff=u'. '),
+        fmt('volume',suff=u', '),
+        fmt('pages',suff=u' '),
+        fmt('year',pref=u'(',suff=u')'),
+        fmt('howpublished',pref=u'(',suff=u')'),
+        fmt('note'),
+        u'.'
+    ])
+    return [_ for _ in ref if _ is not None]
+
+def parse_bib(bibtex_str) :
+    '''Parse *bibtex_str* into a dict of ID -> BibEntry'''
+    import bibtexparser
+    entries = bibtexparser.loads(bibtex_str).entries
+    return {_['ID']:BibEntry(_,cite_text(_),ref_text(_)) for _ in entries}
+
+def load_bib(bib_fn) :
+    '''Return the database for *bib_fn* as a dict of ID -> BibEntry, or None
+    if the file is empty. Only parses the file if its content has not been
+    seen before, in this process or in the on-disk cache.'''
+    with open(bib_fn,'rb') as f :
+        return load_bib_data(f.read())
+
+def load_bib_data(data) :
+    '''Like :func:`load_bib` for the contents of a .bib file as bytes'''
+    if not data :
+        return None
+
+    key = '{}-v{}'.format(cache.content_hash(data),CACHE_VERSION)
+    bibdb = _loaded.get(key)
+    if bibdb is None :
+        bibdb = cache.load_pickle('bib',key)
+    if bibdb is None :
+        bibdb = parse_bib(decoding.decode(data))
+        cache.dump_pickle('bib',key,bibdb)
+    _loaded[key] = bibdb
+    return bibdb
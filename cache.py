@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+'''Small helpers for the on-disk caches shared across runs.
+
+Everything lives under CACHE_DIR, which defaults to ~/.cache/overleaf2word and
+can be moved with the OVERLEAF2WORD_CACHE environment variable. Entries are
+keyed by content hash so they never need invalidating, only pruning.'''
+import hashlib
+import os
+import threading
+
+CACHE_DIR = os.environ.get('OVERLEAF2WORD_CACHE',
+    os.path.join(os.path.expanduser('~'),'.cache','overleaf2word')
+)
+
+def content_hash(data) :
+    '''Return the hex sha1 of *data*, a bytes object'''
+    return hashlib.sha1(data).hexdigest()
+
+def cache_path(kind,key,ext='.pickle') :
+    '''Return the path of cache entry *key* in the *kind* subdirectory'''
+    return os.path.join(CACHE_DIR,kind,key+ext)
+
+def load_pickle(kind,key) :
+    '''Return the cached object for *key*, or None if there isn't a usable one'''
+    import pickle
+    path = cache_path(kind,key)
+    try :
+        with open(path,'rb') as f :
+            return pickle.load(f)
+    except (OSError,EOFError,pickle.UnpicklingError,AttributeError,ImportError) :
+        return None
+
+def dump_pickle(kind,key,obj) :
+    '''Write *obj* to the cache under *key*. Failing to write the cache is not
+    an error, we just won't have a cache next time.'''
+    import pickle
+    path = cache_path(kind,key)
+    try :
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        # write to a temp file and move it so concurrent readers never see a
+        # partial entry, one per thread as well as per process
+        tmp_fn = '{}.{}.{}.tmp'.format(path,os.getpid(),threading.get_ident())
+        with open(tmp_fn,'wb') as f :
+            pickle.dump(obj,f,protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_fn,path)
+    except OSError as e :
+        print('could not write cache entry',path,e)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+'''Decode the .tex and .bib files of a project to text.
+
+Almost every file is UTF-8, and those are decoded as such in a single pass
+without looking any further. Only a file that is not valid UTF-8, like the
+Latin-1 sources of older projects, has its encoding guessed, by chardet from
+a bounded sample around the first byte that isn't UTF-8 rather than from the
+whole file. The guess is cached by the content hash of the file, in memory
+and on disk, so it is only made once per version of the file. The text is
+normalized the same way whatever the file looked like: no byte order mark,
+``\\n`` line endings and composed (NFC) characters.'''
+import codecs
+import io
+import threading
+import unicodedata
+
+import cache
+
+# bump when the detection below changes
+CACHE_VERSION = 1
+# bytes chardet looks at, around the first one that isn't UTF-8
+SAMPLE_SIZE = 1<<14
+# guesses chardet is less sure of than this fall back to FALLBACK
+MIN_CONFIDENCE = 0.2
+# what most non UTF-8 LaTeX is, Latin-1 with the quotes and dashes of
+# windows editors. latin-1 decodes anything so it is the last resort
+FALLBACK = 'cp1252'
+
+# content key -> encoding, for the lifetime of the process
+_detected = {}
+_lock = threading.Lock()
+
+_BOMS = ((codecs.BOM_UTF8,'utf-8'),(codecs.BOM_UTF16_LE,'utf-16-le'),
+         (codecs.BOM_UTF16_BE,'utf-16-be'))
+
+def normalize(text) :
+    '''Return *text* with ``\\n`` line endings and composed characters'''
+    if '\r' in text :
+        text = text.replace('\r\n','\n').replace('\r','\n')
+    if not text.isascii() and not unicodedata.is_normalized('NFC',text) :
+        text = unicodedata.normalize('NFC',text)
+    return text
+
+def detect(data,start=0) :
+    '''Return chardet's guess of the encoding of *data* from SAMPLE_SIZE
+    bytes around *start*, FALLBACK if it isn't sure enough'''
+    import chardet
+    lo = max(start-SAMPLE_SIZE//4,0)
+    guess = chardet.detect(data[lo:lo+SAMPLE_SIZE])
+    if not guess['encoding'] or guess['confidence'] < MIN_CONFIDENCE :
+        return FALLBACK
+    try :
+        return codecs.lookup(guess['encoding']).name
+    except LookupError :
+        return FALLBACK
+
+def encoding_of(data,start=0) :
+    '''Return the encoding *data*, which is not UTF-8, decodes with. The
+    first byte that isn't UTF-8 is at *start*. Guessed once per content.'''
+    key = '{}-v{}'.format(cache.content_hash(data),CACHE_VERSION)
+    with _lock :
+        encoding = _detected.get(key)
+    if encoding is None :
+        encoding = cache.load_pickle('encoding',key)
+    if encoding is None :
+        encoding = FALLBACK
+        for candidate in (detect(data,start),FALLBACK) :
+            try :
+                data.decode(candidate)
+            except (UnicodeDecodeError,LookupError) :
+                continue
+            encoding = candidate
+            break
+        else :
+            encoding = 'latin-1'
+        cache.dump_pickle('encoding',key,encoding)
+    with _lock :
+        _detected[key] = encoding
+    return encoding
+
+def _bom(data) :
+    for bom, encoding in _BOMS :
+        if data.startswith(bom) :
+            return bom, encoding
+    return None, None
+
+def decode(data,diagnostics=None,name=None) :
+    '''Return the normalized text of the file contents *data*. Files that are
+    not UTF-8 are recorded under the ``encoding`` kind in the
+    :class:`diagnostics.Diagnostics` *diagnostics* if one is given, with the
+    file *name*.'''
+    bom, encoding = _bom(data)
+    if bom is not None :
+        return normalize(data[len(bom):].decode(encoding,'replace'))
+    try :
+        return normalize(data.decode('utf-8'))
+    except UnicodeDecodeError as e :
+        encoding = encoding_of(data,e.start)
+    if diagnostics is not None :
+        diagnostics.add('encoding',encoding,None,name)
+    return normalize(data.decode(encoding))
+
+def open_text(f,diagnostics=None,name=None) :
+    '''Return a text file reading the binary file *f*, for reading a file
+    too large to decode at once. The encoding is picked from its first
+    SAMPLE_SIZE bytes, bytes further on that don't fit it are replaced, and
+    line endings are translated to ``\\n``.'''
+    head = f.read(SAMPLE_SIZE)
+    f.seek(0)
+    bom, encoding = _bom(head)
+    if bom is not None :
+        f.read(len(bom))
+    else :
+        try :
+            # the sample may end half way through a character
+            codecs.getincrementaldecoder('utf-8')().decode(head)
+            encoding = 'utf-8'
+        except UnicodeDecodeError as e :
+            encoding = encoding_of(head,e.start)
+            if diagnostics is not None :
+                diagnostics.add('encoding',encoding,None,name)
+    return io.TextIOWrapper(f,encoding=encoding,errors='replace')
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+'''Problems found while converting a file, collected instead of printed.
+
+A :class:`Diagnostics` counts what the converter could not handle, like
+unrecognized commands, equations and misplaced ``\\item``s, by kind and
+command name, and keeps the source location of the first few of each. One
+summary is printed per file, or none, or every problem as it is found,
+depending on the verbosity::
+
+    diag = Diagnostics('main.tex',verbosity=QUIET)
+    tex_to_word('main.tex','.',diagnostics=diag)
+    diag.as_dict()
+    # {'file': 'main.tex', 'total': 14,
+    #  'diagnostics': [{'kind': 'unrecognized_command', 'name': 'usepackage',
+    #                   'count': 9, 'samples': [{'file': 'main.tex',
+    #                   'line': 2, 'text': '\\usepackage{amsmath}'}, ...]},
+    #                  ...]}
+'''
+from collections import OrderedDict
+import json
+
+# nothing is printed, a one line per kind summary for each file, or every
+# diagnostic as it is found like the converter used to
+QUIET = 0
+SUMMARY = 1
+VERBOSE = 2
+# used when a Diagnostics is not given a verbosity
+VERBOSITY = SUMMARY
+# source locations kept for each kind and name
+SAMPLES = 3
+# longest source text kept for a sample
+SAMPLE_TEXT = 80
+
+MESSAGES = {
+    'unrecognized_command':'unrecognized command',
+    'equation':'could not convert equation, kept as text',
+    'math_command':'unknown command in an equation, kept as text',
+    'item_outside_list':'saw \\item outside of a list, ignored',
+    'item_unknown_list':'saw \\item inside an environment I dont recognize, ignored',
+    'lexer_error':'could not tokenize',
+    'encoding':'file is not UTF-8, decoded as',
+    'missing_include':'could not find included file',
+    'circular_include':'circular include, skipped',
+}
+
+# kinds whose name is not a command
+PLAIN_NAMES = frozenset(['encoding'])
+
+def _label(kind,name) :
+    # the message of kind and the command or other thing it is about
+    if not name :
+        return MESSAGES.get(kind,kind)
+    return MESSAGES.get(kind,kind)+(' ' if kind in PLAIN_NAMES else ' \\')+name
+
+class Diagnostics(object) :
+    '''The diagnostics of converting *file*. *source* is the file the tokens
+    being converted come from, it changes while an included file is
+    converted.'''
+
+    def __init__(self,file=None,verbosity=None,samples=SAMPLES) :
+        self.file = file
+        self.source = file
+        self.verbosity = VERBOSITY if verbosity is None else verbosity
+        self.samples = samples
+        # (kind,name) -> [count, samples], in the order first seen
+        self._entries = OrderedDict()
+        self.total = 0
+
+    def add(self,kind,name=None,line=None,text=None) :
+        '''Record a diagnostic of *kind*, about the command *name* if there
+        is one, found at *line* of the current source'''
+        entry = self._entries.get((kind,name))
+        if entry is None :
+            entry = self._entries[(kind,name)] = [0,[]]
+        entry[0] += 1
+        self.total += 1
+        if len(entry[1]) < self.samples :
+            if text is not None and len(text) > SAMPLE_TEXT :
+                text = text[:SAMPLE_TEXT]+'...'
+            entry[1].append({'file':self.source,'line':line,'text':text})
+        if self.verbosity >= VERBOSE :
+            print('{}{}{}'.format(_label(kind,name),
+                ' (line {})'.format(self._where(line)) if line is not None
+                else '',': '+text if text else ''))
+
+    def info(self,text) :
+        '''Print *text*, a note on how the conversion went rather than a
+        problem with the input, if the verbosity is VERBOSE'''
+        if self.verbosity >= VERBOSE :
+            print(text)
+
+    def counts(self) :
+        '''Return a dict of kind -> number of diagnostics'''
+        counts = {}
+        for (kind,name), (count,samples) in self._entries.items() :
+            counts[kind] = counts.get(kind,0)+count
+        return counts
+
+    def as_dict(self) :
+        '''Return the summary as a JSON serializable dict, most frequent
+        diagnostics first'''
+        entries = sorted(self._entries.items(),key=lambda _: -_[1][0])
+        return {
+            'file':self.file,
+            'total':self.total,
+            'diagnostics':[{'kind':kind,'name':name,'count':count,
+                            'samples':list(samples)}
+                           for (kind,name), (count,samples) in entries],
+        }
+
+    def to_json(self,**kwargs) :
+        return json.dumps(self.as_dict(),**kwargs)
+
+    def _where(self,line,file=None) :
+        # the line, and the file if it is an included one
+        file = self.source if file is None else file
+        return '{}:{}'.format(file,line) if file != self.file else str(line)
+
+    def summary(self) :
+        '''Return the summary as text, a line per kind and name'''
+        lines = ['{} diagnostics in {}'.format(self.total,self.file)]
+        for d in self.as_dict()['diagnostics'] :
+            where = ', '.join(self._where(_['line'],_['file'])
+                for _ in d['samples'] if _['line'] is not None
+            )
+            lines.append('  {:>5} {}{}'.format(d['count'],
+                _label(d['kind'],d['name']),
+                ' (line {}{})'.format(where,', ...' if d['count'] > len(d['samples']) else '')
+                if where else ''
+            ))
+        return '\n'.join(lines)
+
+    def report(self) :
+        '''Print the summary if there is anything in it and the verbosity
+        asks for it'''
+        if self.total and self.verbosity >= SUMMARY :
+            print(self.summary())
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''Where tex_to_word reads its inputs from.
+
+A :class:`WorktreeSource` reads files from a checked out directory, a
+:class:`TreeSource` reads blobs straight out of a commit's tree so no working
+tree is needed, e.g. to convert from a bare mirror or to convert every tagged
+revision of a project. Blob contents are kept in a bounded cache keyed by the
+blob sha, so files that did not change between the commits being converted
+are only read out of the object database once.'''
+from collections import OrderedDict
+from fnmatch import fnmatch
+from glob import glob
+import io
+import os
+import posixpath
+
+# blob sha -> contents, most recently used last
+_blobs = OrderedDict()
+BLOB_CACHE_SIZE = 256
+
+class WorktreeSource(object) :
+    '''Read files relative to the directory *root*. Files outside of it,
+    symlinks included, can't be read.'''
+
+    def __init__(self,root) :
+        self.root = root
+
+    def path(self,fn) :
+        path = os.path.join(self.root,fn)
+        root = os.path.realpath(self.root)
+        if os.path.commonpath([root,os.path.realpath(path)]) != root :
+            raise IOError('{} is outside of {}'.format(fn,self.root))
+        return path
+
+    def read(self,fn) :
+        with open(self.path(fn),'rb') as f :
+            return f.read()
+
+    def open(self,fn) :
+        return open(self.path(fn),'rb')
+
+    def glob(self,pattern) :
+        '''Return the paths relative to root of the files matching *pattern*'''
+        return [os.path.relpath(_,self.root) for _ in glob(self.path(pattern))]
+
+class TreeSource(object) :
+    '''Read files from the tree of a GitPython *commit*'''
+
+    def __init__(self,commit) :
+        self.commit = commit
+        self.tree = commit.tree
+
+    def blob(self,fn) :
+        path = posixpath.normpath(fn.replace(os.sep,'/'))
+        try :
+            return self.tree/path
+        except KeyError :
+            raise FileNotFoundError('{} not found in commit {}'.format(
+                fn,self.commit.hexsha))
+
+    def read(self,fn) :
+        blob = self.blob(fn)
+        data = _blobs.get(blob.hexsha)
+        if data is None :
+            data = blob.data_stream.read()
+            _blobs[blob.hexsha] = data
+            if len(_blobs) > BLOB_CACHE_SIZE :
+                _blobs.popitem(last=False)
+        else :
+            _blobs.move_to_end(blob.hexsha)
+        return data
+
+    def open(self,fn) :
+        return io.BytesIO(self.read(fn))
+
+    def glob(self,pattern) :
+        '''Return the paths of the top level files matching *pattern*'''
+        return [_.path for _ in self.tree.blobs if fnmatch(_.name,pattern)]
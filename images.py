@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+'''Prepare \\includegraphics images for embedding.
+
+Figures from LaTeX projects are usually much larger than they need to be at
+the size they are shown in the Word doc. Each image is resampled to its
+display width at TARGET_DPI and recompressed, JPEGs stay JPEGs and everything
+else becomes PNG. Results are cached by the image content hash plus the
+processing parameters, in memory and on disk. An :class:`ImagePipeline`
+processes the images of a document in a thread pool while the document is
+being assembled.'''
+from collections import namedtuple
+import io
+import re
+import threading
+
+import cache
+
+# images are assumed to be 72 dpi when working out how wide to show them
+SOURCE_DPI = 72
+# maximum display width in inches
+MAX_WIDTH = 6
+# resolution the embedded images are resampled to
+TARGET_DPI = 150
+JPEG_QUALITY = 85
+IMAGE_WORKERS = 4
+
+# bump when the processing below changes
+CACHE_VERSION = 1
+
+# same shape as the COMMAND token in overleaf2word, only what we need to find
+# the image paths without running the lexer
+INCLUDEGRAPHICS_RE = re.compile(r'\\includegraphics(?:\[[^]]+\])?{([^}]+)}')
+
+# data is the image to embed, width its display width in inches
+Picture = namedtuple('Picture',['data','width'])
+
+# cache key -> Picture, for the lifetime of the process
+_processed = {}
+_lock = threading.Lock()
+
+def process_image(data,dpi=TARGET_DPI,max_width=MAX_WIDTH,quality=JPEG_QUALITY) :
+    '''Return a Picture for the image file contents *data*, downscaled to
+    *dpi* at its display width and recompressed'''
+    key = '{}-{}-{}-{}-v{}'.format(cache.content_hash(data),dpi,max_width,
+        quality,CACHE_VERSION
+    )
+    with _lock :
+        pic = _processed.get(key)
+    if pic is None :
+        pic = cache.load_pickle('images',key)
+        if pic is None :
+            pic = _process(data,dpi,max_width,quality)
+            cache.dump_pickle('images',key,pic)
+        with _lock :
+            _processed[key] = pic
+    return pic
+
+def _process(data,dpi,max_width,quality) :
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    fmt = img.format
+    width = min(img.size[0]/SOURCE_DPI,max_width)
+
+    target_px = max(1,int(round(width*dpi)))
+    resized = img.size[0] > target_px
+    if resized :
+        height = max(1,int(round(img.size[1]*target_px/img.size[0])))
+        img = img.resize((target_px,height),Image.LANCZOS)
+
+    out = io.BytesIO()
+    if fmt == 'JPEG' :
+        if img.mode not in ('L','RGB') :
+            img = img.convert('RGB')
+        img.save(out,format='JPEG',quality=quality,optimize=True,dpi=(dpi,dpi))
+    else :
+        if img.mode not in ('1','L','LA','P','RGB','RGBA') :
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        img.save(out,format='PNG',optimize=True,dpi=(dpi,dpi))
+    out = out.getvalue()
+
+    # small images word can show as they are may not get any smaller
+    if not resized and fmt in ('JPEG','PNG','GIF') and len(out) >= len(data) :
+        out = data
+    return Picture(out,width)
+
+class ImagePipeline(object) :
+    '''Process the images of one document ahead of time in a thread pool.
+    Images are read from *source*, a :mod:`gitsource` source.'''
+
+    def __init__(self,source,workers=IMAGE_WORKERS,**params) :
+        self.source = source
+        self.params = params
+        self.workers = workers
+        self._pool = None
+        self._futures = {}
+
+    def _load(self,path) :
+        return process_image(self.source.read(path),**self.params)
+
+    def prefetch(self,paths) :
+        '''Start processing every image in *paths*'''
+        for path in paths :
+            if path in self._futures :
+                continue
+            if self._pool is None :
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            self._futures[path] = self._pool.submit(self._load,path)
+
+    def prefetch_tex(self,tex) :
+        '''Start processing every image \\includegraphics'ed in *tex*'''
+        self.prefetch(INCLUDEGRAPHICS_RE.findall(tex))
+
+    def get(self,path) :
+        '''Return the Picture for *path*, raising any error reading it'''
+        if path not in self._futures :
+            return self._load(path)
+        return self._futures[path].result()
+
+    def close(self) :
+        if self._pool is not None :
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self,*exc) :
+        self.close()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+'''Resolve ``\\input`` and ``\\include`` into a single document.
+
+An :class:`IncludeGraph` reads the sub-files a document includes from a
+:mod:`gitsource` source, tokenizes each of them once however many times it is
+included, and splices their tokens in where they are included. Sub-files
+are tokenized in this process, starting worker processes costs more than
+tokenizing ordinary chapters. Only the files of a level of the graph that
+add up to TOKEN_POOL_BYTES or more are tokenized in parallel worker
+processes, if more than one worker is asked for, or in the executor the
+caller passes in. Token lists are cached by content hash, in memory and on
+disk, so after a change to one chapter only that chapter is tokenized
+again.'''
+from collections import namedtuple, OrderedDict
+import os
+import re
+import threading
+
+import cache
+import decoding
+from diagnostics import Diagnostics
+
+# bump when Tok, the tokenizers or decoding change
+CACHE_VERSION = 2
+# worker processes tokenizing sub-files, 1 tokenizes them in this process
+TOKEN_WORKERS = 1
+# text of the sub-files to tokenize at once it takes for a pool of workers
+# to pay off
+TOKEN_POOL_BYTES = 1<<20
+# content key -> token list, most recently used last
+_tokens = OrderedDict()
+_tokens_lock = threading.Lock()
+TOKEN_CACHE_SIZE = 64
+
+INCLUDE_COMMANDS = ('input','include')
+# the same comment rule as the lexer in overleaf2word
+_COMMENT_RE = re.compile(r'(?<![\\])%.*')
+INCLUDE_RE = re.compile(r'\\(input|include)\{([^}]+)\}')
+
+# a token of a sub-file, with the fields of the lexer tokens _convert reads,
+# small and cheap to pickle
+Tok = namedtuple('Tok',['type','value','lineno','lexpos','command','opts',
+    'args','post_opts','rest'])
+
+def freeze(tok) :
+    '''Return the lexer token *tok* as a Tok'''
+    return Tok(tok.type,tok.value,tok.lineno,tok.lexpos,
+        getattr(tok,'command',None),getattr(tok,'opts',None),
+        getattr(tok,'args',None),getattr(tok,'post_opts',None),
+        getattr(tok,'rest',None)
+    )
+
+def candidates(command,name) :
+    '''Return the paths LaTeX tries for ``\\<command>{name}``, \\include
+    always adds .tex, \\input only when there is no such file. Names that
+    are absolute or lead out of the project have none.'''
+    name = os.path.normpath(name.strip())
+    if (os.path.isabs(name) or name == os.pardir or
+        name.startswith(os.pardir+os.sep)) :
+        return []
+    if command == 'include' :
+        return [name+'.tex']
+    if name.endswith('.tex') :
+        return [name]
+    return [name+'.tex',name]
+
+def find_includes(tex) :
+    '''Return the (command,name) of every \\input and \\include in *tex*
+    outside of comments'''
+    return INCLUDE_RE.findall(_COMMENT_RE.sub('',tex))
+
+class _Recorder(object) :
+    '''Stands in for the Diagnostics of a document in a worker process,
+    keeps the arguments of every :meth:`add` to pass them on to it in the
+    parent'''
+
+    def __init__(self) :
+        self.added = []
+
+    def add(self,kind,name=None,line=None,text=None) :
+        self.added.append((kind,name,line,text))
+
+def _tokenize(text,tokenizer,diagnostics=None) :
+    # module level so it can run in a worker process
+    from overleaf2word import tokenize
+    return [freeze(_) for _ in tokenize(text,tokenizer,diagnostics)]
+
+def _tokenize_recorded(text,tokenizer) :
+    # in a worker process, returns the tokens and the diagnostics found
+    recorder = _Recorder()
+    return _tokenize(text,tokenizer,recorder), recorder.added
+
+def _cache_key(data,tokenizer) :
+    from overleaf2word import TOKENIZER
+    return '{}-{}-v{}'.format(cache.content_hash(data),tokenizer or TOKENIZER,
+        CACHE_VERSION)
+
+def _remember(key,toks) :
+    # documents can be converted in several threads at once
+    with _tokens_lock :
+        _tokens[key] = toks
+        _tokens.move_to_end(key)
+        if len(_tokens) > TOKEN_CACHE_SIZE :
+            _tokens.popitem(last=False)
+
+class IncludeGraph(object) :
+    '''The \\input/\\include graph of a document whose files are read from
+    *source*. *on_read* is called with the path and text of every sub-file
+    as it is read, e.g. to prefetch its images. Missing and circular
+    includes are recorded in the :class:`diagnostics.Diagnostics`
+    *diagnostics*, and its source is set to the file the tokens being
+    expanded come from. Sub-files are tokenized in *executor*, e.g. a
+    ProcessPoolExecutor shared by many documents, if one is given.'''
+
+    def __init__(self,source,tokenizer=None,workers=None,on_read=None,
+        diagnostics=None,executor=None) :
+        self.source = source
+        self.diagnostics = diagnostics or Diagnostics()
+        self.tokenizer = tokenizer
+        self.workers = workers or TOKEN_WORKERS
+        self.executor = executor
+        self.on_read = on_read
+        # path -> tokens, content hash and the paths it includes
+        self.tokens = {}
+        self.hashes = {}
+        self.edges = {}
+        # path -> contents of the files read but not tokenized yet
+        self._data = {}
+        # (command,name) -> path
+        self._resolved = {}
+        self.tokenized = 0
+
+    def resolve(self,command,name) :
+        '''Return the path of ``\\<command>{name}`` in the source, or None'''
+        key = (command,name)
+        if key not in self._resolved :
+            self._resolved[key] = None
+            for path in candidates(command,name) :
+                try :
+                    data = self.source.read(path)
+                except (IOError,OSError) :
+                    continue
+                self._resolved[key] = path
+                self._add(path,data)
+                break
+        return self._resolved[key]
+
+    def _add(self,path,data) :
+        if path not in self.tokens :
+            self._data[path] = data
+            self.tokens[path] = None
+
+    def includes(self,toks) :
+        '''Return the paths included by the tokens *toks*'''
+        paths = []
+        for tok in toks :
+            if tok.type == 'COMMAND' and tok.command in INCLUDE_COMMANDS and tok.args :
+                path = self.resolve(tok.command,tok.args)
+                if path is not None and path not in paths :
+                    paths.append(path)
+        return paths
+
+    def load(self,paths) :
+        '''Read and tokenize the files *paths* and everything they include,
+        a level of the graph at a time'''
+        while paths :
+            self._tokenize([_ for _ in paths if self.tokens[_] is None])
+            level = []
+            for path in paths :
+                if path not in self.edges :
+                    self.edges[path] = self.includes(self.tokens[path])
+                    level.extend(_ for _ in self.edges[path]
+                                 if _ not in self.edges and _ not in level)
+            paths = level
+
+    def _tokenize(self,paths) :
+        todo = []
+        for path in paths :
+            data = self._data.pop(path)
+            text = decoding.decode(data,self.diagnostics,path)
+            if self.on_read is not None :
+                self.on_read(path,text)
+            key = _cache_key(data,self.tokenizer)
+            self.hashes[path] = cache.content_hash(data)
+            toks = _tokens.get(key)
+            if toks is None :
+                toks = cache.load_pickle('tokens',key)
+            if toks is None :
+                todo.append((path,key,text))
+            else :
+                self.tokens[path] = toks
+                _remember(key,toks)
+
+        texts = [_[2] for _ in todo]
+        workers = min(self.workers,len(todo))
+        if self.executor is not None and len(todo) > 1 :
+            results = list(self.executor.map(_tokenize_recorded,texts,
+                [self.tokenizer]*len(todo)))
+        elif workers > 1 and sum(map(len,texts)) >= TOKEN_POOL_BYTES :
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool :
+                results = list(pool.map(_tokenize_recorded,texts,
+                    [self.tokenizer]*len(todo)))
+        else :
+            results = None
+
+        diagnostics = self.diagnostics
+        source = diagnostics.source
+        for i, (path,key,text) in enumerate(todo) :
+            # the problems found are in the sub-file
+            diagnostics.source = path
+            if results is None :
+                toks = _tokenize(text,self.tokenizer,diagnostics)
+            else :
+                toks, added = results[i]
+                for args in added :
+                    diagnostics.add(*args)
+            self.tokens[path] = toks
+            self.tokenized += 1
+            _remember(key,toks)
+            cache.dump_pickle('tokens',key,toks)
+        diagnostics.source = source
+
+    def expand(self,toks,stack=()) :
+        '''Yield the tokens *toks* with every \\input and \\include replaced
+        by the tokens of the file it includes. \\include puts the file on
+        pages of its own like LaTeX does.'''
+        for tok in toks :
+            if tok.type != 'COMMAND' or tok.command not in INCLUDE_COMMANDS :
+                yield tok
+                continue
+            path = self.resolve(tok.command,tok.args) if tok.args else None
+            if path is None :
+                self.diagnostics.add('missing_include',tok.command,tok.lineno,
+                    tok.value)
+                continue
+            if path in stack :
+                self.diagnostics.add('circular_include',tok.command,tok.lineno,
+                    ' -> '.join(stack+(path,)))
+                continue
+            if path not in self.edges :
+                self.load([path])
+            clearpage = Tok('COMMAND','\\clearpage',tok.lineno,tok.lexpos,
+                'clearpage',None,None,None,'')
+            if tok.command == 'include' :
+                yield clearpage
+            source = self.diagnostics.source
+            self.diagnostics.source = path
+            for sub in self.expand(self.tokens[path],stack+(path,)) :
+                yield sub
+            self.diagnostics.source = source
+            if tok.command == 'include' :
+                yield clearpage
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+'''Per-repo manifest of the inputs each converted .tex file was built from.
+
+The manifest lives in the repo directory and maps each latex path to the
+content hashes of the .tex file, the files it ``\\input``s or ``\\include``s,
+the .bib file, the .docx template and every ``\\includegraphics`` target it
+used. A file only needs to be converted again when one of those hashes
+changes or its .docx has gone missing. The manifest also records the commit
+the repo was last fully converted at, so a sync can stop early when the
+remote has not moved.'''
+import hashlib
+import json
+import os
+
+from images import INCLUDEGRAPHICS_RE
+from includes import candidates, find_includes
+
+MANIFEST_FN = '.overleaf2word.json'
+
+def file_hash(path,blocksize=1<<16) :
+    '''Return the hex sha1 of the contents of *path*, or None if it does not
+    exist'''
+    if not os.path.exists(path) :
+        return None
+    h = hashlib.sha1()
+    with open(path,'rb') as f :
+        for block in iter(lambda: f.read(blocksize),b'') :
+            h.update(block)
+    return h.hexdigest()
+
+def input_hashes(tex_fn,repo_dir,bib_fn=None,template=None) :
+    '''Return a dict of path -> content hash for everything the conversion of
+    *tex_fn* reads, following \\input and \\include, and the .docx
+    *template* if there is one. Paths are relative to *repo_dir*.'''
+    def rel(path) :
+        return os.path.relpath(path,repo_dir)
+
+    hashes = {}
+    if bib_fn :
+        hashes[rel(bib_fn)] = file_hash(bib_fn)
+    if template :
+        hashes[rel(template)] = file_hash(template)
+    todo = [tex_fn]
+    while todo :
+        fn = todo.pop()
+        if rel(fn) in hashes :
+            continue
+        hashes[rel(fn)] = file_hash(fn)
+        with open(fn,'rb') as f :
+            tex = f.read().decode('utf-8','replace')
+        for pic in INCLUDEGRAPHICS_RE.findall(tex) :
+            pic_path = os.path.join(repo_dir,pic)
+            hashes[rel(pic_path)] = file_hash(pic_path)
+        for command, name in find_includes(tex) :
+            for path in candidates(command,name) :
+                path = os.path.join(repo_dir,path)
+                if os.path.isfile(path) :
+                    todo.append(path)
+                    break
+    return hashes
+
+class Manifest(object) :
+    '''The conversion manifest of one repo directory'''
+
+    def __init__(self,repo_dir) :
+        self.repo_dir = repo_dir
+        self.path = os.path.join(repo_dir,MANIFEST_FN)
+        self.entries = {}
+        self.commit = None
+        if os.path.exists(self.path) :
+            try :
+                with open(self.path) as f :
+                    data = json.load(f)
+                self.entries = data.get('files',{})
+                self.commit = data.get('commit')
+            except ValueError :
+                # a corrupt manifest just means everything gets converted
+                pass
+
+    def key(self,tex_fn) :
+        return os.path.relpath(tex_fn,self.repo_dir)
+
+    def check(self,tex_fn,bib_fn=None,doc_fn=None,template=None) :
+        '''Return a (current, hashes) tuple, *current* is True if the inputs
+        of *tex_fn* are unchanged since it was recorded and *doc_fn* exists'''
+        hashes = input_hashes(tex_fn,self.repo_dir,bib_fn,template)
+        current = (
+            self.entries.get(self.key(tex_fn)) == hashes and
+            (doc_fn is None or os.path.exists(doc_fn))
+        )
+        return current, hashes
+
+    def converted_commit(self,tex_fns) :
+        '''Return the commit the repo was last converted at if every file in
+        *tex_fns* was converted then and its .docx is still there, else None.
+        Only looks at the manifest and the .docx files, nothing is hashed.'''
+        # imported here since overleaf2word imports this module
+        from overleaf2word import docx_path
+        for tex_fn in tex_fns :
+            if self.key(tex_fn) not in self.entries :
+                return None
+            if not os.path.exists(docx_path(tex_fn)) :
+                return None
+        return self.commit
+
+    def record(self,tex_fn,hashes) :
+        self.entries[self.key(tex_fn)] = hashes
+
+    def save(self) :
+        tmp_fn = self.path+'.tmp'
+        with open(tmp_fn,'w') as f :
+            json.dump({'commit':self.commit,'files':self.entries},f,
+                indent=1,sort_keys=True
+            )
+        os.replace(tmp_fn,self.path)
@@ -0,0 +1,641 @@
+# -*- coding: utf-8 -*-
+'''Convert LaTeX math to Office Math Markup, the native equations of Word.
+
+:func:`convert` turns the LaTeX of an equation, without the ``$`` or the
+environment around it, into the xml that goes inside an ``<m:oMath>``.
+Fractions, roots, scripts, sums and integrals, ``\\left``/``\\right``
+delimiters, accents, fonts, ``\\text``, matrices and ``cases`` are
+converted, symbols and greek letters become their unicode characters.
+Commands it does not know are kept as text and listed in the result::
+
+    >>> convert(r'\\frac{a}{b}').xml
+    '<m:f><m:num><m:r><m:t>a</m:t></m:r></m:num><m:den>...</m:den></m:f>'
+
+Papers repeat the same formulas a lot, so converted ones are kept in
+:data:`formulas`, a :class:`FormulaCache` keyed by the LaTeX with its white
+space normalized, least recently used evicted first. If the
+OVERLEAF2WORD_MATH_CACHE environment variable is set the cache is loaded
+from and saved to CACHE_DIR, so formulas are only converted once across
+runs too.'''
+from collections import OrderedDict, namedtuple
+import os
+import re
+import threading
+
+import cache
+
+M_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/math'
+
+# formulas kept in memory
+CACHE_SIZE = 4096
+# bump when the xml made for a formula changes
+CACHE_VERSION = 1
+# keep the converted formulas in CACHE_DIR between runs
+PERSIST = os.environ.get('OVERLEAF2WORD_MATH_CACHE','') not in ('','0')
+
+# xml of a converted formula, or None if it could not be converted and why,
+# and the names of the commands that were kept as text
+Formula = namedtuple('Formula',['xml','unknown','error'])
+
+class MathError(ValueError) :
+    '''The LaTeX of a formula can't be converted'''
+
+SYMBOLS = {
+    # greek
+    'alpha':'α','beta':'β','gamma':'γ','delta':'δ','epsilon':'ϵ',
+    'varepsilon':'ε','zeta':'ζ','eta':'η','theta':'θ','vartheta':'ϑ',
+    'iota':'ι','kappa':'κ','lambda':'λ','mu':'μ','nu':'ν','xi':'ξ',
+    'pi':'π','varpi':'ϖ','rho':'ρ','varrho':'ϱ','sigma':'σ',
+    'varsigma':'ς','tau':'τ','upsilon':'υ','phi':'ϕ','varphi':'φ',
+    'chi':'χ','psi':'ψ','omega':'ω','Gamma':'Γ','Delta':'Δ','Theta':'Θ',
+    'Lambda':'Λ','Xi':'Ξ','Pi':'Π','Sigma':'Σ','Upsilon':'Υ','Phi':'Φ',
+    'Psi':'Ψ','Omega':'Ω',
+    # operators and relations
+    'times':'×','cdot':'⋅','div':'÷','pm':'±','mp':'∓','ast':'∗',
+    'star':'⋆','circ':'∘','bullet':'∙','oplus':'⊕','otimes':'⊗',
+    'odot':'⊙','cup':'∪','cap':'∩','setminus':'∖','wedge':'∧','land':'∧',
+    'vee':'∨','lor':'∨','neg':'¬','lnot':'¬','leq':'≤','le':'≤',
+    'geq':'≥','ge':'≥','neq':'≠','ne':'≠','ll':'≪','gg':'≫','approx':'≈',
+    'equiv':'≡','sim':'∼','simeq':'≃','cong':'≅','propto':'∝','in':'∈',
+    'notin':'∉','ni':'∋','subset':'⊂','subseteq':'⊆','supset':'⊃',
+    'supseteq':'⊇','perp':'⊥','parallel':'∥','mid':'∣','to':'→',
+    'rightarrow':'→','leftarrow':'←','gets':'←','leftrightarrow':'↔',
+    'Rightarrow':'⇒','Leftarrow':'⇐','Leftrightarrow':'⇔','mapsto':'↦',
+    'implies':'⟹','iff':'⟺','uparrow':'↑','downarrow':'↓',
+    'longrightarrow':'⟶','longleftarrow':'⟵',
+    # everything else
+    'infty':'∞','partial':'∂','nabla':'∇','forall':'∀','exists':'∃',
+    'emptyset':'∅','varnothing':'∅','ldots':'…','dots':'…','cdots':'⋯',
+    'vdots':'⋮','ddots':'⋱','prime':'′','angle':'∠','hbar':'ℏ','ell':'ℓ',
+    'Re':'ℜ','Im':'ℑ','aleph':'ℵ','dagger':'†','top':'⊤','bot':'⊥',
+    'vert':'|','Vert':'‖','lvert':'|','rvert':'|','lVert':'‖','rVert':'‖',
+    'langle':'⟨','rangle':'⟩','lfloor':'⌊','rfloor':'⌋','lceil':'⌈',
+    'rceil':'⌉','lbrace':'{','rbrace':'}','backslash':'\\','colon':':',
+    'quad':'\u2003','qquad':'\u2003\u2003',
+}
+# escaped characters, the spacing ones included
+ESCAPES = {'{':'{','}':'}','|':'‖','%':'%','$':'$','&':'&','#':'#','_':'_',
+    ',':'\u2009',':':'\u205f','>':'\u205f',';':'\u2004','!':'',' ':' '}
+# characters that look different in math
+CHARS = {'-':'−','*':'∗',"'":'′','~':'\u00a0'}
+DELIMITERS = {'.':'','\\{':'{','\\}':'}','\\|':'‖','\\vert':'|',
+    '\\Vert':'‖','\\lvert':'|','\\rvert':'|','\\lVert':'‖','\\rVert':'‖',
+    '\\langle':'⟨','\\rangle':'⟩','\\lfloor':'⌊','\\rfloor':'⌋',
+    '\\lceil':'⌈','\\rceil':'⌉','\\lbrace':'{','\\rbrace':'}',
+    '\\backslash':'\\'}
+# n-ary operators, with their limits above and below or to the side
+NARY = {'sum':('∑','undOvr'),'prod':('∏','undOvr'),'coprod':('∐','undOvr'),
+    'bigcup':('⋃','undOvr'),'bigcap':('⋂','undOvr'),
+    'bigoplus':('⨁','undOvr'),'bigotimes':('⨂','undOvr'),
+    'bigvee':('⋁','undOvr'),'bigwedge':('⋀','undOvr'),
+    'int':('∫','subSup'),'iint':('∬','subSup'),'iiint':('∭','subSup'),
+    'oint':('∮','subSup')}
+# functions written upright, the ones whose subscript goes underneath
+FUNCTIONS = frozenset(['sin','cos','tan','cot','sec','csc','arcsin','arccos',
+    'arctan','sinh','cosh','tanh','coth','log','ln','lg','exp','dim','ker',
+    'deg','hom','arg','mod','bmod'])
+LIMITS = frozenset(['lim','limsup','liminf','max','min','sup','inf','det',
+    'gcd','Pr','argmax','argmin'])
+# the combining characters of the accents
+ACCENTS = {'hat':'\u0302','widehat':'\u0302','bar':'\u0305','vec':'\u20d7',
+    'tilde':'\u0303','widetilde':'\u0303','dot':'\u0307','ddot':'\u0308',
+    'check':'\u030c','breve':'\u0306','acute':'\u0301','grave':'\u0300'}
+# run properties of the font commands
+_UPRIGHT = '<m:sty m:val="p"/>'
+_NORMAL = '<m:nor/>'
+FONTS = {'mathrm':_UPRIGHT,'mathup':_UPRIGHT,'mathbf':'<m:sty m:val="b"/>',
+    'mathit':'<m:sty m:val="i"/>','boldsymbol':'<m:sty m:val="bi"/>',
+    'bm':'<m:sty m:val="bi"/>',
+    'mathbb':'<m:scr m:val="double-struck"/>'+_UPRIGHT,
+    'mathcal':'<m:scr m:val="script"/>'+_UPRIGHT,
+    'mathscr':'<m:scr m:val="script"/>'+_UPRIGHT,
+    'mathfrak':'<m:scr m:val="fraktur"/>'+_UPRIGHT,
+    'mathsf':'<m:scr m:val="sans-serif"/>'+_UPRIGHT,
+    'mathtt':'<m:scr m:val="monospace"/>'+_UPRIGHT}
+# the old style font switches, for the rest of the group
+SWITCHES = {'rm':_UPRIGHT,'bf':'<m:sty m:val="b"/>','it':'<m:sty m:val="i"/>',
+    'cal':'<m:scr m:val="script"/>'+_UPRIGHT}
+TEXT = frozenset(['text','textrm','textnormal','mbox','hbox','textit',
+    'textbf'])
+MATRICES = {'matrix':('',''),'smallmatrix':('',''),'array':('',''),
+    'pmatrix':('(',')'),'bmatrix':('[',']'),'Bmatrix':('{','}'),
+    'vmatrix':('|','|'),'Vmatrix':('‖','‖')}
+ARRAYS = frozenset(['aligned','alignedat','gathered','split','align',
+    'align*','gather','gather*','multline','multline*','eqnarray',
+    'eqnarray*','equation','equation*'])
+# commands without a visible result, and the ones whose argument is dropped
+IGNORED = frozenset(['displaystyle','textstyle','scriptstyle',
+    'scriptscriptstyle','limits','nolimits','nonumber','notag','big','Big','bigg','Bigg','bigl','bigr','Bigl','Bigr','biggl','biggr',
+    'Biggl','Biggr','bigm','Bigm','allowbreak','mathop'])
+DROPPED = frozenset(['label','tag','hspace','vspace','phantom','hphantom',
+    'vphantom','color'])
+# what ends the operand of a sum or integral and the argument of a function
+_RELATIONS = frozenset(['=','<','>','+','−',',',';','&','\\\\','-',
+    '\\pm','\\mp','\\leq','\\le','\\geq','\\ge','\\neq','\\ne','\\approx',
+    '\\equiv','\\sim','\\simeq','\\cong','\\propto','\\to','\\rightarrow',
+    '\\Rightarrow','\\implies','\\iff','\\in','\\subset','\\subseteq',
+    '\\ll','\\gg'])
+
+_TOKEN_RE = re.compile(r'\\([a-zA-Z]+)|\\(.)|(\s+)|%[^\n]*|(.)',re.S)
+_SPACE_RE = re.compile(r'\s+')
+_QUOTE = {'"':'&quot;'}
+
+def escape(text,entities=None) :
+    '''Return *text* with &, < and > escaped, and the other characters in the
+    dict *entities* replaced, like xml.sax.saxutils.escape. That module
+    imports urllib and http when it is loaded.'''
+    text = text.replace('&','&amp;').replace('<','&lt;').replace('>','&gt;')
+    for char, entity in (entities or {}).items() :
+        text = text.replace(char,entity)
+    return text
+
+def _tokens(tex) :
+    toks = []
+    for m in _TOKEN_RE.finditer(tex) :
+        command, escaped, space, char = m.groups()
+        if command is not None :
+            toks.append('\\'+command)
+        elif escaped is not None :
+            toks.append('\\'+escaped)
+        elif space is not None :
+            toks.append(' ')
+        elif char is not None :
+            toks.append(char)
+    return toks
+
+def _run(text,rpr) :
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    if rpr :
+        return '<m:r><m:rPr>{}</m:rPr><m:t{}>{}</m:t></m:r>'.format(rpr,space,
+            escape(text))
+    return '<m:r><m:t{}>{}</m:t></m:r>'.format(space,escape(text))
+
+def _render(nodes) :
+    '''Return the xml of *nodes*, adjacent runs of the same font merged'''
+    xml = []
+    texts = []
+    rpr = None
+    for node in nodes :
+        kind = node[0]
+        if kind == 'r' :
+            if texts and node[2] != rpr :
+                xml.append(_run(''.join(texts),rpr))
+                texts = []
+            texts.append(node[1])
+            rpr = node[2]
+            continue
+        if texts :
+            xml.append(_run(''.join(texts),rpr))
+            texts = []
+        if kind == 'x' :
+            xml.append(node[1])
+        elif kind == 'g' :
+            xml.append(_render(node[1]))
+        elif kind == 'nary' :
+            xml.append(_run(node[1],''))
+        elif kind == 'func' :
+            xml.append(_run(node[1],_UPRIGHT))
+    if texts :
+        xml.append(_run(''.join(texts),rpr))
+    return ''.join(xml)
+
+def _scripts(base,sub,sup) :
+    if sub is not None and sup is not None :
+        return '<m:sSubSup><m:e>{}</m:e><m:sub>{}</m:sub><m:sup>{}</m:sup></m:sSubSup>'.format(
+            base,sub,sup)
+    if sup is not None :
+        return '<m:sSup><m:e>{}</m:e><m:sup>{}</m:sup></m:sSup>'.format(base,sup)
+    return '<m:sSub><m:e>{}</m:e><m:sub>{}</m:sub></m:sSub>'.format(base,sub)
+
+def _delimited(beg,end,parts,sep=None) :
+    pr = '<m:begChr m:val="{}"/>'.format(escape(beg,_QUOTE))
+    if sep is not None :
+        pr += '<m:sepChr m:val="{}"/>'.format(escape(sep,_QUOTE))
+    pr += '<m:endChr m:val="{}"/>'.format(escape(end,_QUOTE))
+    return '<m:d><m:dPr>{}</m:dPr>{}</m:d>'.format(pr,
+        ''.join('<m:e>{}</m:e>'.format(_) for _ in parts))
+
+def _eq_array(rows,sep=None) :
+    '''Return the rows as lines of an equation array, the cells of a row put
+    together with a *sep* run between them'''
+    lines = []
+    for row in rows :
+        nodes = []
+        for i,cell in enumerate(row) :
+            if i and sep :
+                nodes.append(('r',sep,''))
+            nodes.extend(cell)
+        lines.append('<m:e>{}</m:e>'.format(_render(nodes)))
+    return '<m:eqArr>{}</m:eqArr>'.format(''.join(lines))
+
+def _matrix(rows) :
+    cols = max(len(_) for _ in rows)
+    return ('<m:m><m:mPr><m:mcs><m:mc><m:mcPr><m:count m:val="{}"/>'
+            '<m:mcJc m:val="center"/></m:mcPr></m:mc></m:mcs></m:mPr>{}</m:m>'
+           ).format(cols,''.join('<m:mr>{}</m:mr>'.format(''.join(
+               '<m:e>{}</m:e>'.format(_render(cell))
+               for cell in row+[[]]*(cols-len(row)))) for row in rows))
+
+class _Parser(object) :
+    '''Recursive descent over the tokens of a formula. Nodes are ('r', text,
+    rpr) runs, ('x', xml), ('g', nodes) groups, and the ('nary', chr, loc)
+    and ('func', name) operators, which take what follows them.'''
+
+    def __init__(self,tex) :
+        self.toks = _tokens(tex)
+        self.pos = 0
+        self.rpr = ''
+        self.unknown = []
+
+    def peek(self) :
+        toks = self.toks
+        while self.pos < len(toks) and toks[self.pos] == ' ' :
+            self.pos += 1
+        return toks[self.pos] if self.pos < len(toks) else None
+
+    def next(self) :
+        tok = self.peek()
+        if tok is None :
+            raise MathError('formula ends too early')
+        self.pos += 1
+        return tok
+
+    def expect(self,tok) :
+        got = self.next()
+        if got != tok :
+            raise MathError('expected {} but found {}'.format(tok,got))
+
+    def raw_arg(self) :
+        '''Return the text of a {} argument as it is, escapes replaced'''
+        self.expect('{')
+        depth = 1
+        text = []
+        while True :
+            if self.pos >= len(self.toks) :
+                raise MathError('unbalanced braces')
+            tok = self.toks[self.pos]
+            self.pos += 1
+            if tok == '{' :
+                depth += 1
+            elif tok == '}' :
+                depth -= 1
+                if depth == 0 :
+                    return ''.join(text)
+            elif len(tok) == 2 and tok[0] == '\\' :
+                text.append(ESCAPES.get(tok[1],tok[1]))
+            else :
+                text.append('\u00a0' if tok == '~' else tok)
+
+    def parse(self) :
+        rows = self.parse_rows(None)
+        if len(rows) == 1 and len(rows[0]) == 1 :
+            return _render(rows[0][0])
+        return _eq_array(rows)
+
+    def parse_rows(self,end) :
+        '''Return the rows of cells up to *end*, split on & and \\\\'''
+        stops = ('&','\\\\',end)
+        rows = [[]]
+        while True :
+            rows[-1].append(self.parse_list(stops))
+            tok = self.peek()
+            if tok == '&' :
+                self.pos += 1
+            elif tok == '\\\\' :
+                self.pos += 1
+                if self.peek() == '[' :
+                    # row spacing
+                    while self.next() != ']' :
+                        pass
+                rows.append([])
+            else :
+                break
+        if len(rows) > 1 and rows[-1] == [[]] :
+            rows.pop()
+        return rows
+
+    def parse_list(self,stops) :
+        nodes = []
+        while True :
+            tok = self.peek()
+            if tok is None or tok in stops :
+                return nodes
+            if tok == '}' :
+                raise MathError('unbalanced braces')
+            nodes.extend(self.parse_element(stops))
+
+    def scripts(self) :
+        '''Return the xml of the sub and superscript that follow, None for
+        the ones that don't'''
+        sub = sup = None
+        while True :
+            tok = self.peek()
+            if tok in ('\\limits','\\nolimits') :
+                self.pos += 1
+            elif tok == '_' :
+                self.pos += 1
+                sub = _render(self.parse_arg())
+            elif tok == '^' :
+                self.pos += 1
+                sup = _render(self.parse_arg())
+            else :
+                return sub, sup
+
+    def parse_element(self,stops) :
+        '''Return the nodes of the next atom with its scripts, and of the
+        operand of an n-ary operator or function'''
+        node = self.parse_atom()
+        kind = node[0]
+        sub, sup = self.scripts()
+        if kind == 'nary' :
+            operand = []
+            while True :
+                tok = self.peek()
+                if tok is None or tok in stops or tok in _RELATIONS or tok == '}' :
+                    break
+                operand.extend(self.parse_element(stops))
+            pr = '<m:chr m:val="{}"/><m:limLoc m:val="{}"/>'.format(node[1],node[2])
+            if sub is None :
+                pr += '<m:subHide m:val="1"/>'
+            if sup is None :
+                pr += '<m:supHide m:val="1"/>'
+            return [('x','<m:nary><m:naryPr>{}</m:naryPr><m:sub>{}</m:sub>'
+                '<m:sup>{}</m:sup><m:e>{}</m:e></m:nary>'.format(pr,sub or '',
+                    sup or '',_render(operand)))]
+        if kind == 'func' :
+            name = _run(node[1],_UPRIGHT)
+            if node[1] in LIMITS and sub is not None :
+                name = '<m:limLow><m:e>{}</m:e><m:lim>{}</m:lim></m:limLow>'.format(
+                    name,sub)
+                if sup is not None :
+                    name = _scripts(name,None,sup)
+            elif sub is not None or sup is not None :
+                name = _scripts(name,sub,sup)
+            return [('x','<m:func><m:fName>{}</m:fName><m:e>{}</m:e></m:func>'.format(
+                name,_render(self.func_arg(stops))))]
+        if sub is None and sup is None :
+            return node[1] if kind == 'g' else [node]
+        return [('x',_scripts(_render([node]),sub,sup))]
+
+    def func_arg(self,stops) :
+        '''Return the nodes of the argument of a function, the next atom or
+        everything up to the matching parenthesis'''
+        tok = self.peek()
+        if tok is None or tok in stops or tok in _RELATIONS or tok == '}' :
+            return []
+        if tok != '(' :
+            return self.parse_element(stops)
+        nodes = []
+        depth = 0
+        while True :
+            tok = self.peek()
+            if tok is None or tok in stops or tok == '}' :
+                return nodes
+            if tok == '(' :
+                depth += 1
+            elif tok == ')' :
+                depth -= 1
+            nodes.extend(self.parse_element(stops))
+            if depth == 0 :
+                return nodes
+
+    def parse_arg(self) :
+        '''Return the nodes of a command argument, a group or a single atom'''
+        node = self.parse_atom()
+        return node[1] if node[0] == 'g' else [node]
+
+    def parse_atom(self) :
+        tok = self.next()
+        if tok == '{' :
+            rpr = self.rpr
+            nodes = self.parse_list(('}',))
+            self.expect('}')
+            self.rpr = rpr
+            return ('g',nodes)
+        if tok[0] == '\\' and len(tok) > 1 :
+            if tok[1].isalpha() :
+                return self.command(tok[1:])
+            if tok == '\\\\' :
+                return ('g',[])
+            return ('r',ESCAPES.get(tok[1],tok[1]),self.rpr)
+        if tok in ('^','_') :
+            # a script without a base, like {}^2
+            self.pos -= 1
+            return ('g',[])
+        if tok == '}' :
+            raise MathError('unbalanced braces')
+        if tok == '&' :
+            return ('g',[])
+        return ('r',CHARS.get(tok,tok),self.rpr)
+
+    def delimiter(self) :
+        tok = self.next()
+        if tok in DELIMITERS :
+            return DELIMITERS[tok]
+        if len(tok) == 1 :
+            return tok
+        raise MathError('unknown delimiter {}'.format(tok))
+
+    def command(self,name) :
+        if name in SYMBOLS :
+            return ('r',SYMBOLS[name],self.rpr)
+        if name in NARY :
+            return ('nary',)+NARY[name]
+        if name in FUNCTIONS or name in LIMITS :
+            return ('func','mod' if name == 'bmod' else name)
+        if name == 'operatorname' :
+            if self.peek() == '*' :
+                self.pos += 1
+            return ('func',self.raw_arg())
+        if name in ('frac','dfrac','tfrac','cfrac') :
+            num = _render(self.parse_arg())
+            den = _render(self.parse_arg())
+            return ('x','<m:f><m:num>{}</m:num><m:den>{}</m:den></m:f>'.format(
+                num,den))
+        if name in ('binom','dbinom','tbinom') :
+            top = _render(self.parse_arg())
+            bottom = _render(self.parse_arg())
+            return ('x',_delimited('(',')',['<m:f><m:fPr><m:type m:val="noBar"/>'
+                '</m:fPr><m:num>{}</m:num><m:den>{}</m:den></m:f>'.format(
+                    top,bottom)]))
+        if name == 'sqrt' :
+            deg = None
+            if self.peek() == '[' :
+                self.pos += 1
+                deg = _render(self.parse_list((']',)))
+                self.expect(']')
+            e = _render(self.parse_arg())
+            if deg is None :
+                return ('x','<m:rad><m:radPr><m:degHide m:val="1"/></m:radPr>'
+                    '<m:deg/><m:e>{}</m:e></m:rad>'.format(e))
+            return ('x','<m:rad><m:deg>{}</m:deg><m:e>{}</m:e></m:rad>'.format(
+                deg,e))
+        if name in ACCENTS :
+            return ('x','<m:acc><m:accPr><m:chr m:val="{}"/></m:accPr>'
+                '<m:e>{}</m:e></m:acc>'.format(ACCENTS[name],
+                    _render(self.parse_arg())))
+        if name in ('overline','underline') :
+            return ('x','<m:bar><m:barPr><m:pos m:val="{}"/></m:barPr>'
+                '<m:e>{}</m:e></m:bar>'.format(
+                    'top' if name == 'overline' else 'bot',
+                    _render(self.parse_arg())))
+        if name in ('overbrace','underbrace') :
+            pr = ('<m:chr m:val="⏞"/><m:pos m:val="top"/><m:vertJc m:val="bot"/>'
+                  if name == 'overbrace' else '<m:chr m:val="⏟"/>')
+            return ('x','<m:groupChr><m:groupChrPr>{}</m:groupChrPr>'
+                '<m:e>{}</m:e></m:groupChr>'.format(pr,_render(self.parse_arg())))
+        if name in ('overset','stackrel','underset') :
+            lim = _render(self.parse_arg())
+            e = _render(self.parse_arg())
+            tag = 'limLow' if name == 'underset' else 'limUpp'
+            return ('x','<m:{0}><m:e>{1}</m:e><m:lim>{2}</m:lim></m:{0}>'.format(
+                tag,e,lim))
+        if name == 'boxed' :
+            return ('x','<m:borderBox><m:e>{}</m:e></m:borderBox>'.format(
+                _render(self.parse_arg())))
+        if name in FONTS :
+            rpr = self.rpr
+            self.rpr = FONTS[name]
+            nodes = self.parse_arg()
+            self.rpr = rpr
+            return ('g',nodes)
+        if name in SWITCHES :
+            self.rpr = SWITCHES[name]
+            return ('g',[])
+        if name in TEXT :
+            return ('r',self.raw_arg(),_NORMAL)
+        if name == 'left' :
+            beg = self.delimiter()
+            parts = [self.parse_list(('\\right','\\middle'))]
+            sep = None
+            while self.next() == '\\middle' :
+                sep = self.delimiter()
+                parts.append(self.parse_list(('\\right','\\middle')))
+            end = self.delimiter()
+            return ('x',_delimited(beg,end,[_render(_) for _ in parts],sep))
+        if name in ('right','middle','end') :
+            raise MathError('unexpected \\{}'.format(name))
+        if name == 'begin' :
+            return self.environment()
+        if name == 'not' :
+            node = self.parse_atom()
+            if node[0] == 'r' :
+                negated = {'=':'≠','∈':'∉','≡':'≢','⊂':'⊄','∼':'≁'}
+                return ('r',negated.get(node[1],node[1]+'\u0338'),node[2])
+            return node
+        if name in DROPPED :
+            if self.peek() == '*' :
+                self.pos += 1
+            self.raw_arg()
+            return ('g',[])
+        if name in IGNORED :
+            return ('g',[])
+        self.unknown.append(name)
+        return ('r','\\'+name,self.rpr)
+
+    def environment(self) :
+        name = self.raw_arg()
+        if name in ('array','subarray','alignedat') :
+            # the column spec
+            self.raw_arg()
+        rows = self.parse_rows('\\end')
+        self.expect('\\end')
+        end = self.raw_arg()
+        if end != name :
+            raise MathError('\\begin{{{}}} ended by \\end{{{}}}'.format(name,end))
+        if name in MATRICES :
+            beg, end = MATRICES[name]
+            xml = _matrix(rows)
+            if beg or end :
+                xml = _delimited(beg,end,[xml])
+            return ('x',xml)
+        if name in ('cases','dcases') :
+            return ('x',_delimited('{','',[_eq_array(rows,'\u2003')]))
+        if name not in ARRAYS :
+            self.unknown.append(name)
+        return ('x',_eq_array(rows))
+
+def normalize(tex) :
+    '''Return *tex* with its white space collapsed, the key of its formula'''
+    return _SPACE_RE.sub(' ',tex).strip()
+
+def _convert(tex) :
+    parser = _Parser(tex)
+    try :
+        xml = parser.parse()
+    except MathError as e :
+        return Formula(None,tuple(parser.unknown),str(e))
+    return Formula(xml,tuple(parser.unknown),None)
+
+class FormulaCache(object) :
+    '''Converted formulas by their normalized LaTeX, at most *size* of them,
+    the least recently used evicted first. Safe to share between threads.'''
+
+    def __init__(self,size=CACHE_SIZE,persist=False) :
+        self.size = size
+        self.persist = persist
+        self.cache_key = 'formulas-v{}'.format(CACHE_VERSION)
+        self._formulas = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = not persist
+        self._changed = False
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) :
+        return len(self._formulas)
+
+    def _load(self) :
+        self._loaded = True
+        for key, formula in cache.load_pickle('math',self.cache_key) or () :
+            self._formulas[key] = formula
+
+    def get(self,tex) :
+        '''Return the :data:`Formula` of the LaTeX *tex*'''
+        key = normalize(tex)
+        with self._lock :
+            if not self._loaded :
+                self._load()
+            formula = self._formulas.get(key)
+            if formula is not None :
+                self._formulas.move_to_end(key)
+                self.hits += 1
+                return formula
+            self.misses += 1
+        formula = _convert(key)
+        with self._lock :
+            self._formulas[key] = formula
+            while len(self._formulas) > self.size :
+                self._formulas.popitem(last=False)
+            self._changed = True
+        return formula
+
+    def clear(self) :
+        with self._lock :
+            self._formulas.clear()
+            self.hits = self.misses = 0
+
+    def save(self) :
+        '''Write the formulas to CACHE_DIR if the cache persists and has
+        changed since it was loaded'''
+        if not self.persist or not self._changed :
+            return
+        with self._lock :
+            formulas = list(self._formulas.items())
+            self._changed = False
+        cache.dump_pickle('math',self.cache_key,formulas)
+
+formulas = FormulaCache(persist=PERSIST)
+
+def convert(tex) :
+    '''Return the :data:`Formula` of the LaTeX *tex* from :data:`formulas`'''
+    return formulas.get(tex)
+
+def inline_xml(xml) :
+    '''Return the <m:oMath> of an equation in a paragraph'''
+    return '<m:oMath xmlns:m="{}">{}</m:oMath>'.format(M_NS,xml)
+
+def display_xml(xml) :
+    '''Return the <m:oMathPara> of an equation in a paragraph of its own'''
+    return '<m:oMathPara xmlns:m="{}"><m:oMath>{}</m:oMath></m:oMathPara>'.format(
+        M_NS,xml)
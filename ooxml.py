@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+'''Write the xml of a .docx directly, without building a python-docx tree.
+
+:func:`run_xml` renders a formatted run the way python-docx would make it.
+:class:`StreamingDocxWriter` writes word/document.xml into the .docx zip a
+paragraph at a time as the document is converted, so only the current
+paragraph is ever held in memory. Every other part is copied from the
+template, the default python-docx one or a house style .docx, and the
+paragraphs use its styles, so the result is the same document the
+python-docx writer saves. Templates are parsed once, see
+:func:`load_template`.
+
+Both writers give the same bytes for the same document, the zip entries have
+fixed dates and attributes, and leave an existing .docx with the same bytes
+alone, see :func:`write_if_changed`.'''
+import io
+import os
+import re
+import threading
+
+import cache
+import omml
+from omml import escape
+
+# run properties written straight into the run xml, in the order the schema
+# wants them in <w:rPr>, anything else is set through python-docx
+RUN_PROPS = (('bold','b'),('italic','i'))
+# the props of an inline equation, the text of its run is the latex
+MATH_PROPS = {'math':True}
+_FAST_PROPS = frozenset([_[0] for _ in RUN_PROPS]+list(MATH_PROPS))
+_QUOTE = {'"':'&quot;'}
+_RUN_TEXT_RE = re.compile(r'([\t\r\n])')
+
+def other_props(props) :
+    '''Return whether *props* has anything :func:`run_xml` does not write'''
+    return bool(props) and any(_ not in _FAST_PROPS for _ in props)
+
+def run_xml(text,style_id=None,props=None) :
+    '''Return the <w:r> xml for a run, the same python-docx makes for
+    ``par.add_run(text,style)`` with the RUN_PROPS in *props* set on it, or
+    the <m:oMath> of an inline equation with MATH_PROPS'''
+    if props and props.get('math') :
+        formula = omml.convert(text)
+        if formula.xml is not None :
+            return omml.inline_xml(formula.xml)
+    rpr = []
+    if style_id is not None :
+        rpr.append('<w:rStyle w:val="{}"/>'.format(escape(style_id,_QUOTE)))
+    if props :
+        for name,tag in RUN_PROPS :
+            if name in props and props[name] is not None :
+                rpr.append('<w:{}/>'.format(tag) if props[name] else
+                           '<w:{} w:val="0"/>'.format(tag))
+    xml = ['<w:r>']
+    if rpr :
+        xml.append('<w:rPr>{}</w:rPr>'.format(''.join(rpr)))
+    # tabs and newlines get their own elements, like python-docx does it
+    for piece in _RUN_TEXT_RE.split(text) :
+        if piece == '\t' :
+            xml.append('<w:tab/>')
+        elif piece in ('\r','\n') :
+            xml.append('<w:br/>')
+        elif piece :
+            space = ' xml:space="preserve"' if piece.strip() != piece else ''
+            xml.append('<w:t{}>{}</w:t>'.format(space,escape(piece)))
+    xml.append('</w:r>')
+    return ''.join(xml)
+
+def _run_xml_slow(text,style_id,props) :
+    # props python-docx knows how to set but run_xml doesn't
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
+    from docx.text.run import Run
+    from lxml import etree
+    p = parse_xml('<w:p {}>{}</w:p>'.format(nsdecls('w'),
+        run_xml(text,style_id,props)))
+    run = Run(p[0],None)
+    for k,v in props.items() :
+        if k not in _FAST_PROPS :
+            setattr(run,k,v)
+    return etree.tostring(p[0],encoding='unicode')
+
+def runs_xml(runs,style_id) :
+    '''Return the xml of *runs* from :func:`overleaf2word.coalesce`,
+    *style_id* gives the id of a character style name'''
+    xml = []
+    for text,style,props in runs :
+        sid = style_id(style) if style is not None else None
+        if other_props(props) :
+            xml.append(_run_xml_slow(text,sid,props))
+        else :
+            xml.append(run_xml(text,sid,props))
+    return ''.join(xml)
+
+class _Template(object) :
+    '''The parts of the .docx template *fn*, read and parsed once'''
+
+    def __init__(self,fn) :
+        import docx
+        import zipfile
+        with open(fn,'rb') as f :
+            data = f.read()
+        self.fn = fn
+        self.hash = cache.content_hash(data)
+        with zipfile.ZipFile(io.BytesIO(data)) as zf :
+            self.parts = [(_.filename,zf.read(_)) for _ in zf.infolist()]
+        parts = dict(self.parts)
+        document = parts['word/document.xml'].decode('utf-8')
+        # the body is written between these two
+        body = document.index('<w:body>')+len('<w:body>')
+        sect = document.index('<w:sectPr',body)
+        self.head = document[:body]
+        self.between = document[body:sect]
+        self.tail = document[sect:]
+        self.rels = parts['word/_rels/document.xml.rels'].decode('utf-8')
+        self.content_types = parts['[Content_Types].xml'].decode('utf-8')
+        # python-docx looks the style ids up in the styles part
+        self.doc = docx.Document(io.BytesIO(data))
+        self.style_ids = {}
+        self.lock = threading.Lock()
+
+    def style_id(self,name,kind) :
+        '''Return the id of the style *name*, None for the default style like
+        python-docx does'''
+        from docx.enum.style import WD_STYLE_TYPE
+        key = (name,kind)
+        with self.lock :
+            if key not in self.style_ids :
+                self.style_ids[key] = self.doc.part.get_style_id(name,
+                    getattr(WD_STYLE_TYPE,kind)
+                )
+            return self.style_ids[key]
+
+    def document(self) :
+        '''Return a python-docx Document of the template to add to. Only the
+        document part is copied, the styles, numbering, theme and other parts
+        are only read by the writers and are shared with the template.'''
+        import copy
+        memo = {}
+        for part in self.doc.part.package.iter_parts() :
+            if part is not self.doc.part :
+                memo[id(part)] = part
+        return copy.deepcopy(self.doc,memo)
+
+# (path,mtime,size) -> _Template, a template is read again if it changes
+_templates = {}
+_template_lock = threading.Lock()
+
+def load_template(fn=None) :
+    '''Return the parsed .docx template *fn*, the default python-docx one if
+    None. Each template is only read once per process.'''
+    if fn is None :
+        import docx
+        fn = os.path.join(os.path.dirname(docx.__file__),'templates',
+            'default.docx')
+    st = os.stat(fn)
+    key = (os.path.abspath(fn),st.st_mtime_ns,st.st_size)
+    with _template_lock :
+        if key not in _templates :
+            _templates[key] = _Template(fn)
+        return _templates[key]
+
+# twentieths of a point across the text of a letter page with one inch
+# margins, split evenly between the columns of a table
+TABLE_WIDTH = 9360
+_BORDER = '<w:{} w:val="single" w:sz="4" w:space="0" w:color="auto"/>'
+_JC = {'center':'<w:pPr><w:jc w:val="center"/></w:pPr>',
+       'right':'<w:pPr><w:jc w:val="right"/></w:pPr>'}
+
+def table_xml(table,style_id,ns='') :
+    '''Yield the <w:tbl> xml of the :class:`tabular.Table` *table*, whose
+    cells hold runs from :func:`overleaf2word.coalesce`, a row at a time so
+    a long table can be written as it goes. *style_id* is passed on to
+    :func:`runs_xml`, *ns* are namespace declarations for the <w:tbl>.'''
+    ncols = max(len(table.columns),1)
+    width = TABLE_WIDTH//ncols
+    yield '<w:tbl{}><w:tblPr><w:tblW w:w="0" w:type="auto"/></w:tblPr>' \
+        '<w:tblGrid>{}</w:tblGrid>'.format(ns,
+            '<w:gridCol w:w="{}"/>'.format(width)*ncols)
+
+    # the <w:tcPr> and <w:pPr> of a cell only depend on these, and most rows
+    # of a long table look the same
+    props = {}
+    def cell_props(col,span,top,bottom,align) :
+        key = (col,span,top,bottom,align)
+        if key not in props :
+            borders = []
+            if top :
+                borders.append(_BORDER.format('top'))
+            if col < len(table.borders) and table.borders[col] :
+                borders.append(_BORDER.format('left'))
+            if bottom :
+                borders.append(_BORDER.format('bottom'))
+            if col+span < len(table.borders) and table.borders[col+span] :
+                borders.append(_BORDER.format('right'))
+            if align is None and col < len(table.columns) :
+                align = table.columns[col]
+            props[key] = ('<w:tc><w:tcPr><w:tcW w:w="{}" w:type="dxa"/>{}{}</w:tcPr>'
+                '<w:p>{}'.format(width*span,
+                    '<w:gridSpan w:val="{}"/>'.format(span) if span > 1 else '',
+                    '<w:tcBorders>{}</w:tcBorders>'.format(''.join(borders))
+                    if borders else '',
+                    _JC.get(align,'')))
+        return props[key]
+
+    for row in table.rows :
+        xml = ['<w:tr>']
+        col = 0
+        for cell in row.cells :
+            span = max(min(cell.span,ncols-col),1)
+            xml.append(cell_props(col,span,row.top,row.bottom,cell.align))
+            xml.append(runs_xml(cell.content,style_id))
+            xml.append('</w:p></w:tc>')
+            col += span
+        # every row fills the grid
+        while col < ncols :
+            xml.append(cell_props(col,1,row.top,row.bottom,None))
+            xml.append('</w:p></w:tc>')
+            col += 1
+        xml.append('</w:tr>')
+        yield ''.join(xml)
+    yield '</w:tbl>'
+
+# date of every zip entry, the earliest a zip can hold
+ZIP_DATE = (1980,1,1,0,0,0)
+
+def zip_info(name) :
+    '''Return the ZipInfo to write part *name* with, its date, attributes and
+    compression are the same every time and on every platform'''
+    import zipfile
+    info = zipfile.ZipInfo(name,ZIP_DATE)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.create_system = 0
+    info.external_attr = 0
+    return info
+
+def stable_zip(data) :
+    '''Return the .docx *data* with every part written again in the same
+    order with :func:`zip_info`'''
+    import zipfile
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as zin, \
+         zipfile.ZipFile(out,'w') as zout :
+        for info in zin.infolist() :
+            zout.writestr(zip_info(info.filename),zin.read(info))
+    return out.getvalue()
+
+def _same_file(fn,data=None,other_fn=None) :
+    # whether *fn* holds *data*, or the same bytes as *other_fn*
+    try :
+        size = os.path.getsize(fn)
+    except OSError :
+        return False
+    if data is not None :
+        if size != len(data) :
+            return False
+        with open(fn,'rb') as f :
+            return f.read() == data
+    import filecmp
+    return filecmp.cmp(fn,other_fn,shallow=False)
+
+def write_if_changed(doc_fn,data) :
+    '''Write *data* to *doc_fn* unless it already holds exactly that, so
+    backups and syncs don't see a new file. Returns True if it was written.'''
+    if _same_file(doc_fn,data) :
+        return False
+    tmp_fn = '{}.{}.{}.tmp'.format(doc_fn,os.getpid(),threading.get_ident())
+    with open(tmp_fn,'wb') as f :
+        f.write(data)
+    os.replace(tmp_fn,doc_fn)
+    return True
+
+def replace_if_changed(tmp_fn,doc_fn) :
+    '''Move *tmp_fn* to *doc_fn* unless that already has the same bytes, in
+    which case *tmp_fn* is removed. Returns True if *doc_fn* was written.'''
+    if _same_file(doc_fn,other_fn=tmp_fn) :
+        os.remove(tmp_fn)
+        return False
+    os.replace(tmp_fn,doc_fn)
+    return True
+
+class StreamingDocxWriter(object) :
+    '''Write the document straight into the .docx at *doc_fn* as it is
+    converted. word/document.xml is written a paragraph at a time, the
+    images, relationships and content types once it is done. The file only
+    appears at *doc_fn* once :meth:`save` is called. The parts and styles
+    come from the .docx *template*, see :func:`load_template`.'''
+
+    # bytes of document.xml collected before they are written to the zip
+    FLUSH_SIZE = 1<<16
+
+    def __init__(self,doc_fn,template=None) :
+        import zipfile
+        self.doc_fn = doc_fn
+        self.template = load_template(template)
+        self._tmp_fn = '{}.{}.{}.tmp'.format(doc_fn,os.getpid(),
+            threading.get_ident())
+        self._zip = zipfile.ZipFile(self._tmp_fn,'w',zipfile.ZIP_DEFLATED)
+        self._out = self._zip.open(zip_info('word/document.xml'),'w')
+        self._buf = []
+        self._size = 0
+        self._write(self.template.head)
+        self._write(self.template.between)
+        # image sha1 -> (rId, partname), identical images share a part
+        self._images = {}
+        self._image_parts = []
+        self._rids = set(re.findall(r'Id="(rId\d+)"',self.template.rels))
+        self._next_id = 1
+
+    def _write(self,xml) :
+        self._buf.append(xml)
+        self._size += len(xml)
+        if self._size >= self.FLUSH_SIZE :
+            self._flush()
+
+    def _flush(self) :
+        self._out.write(''.join(self._buf).encode('utf-8'))
+        self._buf = []
+        self._size = 0
+
+    def _paragraph(self,style,runs_xml='') :
+        style_id = None
+        if style is not None :
+            style_id = self.template.style_id(style,'PARAGRAPH')
+        if style_id is not None :
+            self._write('<w:p><w:pPr><w:pStyle w:val="{}"/></w:pPr>{}</w:p>'.format(
+                escape(style_id,_QUOTE),runs_xml))
+        else :
+            self._write('<w:p>{}</w:p>'.format(runs_xml))
+
+    def heading(self,text,level) :
+        style = 'Title' if level == 0 else 'Heading {}'.format(level)
+        self._paragraph(style,run_xml(text) if text else '')
+
+    def render(self,runs) :
+        '''Return the xml of *runs* from :func:`overleaf2word.coalesce`'''
+        return runs_xml(runs,
+            lambda style: self.template.style_id(style,'CHARACTER'))
+
+    def paragraph_xml(self,xml) :
+        '''Write a paragraph of the runs *xml* from :meth:`render`'''
+        self._paragraph(None,xml)
+
+    def paragraph(self,runs) :
+        '''Write *runs* from :func:`overleaf2word.coalesce` as a paragraph'''
+        if runs :
+            self.paragraph_xml(self.render(runs))
+
+    def list_item(self,text,style) :
+        self._paragraph(style,run_xml(text) if text else '')
+
+    def page_break(self) :
+        self._write('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+    def table(self,table) :
+        '''Write the :class:`tabular.Table` *table*, whose cells hold runs, a
+        row at a time'''
+        for xml in table_xml(table,
+                lambda style: self.template.style_id(style,'CHARACTER')) :
+            self._write(xml)
+
+    def _image_rid(self,img,data) :
+        import hashlib
+        sha1 = hashlib.sha1(data).hexdigest()
+        if sha1 not in self._images :
+            n = 1
+            while 'rId{}'.format(n) in self._rids :
+                n += 1
+            rid = 'rId{}'.format(n)
+            self._rids.add(rid)
+            partname = 'word/media/image{}.{}'.format(len(self._image_parts)+1,
+                img.ext)
+            self._images[sha1] = rid
+            self._image_parts.append((rid,partname,img.content_type,data))
+        return self._images[sha1]
+
+    def picture(self,pic) :
+        '''Write the :class:`images.Picture` *pic* in a paragraph of its own'''
+        from docx.image.image import Image
+        from docx.oxml.shape import CT_Inline
+        from docx.shared import Inches
+        from lxml import etree
+        img = Image.from_blob(pic.data)
+        rid = self._image_rid(img,pic.data)
+        cx, cy = img.scaled_dimensions(Inches(pic.width),None)
+        inline = CT_Inline.new_pic_inline(self._next_id,rid,img.filename,cx,cy)
+        self._next_id += 1
+        self._write('<w:p><w:r><w:drawing>{}</w:drawing></w:r></w:p>'.format(
+            etree.tostring(inline,encoding='unicode')))
+
+    def save(self) :
+        '''Finish the document and move it to *doc_fn*. Returns False if
+        *doc_fn* already had the same bytes and was left alone.'''
+        self._write(self.template.tail)
+        self._flush()
+        self._out.close()
+
+        rels = ''.join('<Relationship Id="{}" Type="http://schemas.openxmlformats'
+            '.org/officeDocument/2006/relationships/image" Target="{}"/>'.format(
+                rid,partname[len('word/'):])
+            for rid,partname,_,_ in self._image_parts)
+        defaults = set(re.findall(r'Default Extension="([^"]+)"',
+            self.template.content_types))
+        types = []
+        for _,partname,content_type,_ in self._image_parts :
+            ext = partname.rsplit('.',1)[1]
+            if ext not in defaults :
+                defaults.add(ext)
+                types.append('<Default Extension="{}" ContentType="{}"/>'.format(
+                    ext,content_type))
+        for fn,data in self.template.parts :
+            if fn == 'word/document.xml' :
+                continue
+            if fn == 'word/_rels/document.xml.rels' :
+                data = self.template.rels.replace('</Relationships>',
+                    rels+'</Relationships>').encode('utf-8')
+            elif fn == '[Content_Types].xml' :
+                data = self.template.content_types.replace('</Types>',
+                    ''.join(types)+'</Types>').encode('utf-8')
+            self._zip.writestr(zip_info(fn),data)
+        for _,partname,_,data in self._image_parts :
+            self._zip.writestr(zip_info(partname),data)
+        self._zip.close()
+        return replace_if_changed(self._tmp_fn,self.doc_fn)
+
+    def close(self) :
+        '''Throw the document away if it was not saved'''
+        if self._zip.fp is not None :
+            try :
+                self._out.close()
+                self._zip.close()
+            finally :
+                os.remove(self._tmp_fn)
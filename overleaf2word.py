@@ -1,26 +1,35 @@
 # -*- coding: utf-8 -*-
-import chardet
-from collections import namedtuple, OrderedDict
-import bibtexparser
-import docx
-from docx.shared import Inches
-from docx.enum.text import WD_BREAK
+# heavy dependencies (docx, git, PIL, bibtexparser) are imported where they
+# are used so that importing this module stays cheap for short lived jobs
+from array import array
+from collections import namedtuple
+import decoding
+from diagnostics import Diagnostics
+from bibcache import load_bib, load_bib_data
 from functools import partial
+from gitsource import WorktreeSource, TreeSource
 from glob import glob
-from git import Repo
-from itertools import takewhile
-import json
+from images import ImagePipeline
+from includes import IncludeGraph
+import io
+from manifest import Manifest
+import omml
+from ooxml import (MATH_PROPS, StreamingDocxWriter, load_template,
+    other_props, run_xml, runs_xml, stable_zip, table_xml, write_if_changed)
 import os
-from PIL import Image
-from ply import lex, yacc
-from pprint import pprint
-from subprocess import Popen
-import sys
+from ply import lex
+import re
+import profiling
+from rendercache import RenderCache
+import sync
+import tabular
+from tokenizer import tokenize as scan, tokenize_stream, read_chunks
 
 REPO_DIR = 'overleaf_repos'
 
-def overleaf2word(url,name=None,files=[]) :
-    
+def repo_dir_for(url,name=None) :
+    '''Return the local directory under REPO_DIR used for the repo at *url*.
+    If *name* is given it is sanitized and used instead of the url basename.'''
     repo_root = url.split('/')[-1]
 
     if name is not None :
@@ -28,27 +37,98 @@ def overleaf2word(url,name=None,files=[]) :
       replace = ' &;()/\\'
       repo_root = name.translate(str.maketrans(replace,'_'*len(replace))).lower()
 
-    repo_dir = '{}/{}'.format(REPO_DIR,repo_root)
+    return '{}/{}'.format(REPO_DIR,repo_root)
+
+def sync_target(url,name=None,files=[]) :
+    '''Return the (repo_dir, manifest.Manifest, last_commit) of the repo at
+    *url*, *last_commit* is the commit all of *files* were last converted at
+    or None.'''
+    repo_dir = repo_dir_for(url,name)
     
     if not os.path.exists(REPO_DIR) :
-      os.mkdir(REPO_DIR)
+      os.makedirs(REPO_DIR,exist_ok=True)
+
+    manifest = Manifest(repo_dir)
+    last_commit = manifest.converted_commit(
+        [os.path.join(repo_dir,fn) for fn in files]
+    )
+    return repo_dir, manifest, last_commit
+
+def sync_repo(url,name=None,files=[]) :
+    '''Clone the repo at *url* if we haven't seen it yet, otherwise bring it up
+    to date with the remote. Nothing is fetched if the remote HEAD is still at
+    the commit all of *files* were last converted at. See
+    :class:`sync.SyncEngine` to sync many repos concurrently.
+
+    :return: a (sync.SyncResult, manifest.Manifest) tuple
+    '''
+    repo_dir, manifest, last_commit = sync_target(url,name,files)
+    return sync.sync_repo(url,repo_dir,last_commit), manifest
+
+def find_bib(repo_dir) :
+    '''Return the path to the first .bib file in *repo_dir*, or None'''
+    bibfn = glob(os.path.join(repo_dir,'*.bib'))
+    if bibfn :
+        return bibfn[0]
+    return None
+
+def overleaf2word(url,name=None,files=[]) :
     
-    if not os.path.exists(repo_dir) :
-        repo = Repo.clone_from(url,repo_dir)
-    else :
-        repo = Repo(repo_dir)
-        repo.remotes['origin'].pull()
+    project = name or url
+    profile = profiling.hooked_profile(repo=project)
+    with profile.run(), profile.stage('sync') :
+        synced, manifest = sync_repo(url,name,files)
+    profiling.finish(profile)
+    repo_dir = synced.repo_dir
+    if not synced.changed :
+        print('{} is up to date at {}'.format(repo_dir,synced.commit))
+        return
         
     # check for .bib file
-    bibfn = glob(os.path.join(repo_dir,'*.bib'))
-    if bibfn :
-        bibfn = bibfn[0]
-    else :
-        bibfn = None
+    bibfn = find_bib(repo_dir)
+    # parse the bib once for all the files in the repo
+    bibdb = load_bib(bibfn) if bibfn else None
     for fn in files :
-        tex_to_word(os.path.join(repo_dir,fn),repo_dir,bibfn)
+        profile = profiling.hooked_profile(repo=project,file=fn)
+        tex_to_word(os.path.join(repo_dir,fn),repo_dir,bibfn,
+            manifest=manifest,
+            bibdb=bibdb,
+            profile=profile
+        )
+        profiling.finish(profile)
+    manifest.commit = synced.commit
+    manifest.save()
         
 
+def convert_revisions(repo_path,revs,files,out_dir) :
+    '''Convert *files* as they were at each of the commits *revs* of the repo at
+    *repo_path*, which may be bare. Everything is read from the git object
+    database, nothing is checked out. Each revision's docs are written to
+    ``out_dir/<rev>/``, e.g. to convert every tagged submission::
+
+        repo = Repo(path)
+        convert_revisions(path,[_.name for _ in repo.tags],['main.tex'],'out')
+
+    :return: list of the .docx paths written
+    '''
+    from git import Repo
+    repo = Repo(repo_path)
+    written = []
+    for rev in revs :
+        source = TreeSource(repo.commit(rev))
+        bibfn = source.glob('*.bib')
+        bibfn = bibfn[0] if bibfn else None
+        # unchanged .bib blobs hash the same and are only parsed once
+        bibdb = load_bib_data(source.read(bibfn)) if bibfn else None
+
+        rev_dir = os.path.join(out_dir,rev.replace('/','_'))
+        os.makedirs(rev_dir,exist_ok=True)
+        for fn in files :
+            doc_fn = os.path.join(rev_dir,os.path.basename(docx_path(fn)))
+            tex_to_word(fn,None,bibfn,bibdb=bibdb,source=source,doc_fn=doc_fn)
+            written.append(doc_fn)
+    return written
+
 ##########################################################################################
 # this is the ply tokenizer for latex
 tokens = ('MANUALNEWLINE','COMMAND','EQUATION','WORD','COMMENT',
@@ -83,68 +163,264 @@ def t_EQUATION(t) :
 t_ignore = ' '
 
 def t_error(t) :
-    print(t)
+    diagnostics = getattr(t.lexer,'diagnostics',None)
+    if diagnostics is None :
+        print(t)
+    else :
+        diagnostics.add('lexer_error',None,t.lineno,t.value)
     return t
 
-lexer = lex.lex()
+# the lexer tables are prebuilt in overleaf2word_lextab.py so the master regex
+# isn't rebuilt and validated from the docstrings on every import. delete that
+# file after changing the rules above and it is written again on next import
+lexer = lex.lex(optimize=1,lextab='overleaf2word_lextab',
+    outputdir=os.path.dirname(os.path.abspath(__file__))
+)
+
+# tokenizer used by tex_to_word, 'scan' for tokenizer.tokenize or 'ply' for
+# the lexer above, which gives the same tokens slower. the words of scan's
+# tokens are added to paragraphs without copying them out of the source
+TOKENIZER = 'scan'
+
+def tokenize(tex,tokenizer=None,diagnostics=None) :
+    '''Return the list of tokens in *tex* from *tokenizer*, TOKENIZER by
+    default. Lexer errors are recorded in the :class:`diagnostics.Diagnostics`
+    *diagnostics* if one is given.'''
+    tokenizer = tokenizer or TOKENIZER
+    if tokenizer == 'scan' :
+        return list(scan(tex))
+    if tokenizer != 'ply' :
+        raise ValueError('unknown tokenizer {!r}'.format(tokenizer))
+    lexer_ = lexer.clone()
+    lexer_.diagnostics = diagnostics
+    lexer_.input(tex)
+    return list(iter(lexer_.token,None))
 ##########################################################################################
 
 Text = namedtuple('Text',['text','type','style','props'])
 Word = partial(Text,type='word',style=None,props=None)
 
-# for the life of me I can't figure out how to get python 2 and 3 support with
-# this function
-# you apparently can't call unicode(s,errors='replace') if s is a unicode object
-# so you have to check for whether it is a unicode type object first, which
-# doesn't work in python 3
-# could someone else figure out how to fix this some day?
-tou = str
-if sys.version_info.major == 2:
-    def wtf_unicode(text) :
-        if isinstance(text,unicode) :
-            return text
-            
-        # text can come in different encodings, coerce it to utf-8
-        try :
-            text = unicode(text,errors='replace')
-        except TypeError as e :
-            print('Error encoding unicode, pass:',e)
-        return text
-    tou = wtf_unicode
-    
+_PLAIN = Word(text='')
+
+def _run(texts,word) :
+    # add a space at the end for funsies
+    return (' '.join(texts)+' ',word.style,word.props)
+
+def coalesce(words) :
+    '''Merge adjacent *words* with the same formatting, i.e. the same type,
+    style and props, in a single pass. Returns a list of (text,style,props)
+    tuples, one per run.'''
+    runs = []
+    texts = []
+    prev = None
+    for word in words :
+        if prev is not None and (word.type != prev.type or
+            word.style != prev.style or word.props != prev.props) :
+            runs.append(_run(texts,prev))
+            texts = []
+        texts.append(word.text)
+        prev = word
+    if texts :
+        runs.append(_run(texts,prev))
+    return runs
+
+def _unescape(text) :
+    # replace escaped chars with literal chars
+    return text.replace(r'\%','%').replace(r'\$','$')
+
+class WordBuffer(object) :
+    '''The words of the paragraph being put together. A plain word is kept
+    as a reference to the string it is a slice of, usually the source of the
+    WORD token, and its offsets in it, so no string is made for it until
+    :meth:`runs` joins the words up. Formatted words like citations and
+    \\textbf are kept as Text tuples.'''
+    __slots__ = ('srcs','starts','ends','texts')
+
+    def __init__(self,words=()) :
+        self.srcs = []
+        self.starts = array('l')
+        self.ends = array('l')
+        # index -> Text of the words that are not plain
+        self.texts = {}
+        for word in words :
+            self.add(word)
+
+    def __len__(self) :
+        return len(self.srcs)
+
+    def _add_slice(self,src,start,end) :
+        self.srcs.append(src)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def add_token(self,tok) :
+        '''Add the WORD token *tok* with its escapes replaced'''
+        src = getattr(tok,'src',None)
+        if src is not None :
+            start, end = tok.start, tok.end
+            if src.find('\\',start,end) < 0 :
+                self._add_slice(src,start,end)
+                return
+            src = src[start:end]
+        else :
+            src = tok.value
+        if '\\' in src :
+            src = _unescape(src)
+        self._add_slice(src,0,len(src))
+
+    def add(self,word) :
+        '''Add the Text tuple *word*'''
+        if word.type == 'word' and word.style is None and word.props is None :
+            self._add_slice(word.text,0,len(word.text))
+        else :
+            self.texts[len(self.srcs)] = word
+            self._add_slice(None,0,0)
+
+    def runs(self) :
+        '''Return the words as (text,style,props) runs, adjacent words with
+        the same formatting merged like :func:`coalesce` does'''
+        runs = []
+        texts = []
+        prev = None
+        srcs, starts, ends = self.srcs, self.starts, self.ends
+        for i in range(len(srcs)) :
+            src = srcs[i]
+            if src is not None :
+                word = _PLAIN
+                text = src[starts[i]:ends[i]]
+            else :
+                word = self.texts[i]
+                text = word.text
+            if prev is not None and word is not prev and (
+                word.type != prev.type or word.style != prev.style or
+                word.props != prev.props) :
+                runs.append(_run(texts,prev))
+                texts = []
+            texts.append(text)
+            prev = word
+        if texts :
+            runs.append(_run(texts,prev))
+        return runs
+
+def add_runs(par,runs) :
+    '''Add *runs* from :func:`coalesce` to the python-docx paragraph *par*.
+    The xml of all the runs is built as one string and parsed in one go,
+    character style ids are only looked up once per style.'''
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
+    from docx.text.run import Run
+
+    style_ids = {}
+    xml = []
+    slow = []
+    for i,(text,style,props) in enumerate(runs) :
+        if style is not None and style not in style_ids :
+            style_ids[style] = par.part.get_style_id(style,
+                WD_STYLE_TYPE.CHARACTER
+            )
+        xml.append(run_xml(text,style_ids.get(style),props))
+        if other_props(props) :
+            slow.append((i,props))
+    frag = parse_xml('<w:p {}>{}</w:p>'.format(nsdecls('w'),''.join(xml)))
+    elems = list(frag)
+    for i,props in slow :
+        run = Run(elems[i],par)
+        for k,v in props.items() :
+            setattr(run,k,v)
+    par._p.extend(elems)
+
 def add_run(par,words) :
+    '''Add *words* to *par* as a single run formatted like the last word'''
     if words :
-        # add a space at the end for funsies
-        text = ' '.join(_.text for _ in words)
-        text += ' '
-        
-        # convert to unicode
-        text = tou(text)
-        
-        r = par.add_run(text,words[-1].style)
-        if words[-1].props :
-            for k,v in words[-1].props.items() :
-                setattr(r,k,v)
-            
+        add_runs(par,[_run([_.text for _ in words],words[-1])])
+
 def add_paragraph(doc,words) :
-    '''Add words to doc as paragraph. Words is a list of Text namedtuples. The
-    *type* field is used to collapse the words into runs with the same formatting.'''
-    # collapse the words into lists of identical type to be turned into a
-    # formatted run
+    '''Add words to doc as paragraph. Words is a list of Text namedtuples.
+    Adjacent words with the same type, style and props are collapsed into one
+    formatted run, see :func:`coalesce`.'''
     if words :
         par = doc.add_paragraph()
-        curr_type = [words.pop(0)]
-        while words:
-            curr_text = words.pop(0)
-            # curr_text is a different type than what we've seen already
-            if curr_text.type != curr_type[-1].type : # new run
-                add_run(par,curr_type)
-                curr_type = [curr_text]
-            else :
-                curr_type.append(curr_text)
-        add_run(par,curr_type)
-    
-def tex_to_word(tex_fn,repo_dir,bib_fn=None) :
+        add_runs(par,coalesce(words))
+
+class DocxWriter(object) :
+    '''Where _convert puts the document together, with python-docx. The whole
+    document is held in memory until it is saved to *doc_fn*. It starts as a
+    copy of the .docx *template*, which is only parsed once, see
+    :func:`ooxml.load_template`.'''
+
+    def __init__(self,doc_fn,template=None) :
+        self.doc_fn = doc_fn
+        self.template = load_template(template)
+        self.doc = self.template.document()
+
+    def heading(self,text,level) :
+        self.doc.add_heading(text,level)
+
+    def _style_id(self,style) :
+        return self.template.style_id(style,'CHARACTER')
+
+    def render(self,runs) :
+        '''Return the xml of *runs* from :func:`coalesce`'''
+        return runs_xml(runs,self._style_id)
+
+    def paragraph_xml(self,xml) :
+        '''Add a paragraph of the runs *xml* from :meth:`render`'''
+        from docx.oxml import parse_xml
+        from docx.oxml.ns import nsdecls
+        par = self.doc.add_paragraph()
+        par._p.extend(parse_xml('<w:p {}>{}</w:p>'.format(nsdecls('w'),xml)))
+
+    def paragraph(self,runs) :
+        '''Add *runs* from :func:`coalesce` as a paragraph'''
+        if runs :
+            add_runs(self.doc.add_paragraph(),runs)
+
+    def list_item(self,text,style) :
+        self.doc.add_paragraph(text,style=style)
+
+    def page_break(self) :
+        from docx.enum.text import WD_BREAK
+        self.doc.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+
+    def table(self,table) :
+        '''Add the :class:`tabular.Table` *table*, whose cells hold runs. Its
+        xml is built in one pass and parsed at once, instead of going through
+        python-docx cell by cell.'''
+        from docx.oxml import parse_xml
+        from docx.oxml.ns import nsdecls
+        tbl = parse_xml(''.join(table_xml(table,self._style_id,
+            ' '+nsdecls('w'))))
+        self.doc.element.body._insert_tbl(tbl)
+
+    def picture(self,pic) :
+        '''Add the :class:`images.Picture` *pic* in a paragraph of its own'''
+        from docx.shared import Inches
+        self.doc.add_picture(io.BytesIO(pic.data),width=Inches(pic.width))
+
+    def save(self) :
+        '''Save the document to *doc_fn* with fixed zip metadata, returns
+        False if *doc_fn* already had the same bytes and was left alone'''
+        buf = io.BytesIO()
+        self.doc.save(buf)
+        return write_if_changed(self.doc_fn,stable_zip(buf.getvalue()))
+
+    def close(self) :
+        pass
+
+# output backends of tex_to_word, the python-docx one is the default
+WRITERS = {'docx':DocxWriter,'ooxml':StreamingDocxWriter}
+
+def docx_path(tex_fn) :
+    '''Return the .docx path written for *tex_fn*, e.g. main.tex -> main.docx'''
+    basedir = os.path.dirname(tex_fn)
+    basename, ext = os.path.splitext(os.path.basename(tex_fn))
+    return os.path.join(basedir,'{}.docx'.format(basename))
+
+def tex_to_word(tex_fn,repo_dir,bib_fn=None,manifest=None,bibdb=None,
+    source=None,doc_fn=None,profile=None,tokenizer=None,stream=False,
+    writer=None,render_cache=None,diagnostics=None,template=None,
+    token_workers=None) :
     r"""Convert a LaTeX formatted file to docx format
     
     Parses ``tex_fn`` and converts text and some markup tags and environments
@@ -155,28 +431,343 @@ def tex_to_word(tex_fn,repo_dir,bib_fn=None) :
     leaving keys as is. If ``bib_fn`` is provided, all ``\cite`` tags are replaced
     by <Author> <Year> formatted references, and if a ``\bibliography`` tag is
     present, a Reference section is formatted at the end of the document.
+
+    Files pulled in with ``\input`` or ``\include`` are converted in place,
+    paths are relative to the project root and can't lead out of it. Each one
+    is tokenized once and the tokens are cached by content, see
+    :class:`includes.IncludeGraph`.
+
+    Inline and display equations are converted to native Word math, each
+    formula once, see :mod:`omml`.
+
+    If a :class:`manifest.Manifest` is provided, the conversion is skipped when
+    the hashes of ``tex_fn``, its sub-files, ``bib_fn`` and the images match
+    the ones recorded the last time and the .docx still exists. The new hashes
+    are recorded in the manifest after a conversion, saving it is up to the
+    caller.
+
+    By default the files are read from the working tree in ``repo_dir``. If a
+    ``source`` like :class:`gitsource.TreeSource` is given instead, ``tex_fn``,
+    ``bib_fn`` and the images are paths within it and ``repo_dir`` is not
+    used, see :func:`convert_revisions`.
     
     :param tex_fn: path to LaTeX formatted file
     :param bib_fn: optional path to BibTeX formatted file containing citation
         information
-    :return: nothing
+    :param manifest: optional :class:`manifest.Manifest` for the repo
+    :param bibdb: optional database already loaded from ``bib_fn`` with
+        :func:`bibcache.load_bib`, to share one parse between files
+    :param source: optional :mod:`gitsource` source to read inputs from
+    :param doc_fn: optional path of the .docx to write, by default it is
+        written next to ``tex_fn``
+    :param profile: optional :class:`profiling.Profile` the time spent in each
+        stage of the conversion is added to. If none is given and hooks are
+        registered with :func:`profiling.register_hook`, one is made and passed
+        to the hooks when the conversion is done.
+    :param tokenizer: optional tokenizer backend, 'ply' or 'scan', see
+        :func:`tokenize`
+    :param stream: if True ``tex_fn`` is read and tokenized a chunk at a time
+        with :func:`tokenizer.tokenize_stream` while the document is written,
+        instead of reading and tokenizing it whole first, for very large
+        inputs. Only works with the 'scan' tokenizer.
+    :param writer: optional output backend, one of WRITERS. 'docx' builds the
+        document with python-docx and is the default, 'ooxml' writes it
+        straight into the .docx as it goes, see
+        :class:`ooxml.StreamingDocxWriter`. With ``stream`` 'ooxml' is the
+        default, so memory stays flat however long the document is.
+    :param render_cache: if True the paragraphs rendered for ``doc_fn`` are
+        kept in a :class:`rendercache.RenderCache` and only the ones that
+        changed are rendered the next time it is converted. The number of
+        paragraphs reused and rendered are counted in ``profile``. On by
+        default, except when streaming as the cache holds every paragraph.
+    :param diagnostics: optional :class:`diagnostics.Diagnostics` the
+        commands, equations and other things that could not be converted are
+        recorded in. By default one is made with the verbosity set in
+        ``diagnostics.VERBOSITY``, which prints a summary once the file is
+        converted.
+    :param template: optional path of a house style .docx the document is
+        made from, its styles, page setup, headers and footers are kept. By
+        default python-docx's own template is used. Templates are parsed
+        once per process and each document starts as a copy, see
+        :func:`ooxml.load_template`. Changing the template converts the
+        files of a ``manifest`` again.
+    :param token_workers: optional number of worker processes large
+        sub-files are tokenized in, ``includes.TOKEN_WORKERS`` by default
+    :return: True if ``tex_fn`` was converted, False if it was up to date.
+        The .docx is the same byte for byte for the same input, and is left
+        alone if the one already there has the same bytes, the ``profile``
+        counts ``docs_written`` and ``docs_unchanged``.
     """
+    notify = profile is None
+    if notify :
+        profile = profiling.hooked_profile(file=tex_fn)
+
+    with profile.run() :
+        written = _tex_to_word(tex_fn,repo_dir,bib_fn,manifest,bibdb,source,
+            doc_fn,profile,tokenizer,stream,writer,render_cache,diagnostics,
+            template,token_workers
+        )
+
+    if notify :
+        profiling.finish(profile)
+    return written
+
+class Converter(object) :
+    r"""Convert LaTeX files to docx format with one set of options
     
+    Does what :func:`tex_to_word` does and can be shared between threads. The
+    BibTeX database and the .docx template are loaded once when the converter
+    is made, and every conversion gets its own clone of the lexer, writer,
+    diagnostics and profile. The caches shared between conversions lock what
+    they change, so many documents can be converted at once in one process,
+    e.g. with a thread pool::
+
+        converter = Converter('refs.bib',template='house.docx')
+        with ThreadPoolExecutor(8) as pool :
+            pool.map(lambda fn: converter.convert(fn,repo_dir),tex_fns)
+
+    Converting to the same .docx in two threads at once is not supported.
+    Sub-files are tokenized in the converting thread, forking worker
+    processes from a process with other threads running can deadlock.
+
+    :param bib_fn: optional path to BibTeX formatted file containing citation
+        information, used by every conversion
+    :param template: optional path of a house style .docx the documents are
+        made from
+    :param tokenizer: optional tokenizer backend, 'ply' or 'scan', 'scan' if
+        *stream* is set and TOKENIZER when the converter is made otherwise
+    :param writer: optional output backend, one of WRITERS
+    :param render_cache: see :func:`tex_to_word`
+    :param stream: see :func:`tex_to_word`
+    :param verbosity: how much of the diagnostics of each conversion is
+        printed, ``diagnostics.VERBOSITY`` when the converter is made by
+        default
+    """
+
+    def __init__(self,bib_fn=None,template=None,tokenizer=None,writer=None,
+        render_cache=None,stream=False,verbosity=None) :
+        import diagnostics
+        self.bib_fn = bib_fn
+        self.bibdb = load_bib(bib_fn) if bib_fn else None
+        self.template = template
+        # parse it now rather than in the first conversion
+        load_template(template)
+        self.tokenizer = tokenizer or ('scan' if stream else TOKENIZER)
+        self.writer = writer
+        self.render_cache = render_cache
+        self.stream = stream
+        self.verbosity = diagnostics.VERBOSITY if verbosity is None else verbosity
+
+    def convert(self,tex_fn,repo_dir,doc_fn=None,manifest=None,profile=None,
+        diagnostics=None) :
+        """Convert ``tex_fn`` from the working tree ``repo_dir`` like
+        :func:`tex_to_word` with the options of the converter, the other
+        arguments are the same
+
+        :return: True if ``tex_fn`` was converted, False if it was up to date
+        """
+        if diagnostics is None :
+            diagnostics = Diagnostics(tex_fn,self.verbosity)
+        return tex_to_word(tex_fn,repo_dir,self.bib_fn,manifest,self.bibdb,
+            None,doc_fn,profile,self.tokenizer,self.stream,self.writer,
+            self.render_cache,diagnostics,self.template,token_workers=1
+        )
+
+def _tex_to_word(tex_fn,repo_dir,bib_fn,manifest,bibdb,source,doc_fn,profile,
+    tokenizer,stream,writer,render_cache,diagnostics,template,token_workers) :
+    if source is not None and manifest is not None :
+        raise ValueError('a manifest can only be used with a working tree')
+    if stream and tokenizer not in (None,'scan') :
+        raise ValueError('streaming only works with the scan tokenizer')
+
+    if doc_fn is None :
+        doc_fn = docx_path(tex_fn)
+    if diagnostics is None :
+        diagnostics = Diagnostics(tex_fn)
+    if manifest is not None :
+        with profile.stage('manifest') :
+            current, hashes = manifest.check(tex_fn,bib_fn,doc_fn,template)
+        if current :
+            diagnostics.info('unchanged, skipping {}'.format(tex_fn))
+            return False
+
     print('\n-------------------------------------------------------------------')
     print(tex_fn)
         
-    with open(tex_fn) as f :
-        tex = f.read()
-    parsed = lexer.input(tex)
-    
-    bibdb = None
-    if bib_fn :
-        with open(bib_fn) as f:
-            bibtex_str = f.read()
-        if len(bibtex_str) > 0 :
-          bibdb = bibtexparser.loads(bibtex_str)
-          bibdb = {_['ID']:_ for _ in bibdb.entries}
-    
+    if source is None :
+        if bib_fn and bibdb is None :
+            with profile.stage('bib') :
+                bibdb = load_bib(bib_fn)
+        source = WorktreeSource(repo_dir)
+        root = os.path.relpath(tex_fn,repo_dir)
+        open_tex = lambda: open(tex_fn,'rb')
+    else :
+        if bib_fn and bibdb is None :
+            with profile.stage('bib') :
+                bibdb = load_bib_data(source.read(bib_fn))
+        root = tex_fn
+        open_tex = lambda: source.open(tex_fn)
+
+    # start processing the images while the rest of the doc is put together
+    images = ImagePipeline(source)
+    # \input and \include'd files are tokenized once each and spliced into
+    # the tokens of tex_fn
+    graph = IncludeGraph(source,tokenizer,token_workers,
+        on_read=lambda path,text: images.prefetch_tex(text),
+        diagnostics=diagnostics
+    )
+    with profile.stage('template') :
+        writer = WRITERS[writer or ('ooxml' if stream else 'docx')](doc_fn,
+            template)
+    if render_cache is None :
+        render_cache = not stream
+    renders = RenderCache(doc_fn,template) if render_cache else None
+    try :
+        if stream :
+            # reading and tokenizing happen as the paragraphs are written, the
+            # images of each chunk are prefetched as it is read
+            def chunks(f) :
+                for chunk in read_chunks(f) :
+                    images.prefetch_tex(chunk)
+                    yield chunk
+            with decoding.open_text(open_tex(),diagnostics,root) as f :
+                toks = graph.expand(tokenize_stream(chunks(f)),(root,))
+                _convert(toks,writer,bibdb,images,profile,renders,diagnostics)
+        else :
+            with profile.stage('read') :
+                with open_tex() as f :
+                    tex = decoding.decode(f.read(),diagnostics,root)
+            with profile.stage('tokenize') :
+                toks = tokenize(tex,tokenizer,diagnostics)
+            images.prefetch_tex(tex)
+            with profile.stage('includes') :
+                graph.load(graph.includes(toks))
+            _convert(graph.expand(toks,(root,)),writer,bibdb,images,profile,
+                renders,diagnostics)
+
+        with profile.stage('images') :
+            images.close()
+
+        # write out the doc, unless the one already there is the same
+        with profile.stage('save') :
+            saved = writer.save()
+        profile.count('docs_written' if saved else 'docs_unchanged')
+        if not saved :
+            diagnostics.info('output unchanged, not written {}'.format(doc_fn))
+    finally :
+        images.close()
+        writer.close()
+
+    omml.formulas.save()
+    if renders is not None :
+        renders.save()
+        profile.count('paragraphs_reused',renders.hits)
+        profile.count('paragraphs_rendered',renders.misses)
+        diagnostics.info('rendered {} paragraphs, reused {}'.format(
+            renders.misses,renders.hits))
+    if diagnostics.total :
+        profile.count('diagnostics',diagnostics.total)
+    diagnostics.report()
+
+    if manifest is not None :
+        manifest.record(tex_fn,hashes)
+    return True
+
+# formatting commands kept in table cells, and the run props they set
+CELL_FORMATS = {'textbf':{'bold':True},'textit':{'italic':True},
+    'emph':{'italic':True}}
+_COMMENT_RE = re.compile(r'(?<![\\])%.*')
+
+# environments of display equations, \\[ \\] and $$ are too
+DISPLAY_MATH = frozenset(['equation','equation*','align','align*','gather',
+    'gather*','multline','multline*','flalign','flalign*','eqnarray',
+    'eqnarray*','displaymath'])
+
+def _display_start(tok) :
+    '''Return what ends the display equation *tok* starts and the latex
+    after its start in *tok*, or (None,None)'''
+    if tok.type == 'COMMAND' :
+        if tok.command == 'begin' and tok.args in DISPLAY_MATH :
+            return '\\end{{{}}}'.format(tok.args), tok.rest
+    elif tok.type == 'WORD' :
+        value = tok.value
+        if value.startswith('\\[') :
+            return '\\]', value[2:]
+        if value.startswith('$$') :
+            return '$$', value[2:]
+    return None, None
+
+def _convert(toks,writer,bibdb,images,profile,renders=None,diagnostics=None) :
+    '''Turn the tokens *toks* into paragraphs, headings, lists and pictures
+    on *writer*. Paragraphs are written as soon as they end, so *toks* can be
+    a generator and only the current paragraph is held here. Paragraphs
+    found in the :class:`rendercache.RenderCache` *renders* are not rendered
+    again. What can't be converted is recorded in *diagnostics*.'''
+    if diagnostics is None :
+        diagnostics = Diagnostics()
+
+    def paragraph(words) :
+        runs = words.runs()
+        if renders is None :
+            writer.paragraph(runs)
+        elif runs :
+            writer.paragraph_xml(renders.render(runs,writer.render))
+
+    def equation(tex,tok) :
+        '''Return the converted formula of *tex* from *tok*, or None if it
+        can't be converted'''
+        with profile.stage('math') :
+            formula = omml.convert(tex)
+        profile.count('equations')
+        for name in formula.unknown :
+            diagnostics.add('math_command',name,tok.lineno,tok.value)
+        if formula.xml is None :
+            diagnostics.add('equation',None,tok.lineno,tok.value)
+            return None
+        return formula.xml
+
+    def cell_runs(tex,tok) :
+        '''Return the runs of the latex *tex* of a table cell from the table
+        at *tok*'''
+        if '\\' not in tex and '$' not in tex and '{' not in tex :
+            text = ' '.join(tex.split())
+            return [(text,None,None)] if text else []
+        cell = []
+        while tex :
+            rest = None
+            for t in scan(tex) :
+                if t.type == 'WORD' :
+                    # & is escaped in a table
+                    text = _unescape(t.value).replace(r'\&','&').replace(
+                        '{','').replace('}','')
+                    if text :
+                        cell.append(Word(text=text))
+                elif t.type == 'TEXTFMT' or (t.type == 'COMMAND' and
+                                             t.command in CELL_FORMATS) :
+                    cell.append(Text(text=t.args or '',type=t.command,
+                        style=None,props=CELL_FORMATS[t.command]))
+                elif t.type == 'EQUATION' :
+                    if equation(t.value[1:-1],tok) is not None :
+                        cell.append(Text(text=t.value[1:-1],type='math',
+                            style=None,props=MATH_PROPS))
+                    else :
+                        cell.append(Word(text=t.value))
+                elif t.type == 'COMMAND' :
+                    diagnostics.add('unrecognized_command',t.command,
+                        tok.lineno,t.value)
+                    if t.args :
+                        cell.append(Word(text=t.args))
+                if t.type == 'COMMAND' :
+                    # the rest of the cell is in it
+                    rest = t.rest
+                    break
+            tex = rest
+        runs = coalesce(cell)
+        if runs :
+            text, style, props = runs[-1]
+            runs[-1] = (text.rstrip(),style,props)
+        return runs
+
     def is_heading(args) :
         return 'section' in args
         
@@ -191,21 +782,115 @@ def tex_to_word(tex_fn,repo_dir,bib_fn=None) :
     in_section = []
     prev_token = None
     
-    doc = docx.Document()
     text_started = False
     refs = set()
-    words = []
+    words = WordBuffer()
+
+    # the latex of the display equation being collected, the token it
+    # started at and what ends it
+    display = None
+    display_tok = None
+    display_end = None
+    # the end of the inline equation just added, a space follows it unless
+    # the next word starts right there
+    math_end = None
+    # the latex of the table being collected, its environment and the token
+    # it started at
+    table = None
+    table_env = None
+    table_tok = None
     
-    while True :
-        tok = lexer.token()
-        if not tok: break
+    for tok in toks :
+
+        if math_end is not None :
+            if tok.type != 'WORD' or tok.lexpos != math_end :
+                words.add(_PLAIN)
+            math_end = None
+
+        # everything up to \end{tabular} is the latex of the table, its rows
+        # are all converted and written at once when it ends
+        text = None
+        if table is None and display is None :
+            if (tok.type == 'COMMAND' and tok.command == 'begin' and
+                tok.args in tabular.ENVIRONMENTS) :
+                table = []
+                table_env = tok.args
+                table_tok = tok
+                begin = '{'+tok.args+'}'
+                text = tok.value[tok.value.index(begin)+len(begin):]
+        elif table is not None :
+            text = ' ' if tok.type == 'NEWLINE' else tok.value
+        if table is not None :
+            text = _COMMENT_RE.sub('',text)
+            table_end = '\\end{'+table_env+'}'
+            end = text.find(table_end)
+            if end < 0 :
+                table.append(text)
+            else :
+                table.append(text[:end])
+                if words :
+                    with profile.stage('paragraphs') :
+                        paragraph(words)
+                    words = WordBuffer()
+                with profile.stage('tables') :
+                    parsed = tabular.parse(table_env,' '.join(table))
+                    rows = [tabular.Row([tabular.Cell(cell_runs(cell.content,table_tok),
+                                cell.span,cell.align) for cell in row.cells],
+                                row.top,row.bottom)
+                            for row in parsed.rows]
+                    writer.table(tabular.Table(parsed.columns,parsed.borders,rows))
+                profile.count('table_rows',len(rows))
+                text_started = True
+                table = None
+                # the words after the end on the same line, like the rest of
+                # a command they start a new paragraph
+                for word in text[end+len(table_end):].split() :
+                    words.add(Word(text=_unescape(word)))
+            prev_token = tok
+            continue
+
+        # everything up to the end of a display equation is its latex, it
+        # goes in a paragraph of its own
+        if display is None :
+            display_end, text = _display_start(tok)
+            if text is not None :
+                display = []
+                display_tok = tok
+        elif tok.type == 'NEWLINE' :
+            text = ' '
+        elif tok.type != 'COMMENT' :
+            text = tok.value
+        if display is not None :
+            end = text.find(display_end) if text is not None else -1
+            if end < 0 :
+                display.append(text or '')
+            else :
+                display.append(text[:end])
+                if words :
+                    with profile.stage('paragraphs') :
+                        paragraph(words)
+                    words = WordBuffer()
+                tex = ' '.join(display)
+                xml = equation(tex,display_tok)
+                if xml is not None :
+                    writer.paragraph_xml(omml.display_xml(xml))
+                else :
+                    writer.paragraph([(tex,None,None)])
+                text_started = True
+                display = None
+                # the words after the end on the same line, like the rest of
+                # a command they start a new paragraph
+                for word in text[end+len(display_end):].split() :
+                    words.add(Word(text=_unescape(word)))
+            prev_token = tok
+            continue
         
         # handle commands, which control the structure of the document
-        # and special elements like tables and figures (not yet implemented)
+        # and special elements like figures (not yet implemented)
         if tok.type == 'COMMAND' :
             
             if tok.command == 'title' :
-                doc.add_heading(tok.args,0)
+                writer.heading(tok.args,0)
             
             elif tok.command == 'begin' :
                 
@@ -214,8 +899,6 @@ def tex_to_word(tex_fn,repo_dir,bib_fn=None) :
                     in_doc = True
                 
                 # other \begin's to be supported:
-                # table
-                # tabular
                 # figure
                 in_section.append(tok.args)
             elif tok.command == 'end' :
@@ -224,31 +907,27 @@ def tex_to_word(tex_fn,repo_dir,bib_fn=None) :
                 style = None
                 level = len(in_section)
                 if level == 1 :
-                    print('saw \\item outside of command, I dont know what to '
-                          'do so I will very cowardly ignore token:',
-                          tok.command,tok.opts,tok.args,tok.post_opts, tok.rest
-                    )
+                    diagnostics.add('item_outside_list','item',tok.lineno,
+                        tok.value)
                 elif in_section[-1] == 'itemize' :
                     style = 'List Bullet'
                 elif in_section[-1] == 'enumerate' :
                     style = 'List Number'
                 else :
-                    print('saw \\item inside a command I dont recognize, '
-                          'I dont know what to do so I will very cowardly '
-                          'ignore token:',
-                          tok.command,tok.opts,tok.args,tok.post_opts,tok.rest
-                    )
+                    diagnostics.add('item_unknown_list',in_section[-1],
+                        tok.lineno,tok.value)
                 if style is not None :
                     if level > 2 :
                         style += ' {}'.format(level-1)
-                    doc.add_paragraph(tok.rest.strip(),style=style)
+                    writer.list_item(tok.rest.strip(),style)
             # \section, \subsection, \subsubsection, etc
             elif is_heading(tok.command) :
                 if words :
-                    add_paragraph(doc,words)
-                    words = []
+                    with profile.stage('paragraphs') :
+                        paragraph(words)
+                    words = WordBuffer()
                 heading_level = get_heading_level(tok.command)
-                doc.add_heading(tok.args,heading_level)
+                writer.heading(tok.args,heading_level)
                 
             # insert citation text
             elif tok.command == 'cite':
@@ -259,10 +938,7 @@ def tex_to_word(tex_fn,repo_dir,bib_fn=None) :
                     refs.update(set(refids))
                     ref_strs = []
                     for refid in refids :
-                        entry = bibdb[refid] 
-                        author = entry.get('author',entry.get('title','')).split(',')[0]           
-                        year = entry.get('year','')
-                        ref_strs.append(' '.join([author,year]))
+                        ref_strs.append(bibdb[refid].cite)
                     ref_strs = ','.join(ref_strs)
                 citation = Text(
                     text=''.join(['(',ref_strs,')']),
@@ -270,49 +946,53 @@ def tex_to_word(tex_fn,repo_dir,bib_fn=None) :
                     style=None,
                     props=None
                 )
-                words.append(citation)
+                words.add(citation)
 
             elif tok.command == 'clearpage' :
-                doc.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+                writer.page_break()
 
             elif tok.command == 'includegraphics' :
-                pic_path = os.path.join(repo_dir,tok.args)
-                img = Image.open(pic_path)
-                # calculate the image width in inches assuming 72 dpi
-                # maximum 6 inches
-                dpi = 72
-                img_width = min(img.size[0]/72,6)
-
-                doc.add_picture(pic_path,width=Inches(img_width))
+                # downscaled and recompressed ahead of time by the pipeline,
+                # identical images end up as a single part in the docx
+                with profile.stage('images') :
+                    pic = images.get(tok.args)
+                    writer.picture(pic)
 
             elif tok.command == 'newline' :
-                words.append(Word(text='\n'))
+                words.add(Word(text='\n'))
 
             else :
-                print('unrecognized command:',tok.command,tok.opts,tok.args,tok.post_opts)
+                diagnostics.add('unrecognized_command',tok.command,tok.lineno,
+                    tok.value)
 
+        # inline equations are kept as runs of their latex, converted when
+        # the paragraph is rendered
         if tok.type == 'EQUATION' :
-            print('found an equation, dont know how to do those yet',tok.value)
+            text_started = True
+            tex = tok.value[1:-1]
+            if equation(tex,tok) is not None :
+                words.add(Text(text=tex,type='math',style=None,props=MATH_PROPS))
+                math_end = tok.lexpos+len(tok.value)
+            else :
+                words.add(Word(text=tok.value))
                     
         # regular text word
         if tok.type == 'WORD' :
-            # replace escaped chars with literal chars
-            tok.value = tok.value.replace(r'\%','%')
-            tok.value = tok.value.replace(r'\$','$')
-
+            # the text is only sliced out of the source when the paragraph is
+            # written, escaped chars are replaced as it is added
             text_started = True
-            text = Word(text=tok.value)
-            words.append(text)
+            words.add_token(tok)
             
 
         if tok.type == 'NEWLINE' :
             # if we hit two newlines in a row, create a new paragraph
             if prev_token and prev_token.type == 'NEWLINE' and text_started :
-                add_paragraph(doc,words)
-                words = []
+                with profile.stage('paragraphs') :
+                    paragraph(words)
+                words = WordBuffer()
 
         if tok.type == 'MANUALNEWLINE' :
-            words.append(Word(text='\n'))
+            words.add(Word(text='\n'))
 
         if tok.type == 'TEXTFMT' :
             if tok.command == 'textbf' :
@@ -322,7 +1002,7 @@ def tex_to_word(tex_fn,repo_dir,bib_fn=None) :
                     style=None,
                     props={'bold':True}
                 )
-                words.append(bold)
+                words.add(bold)
             if tok.command == 'textit' :
                 italic = Text(
                     text=tok.args,
@@ -330,49 +1010,26 @@ def tex_to_word(tex_fn,repo_dir,bib_fn=None) :
                     style=None,
                     props={'italic':True}
                 )
-                words.append(italic)
+                words.add(italic)
 
         prev_token = tok
         
     # do refs if there are refs
     
     if refs :
-        doc.add_heading('References',heading_level)
+        writer.heading('References',heading_level)
         
         refs = sorted(list(refs))
         for i,refid in enumerate(refs) :
-            ref = bibdb[refid]
-            author = ''
-            if 'author' in ref :
-                author = ref['author'].split(' and ')
-                author = author[0]+u' et al. '
-            title = (tou(ref.get('title',''))
-                .replace('{','')
-                .replace('}','')
-                .replace('\n',' ')
-            )
-            ref_words = [Word(text='{}. '.format(i+1)),
-                Word(text=author),
-                Word(text=title+u'. ')]
-                
-            def fmt(key,pref='',suff='') :
-                if key in ref :
-                    return Word(tou(pref+ref[key]+suff))
-                
-            ref_words.extend([
-                fmt('journal',suff=u'. '),
-                fmt('booktitle',suff=u'. '),
-                fmt('volume',suff=u', '),
-                fmt('pages',suff=u' '),
-                fmt('year',pref=u'(',suff=u')'),
-                fmt('howpublished',pref=u'(',suff=u')'),
-                fmt('note'),
-                Word(text=u'.')
-            ])
-            ref_words = [_ for _ in ref_words if _]
-            add_paragraph(doc,ref_words)
+            # the reference text is formatted once per entry in bibcache
+            ref_words = WordBuffer([Word(text='{}. '.format(i+1))])
+            for text in bibdb[refid].ref :
+                ref_words.add(Word(text=text))
+            with profile.stage('paragraphs') :
+                paragraph(ref_words)
                 
     """
+    bibdb entries hold the bibtexparser dict in .fields, which looks like
     [{'journal': 'Nice Journal',
       'comments': 'A comment',
       'pages': '12--23',
@@ -386,9 +1043,3 @@ def tex_to_word(tex_fn,repo_dir,bib_fn=None) :
       'keyword': 'keyword1, keyword2',
       'ENTRYTYPE': 'article'}]
     """
-
-    # write out the doc
-    basedir = os.path.dirname(tex_fn)
-    basename, ext = os.path.splitext(os.path.basename(tex_fn))
-    doc_fn = os.path.join(basedir,'{}.docx'.format(basename))
-    doc.save(doc_fn)
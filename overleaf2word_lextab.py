@@ -0,0 +1,10 @@
+# overleaf2word_lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('COMMAND', 'COMMENT', 'EQUATION', 'MANUALNEWLINE', 'NEWLINE', 'TEXTFMT', 'WORD'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_TEXTFMT>\\\\(?!%)(?P<command>text(?:bf|it))\\{(?P<args>[^}]*)\\})', [None, ('t_TEXTFMT', 'TEXTFMT'), None, None]), ('(?P<t_COMMAND>\\\\(?!%)(?P<command>[a-zA-Z]+\\*?)(?:\\[(?P<opts>[^]]+)\\])?(?:{(?P<args>[^}]+)})?(?P<post_opts>\\[[^]]+\\])?(?P<rest>.*))|(?P<t_NEWLINE>\\n)', [None, ('t_COMMAND', 'COMMAND'), None, None, None, None, None, ('t_NEWLINE', 'NEWLINE')]), ('(?P<t_MANUALNEWLINE>\\\\\\\\)|(?P<t_EQUATION>(?<!\\\\)[$][^$]+[$])|(?P<t_COMMENT>(?<![\\\\])%.*)|(?P<t_WORD>[^\\ \\n]+)', [None, ('t_MANUALNEWLINE', 'MANUALNEWLINE'), ('t_EQUATION', 'EQUATION'), (None, 'COMMENT'), (None, 'WORD')])]}
+_lexstateignore = {'INITIAL': ' '}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+'''Per-stage timings of repo syncs and file conversions.
+
+A :class:`Profile` collects the wall time spent in each named stage of one
+repo sync or one file conversion, e.g.::
+
+    profile = Profile(repo='thesis',file='main.tex')
+    tex_to_word('main.tex','.',profile=profile)
+    profile.as_dict()
+    # {'repo': 'thesis', 'file': 'main.tex', 'total': 0.41,
+    #  'stages': {'read': 0.0002, 'tokenize': 0.05, ...},
+    #  'counts': {'paragraphs_reused': 120, ...}, ...}
+
+Functions registered with :func:`register_hook` are called with the
+:meth:`Profile.as_dict` of every finished sync or conversion. Optionally a
+cProfile capture of each conversion is written to *cprofile_dir*.'''
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
+import time
+
+# stages in the order they usually happen, for reports
+STAGES = ('sync','manifest','read','bib','template','tokenize','includes',
+          'math','tables','paragraphs','images','save')
+
+_hooks = []
+
+def register_hook(func) :
+    '''Call *func* with the report dict of every finished profile. Returns
+    *func* so this can be used as a decorator.'''
+    _hooks.append(func)
+    return func
+
+def unregister_hook(func) :
+    _hooks.remove(func)
+
+def has_hooks() :
+    return bool(_hooks)
+
+def notify(report) :
+    '''Pass *report* to every registered hook'''
+    for hook in list(_hooks) :
+        hook(report)
+
+def hooked_profile(repo=None,file=None) :
+    '''Return a new Profile if any hooks are registered, else NULL'''
+    if _hooks :
+        return Profile(repo,file)
+    return NULL
+
+def finish(profile) :
+    '''Notify the hooks about *profile* if it is a real Profile'''
+    if isinstance(profile,Profile) :
+        notify(profile.as_dict())
+
+class Profile(object) :
+    '''Stage timings of one repo sync (*file* is None) or file conversion'''
+
+    def __init__(self,repo=None,file=None,cprofile_dir=None) :
+        self.repo = repo
+        self.file = file
+        self.cprofile_dir = cprofile_dir
+        self.cprofile_fn = None
+        self.stages = OrderedDict()
+        self.calls = {}
+        self.counts = {}
+        self.total = 0.
+
+    def add(self,name,seconds) :
+        '''Add *seconds* to the time spent in stage *name*'''
+        self.stages[name] = self.stages.get(name,0.)+seconds
+        self.calls[name] = self.calls.get(name,0)+1
+
+    def count(self,name,n=1) :
+        '''Add *n* to the counter *name*, e.g. of cache hits'''
+        self.counts[name] = self.counts.get(name,0)+n
+
+    @contextmanager
+    def stage(self,name) :
+        '''Time the body of the with block as part of stage *name*, stages
+        entered more than once accumulate'''
+        start = time.perf_counter()
+        try :
+            yield
+        finally :
+            self.add(name,time.perf_counter()-start)
+
+    @contextmanager
+    def run(self) :
+        '''Time the whole sync or conversion, and capture it with cProfile if
+        a cprofile_dir was given'''
+        prof = None
+        if self.cprofile_dir :
+            import cProfile
+            prof = cProfile.Profile()
+            prof.enable()
+        start = time.perf_counter()
+        try :
+            yield
+        finally :
+            self.total += time.perf_counter()-start
+            if prof is not None :
+                prof.disable()
+                os.makedirs(self.cprofile_dir,exist_ok=True)
+                name = '{}_{}.prof'.format(self.repo or '',self.file or 'sync')
+                name = name.strip('_').replace('/','_').replace(os.sep,'_')
+                self.cprofile_fn = os.path.join(self.cprofile_dir,name)
+                prof.dump_stats(self.cprofile_fn)
+
+    def as_dict(self) :
+        return {
+            'repo':self.repo,
+            'file':self.file,
+            'total':self.total,
+            'stages':dict(self.stages),
+            'calls':dict(self.calls),
+            'counts':dict(self.counts),
+            'cprofile':self.cprofile_fn,
+        }
+
+class NullProfile(object) :
+    '''Stands in for a Profile when nobody is looking at the timings'''
+
+    @contextmanager
+    def stage(self,name) :
+        yield
+
+    @contextmanager
+    def run(self) :
+        yield
+
+    def add(self,name,seconds) :
+        pass
+
+    def count(self,name,n=1) :
+        pass
+
+NULL = NullProfile()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+'''Rendered paragraphs of a document kept from one conversion to the next.
+
+Each paragraph is keyed by the hash of its runs. The runs hold their text
+and formatting with the citation text already looked up in the bib, so a
+changed bib entry changes the key of the paragraphs citing it. The <w:r> xml
+rendered for a paragraph is stored under its key, and when the document is
+converted again only the paragraphs that changed are rendered again. The
+cache of a document is one file under CACHE_DIR, holding the paragraphs of
+its last conversion only, so it does not grow as the document is edited.'''
+import hashlib
+import os
+
+import cache
+
+# bump when the words or the rendered xml change
+CACHE_VERSION = 2
+
+class RenderCache(object) :
+    '''The rendered paragraphs of the document written to *doc_fn*. The
+    style ids come from the .docx *template* and the runs are rendered like
+    python-docx does, so both are part of the cache key too.'''
+
+    def __init__(self,doc_fn,template=None) :
+        import docx
+        from ooxml import load_template
+        self.cache_key = '{}-{}-{}-v{}'.format(
+            cache.content_hash(os.path.abspath(doc_fn).encode('utf-8')),
+            load_template(template).hash[:12],docx.__version__,CACHE_VERSION
+        )
+        self.old = cache.load_pickle('render',self.cache_key) or {}
+        self.new = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(runs) :
+        '''Return the key of the paragraph of *runs*'''
+        return hashlib.sha1(repr(runs).encode('utf-8')).digest()
+
+    def render(self,runs,render) :
+        '''Return the xml of the paragraph of the (text,style,props) *runs*,
+        from the cache or from ``render(runs)``'''
+        key = self.key(runs)
+        xml = self.new.get(key)
+        if xml is None :
+            xml = self.old.get(key)
+        if xml is None :
+            self.misses += 1
+            xml = render(runs)
+        else :
+            self.hits += 1
+        self.new[key] = xml
+        return xml
+
+    def save(self) :
+        '''Keep the paragraphs of this conversion for the next one'''
+        cache.dump_pickle('render',self.cache_key,self.new)
@@ -1,19 +1,99 @@
 #!/usr/bin/env python
 import argparse
 import json
-from overleaf2word import overleaf2word
+import sys
+from batch import run_sources, summarize, count_written, profile_report, diagnostics_report, FAILED
+import diagnostics
 
 parser = argparse.ArgumentParser(description='Convert overleaf latex sources to word docs')
 parser.add_argument('sources', help='path to JSON file containing overleaf sources',
   nargs='?',default='sources.json'
 )
+parser.add_argument('-j','--jobs', help='number of worker processes used to '
+  'convert files in parallel (default: %(default)s)',
+  type=int,default=1
+)
+parser.add_argument('--sync-jobs', help='number of git commands run at once '
+  'to sync the repos (default: %(default)s)',
+  type=int,default=4
+)
+parser.add_argument('--sync-per-host', help='number of git commands run at '
+  'once against the same remote host (default: %(default)s)',
+  type=int,default=2
+)
+parser.add_argument('--sync-timeout', help='seconds after which a git clone or '
+  'fetch is killed (default: %(default)s)',
+  type=float,default=300
+)
+parser.add_argument('--sync-retries', help='number of times a failed git '
+  'command talking to the remote is retried (default: %(default)s)',
+  type=int,default=2
+)
+parser.add_argument('--profile', help='write per repo and per file stage '
+  'timings as JSON to this path, - for stdout',
+  metavar='PATH'
+)
+parser.add_argument('--cprofile', help='write a cProfile capture of each file '
+  'conversion to this directory',
+  metavar='DIR'
+)
+parser.add_argument('--diagnostics', help='write the commands, equations and '
+  'other things that could not be converted in each file as JSON to this path, '
+  '- for stdout',
+  metavar='PATH'
+)
+parser.add_argument('--template', help='make the documents from this house '
+  'style .docx instead of the default template, a "template" in a source '
+  'overrides it',
+  metavar='PATH'
+)
+parser.add_argument('--writer', help='output backend, docx builds the '
+  'document in memory with python-docx, ooxml writes it out as it goes. '
+  'Sources with "stream": true use ooxml by default, a "writer" in a source '
+  'overrides it',
+  choices=['docx','ooxml']
+)
+parser.add_argument('-v','--verbose', help='print every diagnostic as it is '
+  'found instead of a summary per file',
+  action='store_const',dest='verbosity',const=diagnostics.VERBOSE,
+  default=diagnostics.SUMMARY
+)
+parser.add_argument('-q','--quiet', help='do not print diagnostics',
+  action='store_const',dest='verbosity',const=diagnostics.QUIET
+)
 
 if __name__ == '__main__':
     args = parser.parse_args()
     with open(args.sources) as f :
         overleaf_repos = json.load(f)
-    for repo in overleaf_repos :
-        overleaf2word(repo['git_clone_url'],
-          repo.get('name'),
-          repo.get('latex_paths',[])
-        )
+    results = run_sources(overleaf_repos,jobs=args.jobs,
+      profile=args.profile is not None,
+      cprofile_dir=args.cprofile,
+      verbosity=args.verbosity,
+      template=args.template,
+      sync_jobs=args.sync_jobs,
+      sync_per_host=args.sync_per_host,
+      sync_timeout=args.sync_timeout,
+      sync_retries=args.sync_retries,
+      writer=args.writer
+    )
+    for res in results :
+        print('[{}] {} {}'.format(res.status,res.project,res.path or '(sync)'))
+        if res.error :
+            print(res.error)
+    counts = summarize(results)
+    print('{ok} ok, {failed} failed, {skipped} skipped, {written} written'.format(
+      written=count_written(results),**counts))
+    if args.profile == '-' :
+        json.dump(profile_report(results),sys.stdout,indent=2)
+        print()
+    elif args.profile :
+        with open(args.profile,'w') as f :
+          json.dump(profile_report(results),f,indent=2)
+    if args.diagnostics == '-' :
+        json.dump(diagnostics_report(results),sys.stdout,indent=2)
+        print()
+    elif args.diagnostics :
+        with open(args.diagnostics,'w') as f :
+          json.dump(diagnostics_report(results),f,indent=2)
+    sys.exit(1 if counts[FAILED] else 0)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+'''Keep local copies of overleaf repos up to date with as little git work as
+possible.
+
+The remote HEAD is looked up with ``git ls-remote`` first, which costs a single
+round trip, and nothing else is done when it matches the commit the repo was
+last converted at. New clones are shallow and single-branch, and updates fetch
+only the tip of the remote HEAD.
+
+:func:`sync_repo` does that for one repo with GitPython. :class:`SyncEngine`
+does the same for many repos at once by running the git commands as
+subprocesses on an asyncio event loop, at most a few at a time overall and
+per remote host, with a timeout on each command and retries with backoff
+for the ones that talk to the remote, so a slow or hung remote only holds
+up its own repo::
+
+    with SyncEngine(concurrency=8,timeout=120) as engine :
+        futures = [engine.submit(url,repo_dir) for url,repo_dir in repos]
+        for fut in as_completed(futures) :
+            print(fut.result())
+'''
+from collections import namedtuple
+import os
+import re
+import sys
+# asyncio, subprocess and the rest of what SyncEngine needs are imported
+# where they are used, the converter imports this module for sync_repo and
+# they would double the time that takes
+
+# commit is the remote HEAD the working tree is now at, changed is False when
+# the repo was already converted at that commit and nothing was done
+SyncResult = namedtuple('SyncResult',['repo_dir','commit','changed'])
+
+def remote_head(url) :
+    '''Return the commit sha the remote HEAD of *url* points to, or None for
+    an empty repo'''
+    from git import Git
+    out = Git().ls_remote(url,'HEAD')
+    if not out :
+        return None
+    return out.split()[0]
+
+def clone(url,repo_dir,depth=1) :
+    '''Shallow, single branch clone of *url* into *repo_dir*'''
+    from git import Repo
+    return Repo.clone_from(url,repo_dir,depth=depth,single_branch=True)
+
+def update(repo_dir,depth=1) :
+    '''Fetch the tip of the remote HEAD and move the working tree to it.
+    Untracked files, like the converted .docx files, are left alone.'''
+    from git import Repo
+    repo = Repo(repo_dir)
+    repo.git.fetch('origin','HEAD',depth=depth)
+    repo.git.reset('--hard','FETCH_HEAD')
+    return repo
+
+def local_head(repo) :
+    '''Return the commit sha checked out in *repo*, or None if it is empty'''
+    if not repo.head.is_valid() :
+        return None
+    return repo.head.commit.hexsha
+
+def sync_repo(url,repo_dir,last_commit=None) :
+    '''Make *repo_dir* a copy of the current remote HEAD of *url*.
+
+    If the repo exists and the remote HEAD is *last_commit*, the commit it was
+    last converted at, nothing is fetched and the result has changed=False.
+
+    :return: SyncResult
+    '''
+    from git import Repo
+    head = remote_head(url)
+
+    if not os.path.exists(repo_dir) :
+        repo = clone(url,repo_dir)
+        return SyncResult(repo_dir,local_head(repo),True)
+
+    if head is not None and head == last_commit :
+        return SyncResult(repo_dir,head,False)
+
+    # the working tree may already be there if the last conversion failed
+    repo = Repo(repo_dir)
+    if head is not None and local_head(repo) != head :
+        repo = update(repo_dir)
+    return SyncResult(repo_dir,local_head(repo),True)
+
+# the git executable SyncEngine runs
+GIT = os.environ.get('OVERLEAF2WORD_GIT','git')
+
+class GitError(Exception) :
+    '''A git command failed, *stderr* is what it printed'''
+
+    def __init__(self,args,returncode,stderr) :
+        Exception.__init__(self,'git {} failed with {}: {}'.format(
+            ' '.join(args),returncode,stderr.strip()))
+        self.returncode = returncode
+        self.stderr = stderr
+
+class GitTimeout(GitError) :
+    '''A git command did not finish in time and was killed'''
+
+    def __init__(self,args,timeout) :
+        Exception.__init__(self,'git {} timed out after {}s'.format(
+            ' '.join(args),timeout))
+        self.returncode = None
+        self.stderr = ''
+
+def _kill(proc) :
+    # git starts helpers for the transport, kill the whole process group
+    import signal
+    try :
+        if sys.platform != 'win32' :
+            os.killpg(proc.pid,signal.SIGKILL)
+        else :
+            proc.kill()
+    except ProcessLookupError :
+        pass
+
+async def run_git(args,cwd=None,timeout=None,git=GIT) :
+    '''Run ``git *args`` and return its stdout. Raises :class:`GitTimeout`
+    if it takes longer than *timeout* seconds, :class:`GitError` if it
+    fails.'''
+    import asyncio
+    import subprocess
+    env = dict(os.environ,GIT_TERMINAL_PROMPT='0')
+    proc = await asyncio.create_subprocess_exec(git,*args,cwd=cwd,env=env,
+        stdin=subprocess.DEVNULL,stdout=subprocess.PIPE,stderr=subprocess.PIPE,
+        start_new_session=sys.platform != 'win32'
+    )
+    try :
+        out, err = await asyncio.wait_for(proc.communicate(),timeout)
+    except asyncio.TimeoutError :
+        _kill(proc)
+        await proc.wait()
+        raise GitTimeout(args,timeout)
+    if proc.returncode :
+        raise GitError(args,proc.returncode,err.decode('utf-8','replace'))
+    return out.decode('utf-8','replace')
+
+# [user@]host:path, which git takes for ssh when there is no / before the :
+_SCP_RE = re.compile(r'^(?:[^@/]+@)?([^:/@\[\]]{2,}):')
+
+def remote_host(url) :
+    '''Return the host of *url*, of the ``[user@]host:path`` ssh remotes
+    too, and '' for local paths'''
+    if '://' in url :
+        from urllib.parse import urlsplit
+        return (urlsplit(url).hostname or '').lower()
+    m = _SCP_RE.match(url)
+    # a single letter is a windows drive
+    return m.group(1).lower() if m is not None else ''
+
+class SyncEngine(object) :
+    '''Sync many repos concurrently, the same way :func:`sync_repo` does.
+
+    At most *concurrency* git commands run at once, and at most
+    *per_host* of them against the same remote host, see
+    :func:`remote_host`, so as not to be throttled by it. Local remotes are
+    only held to *concurrency*. Each command
+    is killed after *timeout* seconds. The commands that talk to the remote
+    are tried *retries* more times when they fail or time out, waiting
+    *backoff* seconds before the first retry and twice as long before each
+    one after it. *git* is the git executable to run.
+
+    The coroutines run on an event loop in a thread of its own, started by
+    :meth:`start` or entering the engine as a context manager. :meth:`submit`
+    schedules a sync from any thread and returns a
+    :class:`concurrent.futures.Future`, so the caller can convert each repo
+    as soon as its sync finishes.'''
+
+    def __init__(self,concurrency=4,per_host=2,timeout=300,retries=2,
+        backoff=1.,git=None) :
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.git_exe = git or GIT
+        self._slots = None
+        self._hosts = {}
+        self._loop = None
+        self._thread = None
+
+    def start(self) :
+        import asyncio
+        import threading
+        if self._loop is None :
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever,
+                name='sync-engine',daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) :
+        '''Stop the event loop once the syncs already submitted are done'''
+        if self._loop is None :
+            return
+        import asyncio
+        async def drain() :
+            tasks = [_ for _ in asyncio.all_tasks() if _ is not asyncio.current_task()]
+            await asyncio.gather(*tasks,return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(drain(),self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+        # the semaphores belong to the closed loop
+        self._slots = None
+        self._hosts = {}
+
+    def __enter__(self) :
+        return self.start()
+
+    def __exit__(self,*exc) :
+        self.close()
+
+    def run(self,coro) :
+        '''Schedule the coroutine *coro* on the engine's loop, returns a
+        :class:`concurrent.futures.Future` of its result'''
+        import asyncio
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro,self._loop)
+
+    def submit(self,url,repo_dir,last_commit=None) :
+        '''Sync *repo_dir* with *url*, returns a Future of the SyncResult'''
+        return self.run(self.sync_repo(url,repo_dir,last_commit))
+
+    async def git(self,*args,url=None,cwd=None,retry=False) :
+        '''Run ``git *args`` in *cwd* within the concurrency limits, those
+        of *url*'s host too if given. With *retry* failed commands are run
+        again with backoff.'''
+        import asyncio
+        if self._slots is None :
+            self._slots = asyncio.Semaphore(self.concurrency)
+        # local remotes are only held to the overall limit
+        host = remote_host(url) or None if url is not None else None
+        if host is not None and host not in self._hosts :
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        attempts = self.retries+1 if retry else 1
+        for attempt in range(attempts) :
+            try :
+                if host is None :
+                    async with self._slots :
+                        return await run_git(args,cwd,self.timeout,self.git_exe)
+                async with self._hosts[host], self._slots :
+                    return await run_git(args,cwd,self.timeout,self.git_exe)
+            except GitError :
+                if attempt == attempts-1 :
+                    raise
+            await asyncio.sleep(self.backoff*2**attempt)
+
+    async def remote_head(self,url) :
+        out = await self.git('ls-remote',url,'HEAD',url=url,retry=True)
+        if not out :
+            return None
+        return out.split()[0]
+
+    async def local_head(self,repo_dir) :
+        try :
+            return (await self.git('rev-parse','--verify','-q','HEAD',
+                cwd=repo_dir)).strip() or None
+        except GitError :
+            # an empty repo
+            return None
+
+    async def clone(self,url,repo_dir,depth=1) :
+        '''Shallow, single branch clone of *url* into *repo_dir*. A clone
+        that failed half way is removed before it is tried again.'''
+        import asyncio
+        import shutil
+        attempts = self.retries+1
+        for attempt in range(attempts) :
+            try :
+                await self.git('clone','--depth',str(depth),'--single-branch',
+                    url,repo_dir,url=url)
+                return
+            except GitError :
+                shutil.rmtree(repo_dir,ignore_errors=True)
+                if attempt == attempts-1 :
+                    raise
+            await asyncio.sleep(self.backoff*2**attempt)
+
+    async def update(self,url,repo_dir,depth=1) :
+        '''Fetch the tip of the remote HEAD and move the working tree to
+        it, like :func:`update`'''
+        await self.git('fetch','--depth',str(depth),'origin','HEAD',url=url,
+            cwd=repo_dir,retry=True)
+        await self.git('reset','-q','--hard','FETCH_HEAD',cwd=repo_dir)
+
+    async def sync_repo(self,url,repo_dir,last_commit=None) :
+        '''Make *repo_dir* a copy of the current remote HEAD of *url*, see
+        :func:`sync_repo`'''
+        head = await self.remote_head(url)
+
+        if not os.path.exists(repo_dir) :
+            await self.clone(url,repo_dir)
+            return SyncResult(repo_dir,await self.local_head(repo_dir),True)
+
+        if head is not None and head == last_commit :
+            return SyncResult(repo_dir,head,False)
+
+        if head is not None and await self.local_head(repo_dir) != head :
+            await self.update(url,repo_dir)
+        return SyncResult(repo_dir,await self.local_head(repo_dir),True)
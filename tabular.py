@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+'''Parse the body of a LaTeX ``tabular`` environment into rows and cells.
+
+:func:`parse` takes the latex between ``\\begin{tabular}`` and
+``\\end{tabular}`` and returns a :class:`Table`: the alignment of each column
+from the column spec, which column boundaries have a ``|``, and the rows
+split on ``\\\\`` and ``&``, with the horizontal rules above and below them.
+The cells are left as latex, the converter turns them into runs. The same
+goes for ``tabular*``, ``tabularx`` and ``longtable``.
+
+The whole body is split with a few regular expressions rather than
+tokenized, so a table of thousands of rows is parsed in one quick pass.'''
+from collections import namedtuple
+import re
+
+# environments parsed as tables, and how many {} arguments come before the
+# column spec
+ENVIRONMENTS = {'tabular':0,'tabular*':1,'tabularx':1,'longtable':0}
+
+# *columns* is the alignment of each column, 'left', 'center' or 'right'.
+# *borders* has one entry per column boundary, left edge first, True where
+# the column spec has a |
+Table = namedtuple('Table',['columns','borders','rows'])
+# *top* and *bottom* are whether a rule is drawn above and below the row
+Row = namedtuple('Row',['cells','top','bottom'])
+# *content* is the latex of the cell, *span* the number of columns it takes
+# and *align* its alignment if \multicolumn gives it one, otherwise None
+Cell = namedtuple('Cell',['content','span','align'])
+
+ALIGN = {'l':'left','c':'center','r':'right'}
+# paragraph columns, their {width} is skipped
+_PARAGRAPH = frozenset('pmb')
+
+_ROW_RE = re.compile(r'\\\\(?:\s*\[[^]]*\])?|\\tabularnewline\b')
+_CELL_RE = re.compile(r'(?<!\\)&')
+_RULE_RE = re.compile(r'\s*\\(?:hline|toprule|midrule|bottomrule|'
+    r'cline\s*\{[^}]*\}|cmidrule\s*(?:\([^)]*\))?\s*\{[^}]*\})')
+_REPEAT_RE = re.compile(r'\*\{(\d+)\}')
+_MULTICOLUMN_RE = re.compile(r'\\multicolumn\{(\d+)\}')
+
+def group(text,pos) :
+    '''Return the contents of the {} group starting at *pos* of *text* and
+    the position after it, nested groups included. A single character
+    stands for a group of its own like in latex.'''
+    while pos < len(text) and text[pos].isspace() :
+        pos += 1
+    if pos >= len(text) :
+        return '', pos
+    if text[pos] != '{' :
+        return text[pos], pos+1
+    depth = 0
+    for i in range(pos,len(text)) :
+        if text[i] == '{' and (i == 0 or text[i-1] != '\\') :
+            depth += 1
+        elif text[i] == '}' and text[i-1] != '\\' :
+            depth -= 1
+            if depth == 0 :
+                return text[pos+1:i], i+1
+    return text[pos+1:], len(text)
+
+def expand(spec) :
+    '''Return the column spec *spec* with the *{n}{cols} repeats written out'''
+    while True :
+        m = _REPEAT_RE.search(spec)
+        if m is None :
+            return spec
+        cols, end = group(spec,m.end())
+        spec = spec[:m.start()]+cols*int(m.group(1))+spec[end:]
+
+def parse_spec(spec) :
+    '''Return the (columns, borders) of the column spec *spec*, see
+    :class:`Table`'''
+    spec = expand(spec)
+    columns = []
+    borders = [False]
+    i = 0
+    while i < len(spec) :
+        c = spec[i]
+        i += 1
+        if c == '|' :
+            borders[-1] = True
+        elif c in ALIGN or c in _PARAGRAPH or c == 'X' :
+            if c in _PARAGRAPH :
+                _, i = group(spec,i)
+            columns.append(ALIGN.get(c,'left'))
+            borders.append(False)
+        elif c in '@!><' :
+            # inter-column material and column decorations, dropped
+            _, i = group(spec,i)
+    return columns, borders
+
+def _cell(tex) :
+    m = _MULTICOLUMN_RE.match(tex)
+    if m is None :
+        return Cell(tex,1,None)
+    spec, pos = group(tex,m.end())
+    content, pos = group(tex,pos)
+    columns, _ = parse_spec(spec)
+    return Cell(content+tex[pos:],int(m.group(1)),
+        columns[0] if columns else None)
+
+def _rules(text) :
+    # the horizontal rules at the start of *text*, and what follows them
+    rules = 0
+    while True :
+        m = _RULE_RE.match(text)
+        if m is None :
+            return rules, text
+        rules += 1
+        text = text[m.end():]
+
+def parse(env,text) :
+    '''Parse *text*, what follows ``\\begin{env}`` up to ``\\end{env}``, into
+    a :class:`Table`'''
+    pos = 0
+    for _ in range(ENVIRONMENTS.get(env,0)) :
+        _, pos = group(text,pos)
+    # [pos] of the table
+    if text[pos:].lstrip().startswith('[') :
+        pos = text.index(']',pos)+1
+    spec, pos = group(text,pos)
+    columns, borders = parse_spec(spec)
+
+    rows = []
+    top = False
+    for line in _ROW_RE.split(text[pos:]) :
+        rules, line = _rules(line)
+        if rules :
+            if rows :
+                rows[-1] = rows[-1]._replace(bottom=True)
+            top = True
+        if not line.strip() :
+            continue
+        cells = [_cell(_.strip()) for _ in _CELL_RE.split(line)]
+        rows.append(Row(cells,top,False))
+        top = False
+
+    # rows with more cells than the spec has columns get left aligned ones
+    width = max([sum(_.span for _ in row.cells) for row in rows]+[0])
+    while len(columns) < width :
+        columns.append('left')
+        borders.append(False)
+    return Table(columns,borders,rows)
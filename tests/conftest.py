@@ -0,0 +1,97 @@
+from collections import OrderedDict
+import os
+import pytest
+from git import Repo
+
+import bibcache
+import cache
+import decoding
+import images
+import includes
+import omml
+import overleaf2word
+
+SAMPLE_TEX = r'''\documentclass{article}
+\begin{document}
+\section{Introduction}
+Some text with a citation \cite{Cesar2013}
+
+A second \textbf{bold} paragraph.
+\end{document}
+'''
+
+SAMPLE_BIB = r'''@article{Cesar2013,
+  author = {César, Jean},
+  title = {An amazing title},
+  journal = {Nice Journal},
+  year = {2013},
+  volume = {12},
+  pages = {12--23},
+}
+'''
+
+def make_project(path,files=None) :
+    '''Create a git repo at *path* standing in for an overleaf project'''
+    if files is None :
+        files = {'main.tex':SAMPLE_TEX,'refs.bib':SAMPLE_BIB}
+    repo = Repo.init(path)
+    with repo.config_writer() as cw :
+        cw.set_value('user','name','test')
+        cw.set_value('user','email','test@example.com')
+    for fn, content in files.items() :
+        mode = 'wb' if isinstance(content,bytes) else 'w'
+        with open(os.path.join(path,fn),mode) as f :
+            f.write(content)
+    repo.index.add(list(files))
+    repo.index.commit('initial')
+    return repo
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path,monkeypatch) :
+    '''Keep the on-disk caches of every test separate'''
+    d = str(tmp_path/'cache')
+    monkeypatch.setattr(cache,'CACHE_DIR',d)
+    monkeypatch.setattr(bibcache,'_loaded',{})
+    monkeypatch.setattr(decoding,'_detected',{})
+    monkeypatch.setattr(images,'_processed',{})
+    monkeypatch.setattr(includes,'_tokens',OrderedDict())
+    monkeypatch.setattr(omml,'formulas',omml.FormulaCache())
+    return d
+
+@pytest.fixture
+def repo_dir(tmp_path,monkeypatch) :
+    '''Point overleaf2word.REPO_DIR at a temporary directory'''
+    d = str(tmp_path/'overleaf_repos')
+    monkeypatch.setattr(overleaf2word,'REPO_DIR',d)
+    return d
+
+@pytest.fixture
+def project(tmp_path) :
+    '''A local git repo standing in for an overleaf remote'''
+    path = str(tmp_path/'remote'/'project')
+    os.makedirs(path)
+    make_project(path)
+    return path
+
+@pytest.fixture
+def bare_remote(tmp_path) :
+    '''A bare repo standing in for overleaf, returns (url, work repo). Commits
+    pushed from the work repo show up on the remote.'''
+    work = str(tmp_path/'work')
+    os.makedirs(work)
+    repo = make_project(work)
+    bare = str(tmp_path/'remote.git')
+    Repo.init(bare,bare=True)
+    repo.create_remote('origin',bare)
+    repo.git.push('origin','HEAD:refs/heads/master')
+    Repo(bare).git.symbolic_ref('HEAD','refs/heads/master')
+    # file:// so clones honour --depth
+    return 'file://'+bare, repo
+
+def push_change(repo,fn,content) :
+    with open(os.path.join(repo.working_dir,fn),'w') as f :
+        f.write(content)
+    repo.index.add([fn])
+    repo.index.commit('change {}'.format(fn))
+    repo.git.push('origin','HEAD:refs/heads/master')
+    return repo.head.commit.hexsha
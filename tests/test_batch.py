@@ -0,0 +1,90 @@
+import os
+
+from git import Repo
+
+from conftest import SAMPLE_TEX
+from batch import run_sources, summarize, count_written, OK, FAILED, SKIPPED
+import overleaf2word
+
+def test_serial(repo_dir,project) :
+    sources = [{'git_clone_url':project,'name':'Project','latex_paths':['main.tex','missing.tex']}]
+    results = run_sources(sources)
+    assert [(r.path,r.status) for r in results] == [
+        (None,OK),('main.tex',OK),('missing.tex',SKIPPED)
+    ]
+    assert os.path.exists(os.path.join(repo_dir,'project','main.docx'))
+
+def test_failure_does_not_stop_batch(repo_dir,project,tmp_path) :
+    for jobs in (1,2) :
+        sources = [
+            {'git_clone_url':str(tmp_path/'nope'),'name':'broken','latex_paths':['main.tex']},
+            {'git_clone_url':project,'name':'good','latex_paths':['main.tex']},
+        ]
+        # fresh clone for each mode so the file is not skipped as unchanged
+        sources[1]['name'] += str(jobs)
+        results = run_sources(sources,jobs=jobs)
+        by_project = {(r.project,r.path):r.status for r in results}
+        assert by_project[('broken',None)] == FAILED
+        assert by_project[(sources[1]['name'],'main.tex')] == OK
+        assert summarize(results) == {OK:2,FAILED:1,SKIPPED:0}
+
+def test_unchanged_output_not_written(repo_dir,project) :
+    sources = [{'git_clone_url':project,'name':'Project','latex_paths':['main.tex']}]
+    results = run_sources(sources)
+    assert count_written(results) == 1
+    doc_fn = os.path.join(repo_dir,'project','main.docx')
+    mtime = os.stat(doc_fn).st_mtime_ns
+
+    # a new comment is a new input but gives the same document
+    with open(os.path.join(project,'main.tex'),'w') as f :
+        f.write(SAMPLE_TEX.replace('\\section','% a comment\n\\section'))
+    repo = Repo(project)
+    repo.index.add(['main.tex'])
+    repo.index.commit('comment')
+    results = run_sources(sources)
+    assert [(r.path,r.status,r.written) for r in results] == [
+        (None,OK,False),('main.tex',OK,False)
+    ]
+    assert count_written(results) == 0
+    assert os.stat(doc_fn).st_mtime_ns == mtime
+
+def test_writer_per_source(repo_dir,project,monkeypatch) :
+    used = []
+    def recording(name) :
+        cls = overleaf2word.WRITERS[name]
+        def make(doc_fn,template) :
+            used.append((os.path.basename(os.path.dirname(doc_fn)),name))
+            return cls(doc_fn,template)
+        return make
+    monkeypatch.setattr(overleaf2word,'WRITERS',
+        {_:recording(_) for _ in overleaf2word.WRITERS})
+
+    sources = [
+        {'git_clone_url':project,'name':'default','latex_paths':['main.tex']},
+        {'git_clone_url':project,'name':'streamed','latex_paths':['main.tex'],
+         'stream':True},
+        {'git_clone_url':project,'name':'named','latex_paths':['main.tex'],
+         'writer':'docx'},
+    ]
+    results = run_sources(sources)
+    assert summarize(results) == {OK:6,FAILED:0,SKIPPED:0}
+    assert sorted(used) == [('default','docx'),('named','docx'),
+        ('streamed','ooxml')]
+
+    # the backend given to run_sources is the default for every source
+    del used[:]
+    for source in sources :
+        source['name'] += '2'
+    run_sources(sources,writer='ooxml')
+    assert sorted(used) == [('default2','ooxml'),('named2','docx'),
+        ('streamed2','ooxml')]
+
+def test_pool_does_not_fork(repo_dir,project,cache_dir) :
+    # the sync engine's thread is running when the workers start
+    import batch
+    with batch._pool(2) as pool :
+        assert pool.submit(os.getppid).result() != os.getpid()
+    sources = [{'git_clone_url':project,'name':'p','latex_paths':['main.tex']}]
+    assert summarize(run_sources(sources,jobs=2)) == {OK:2,FAILED:0,SKIPPED:0}
+    # the workers write their caches where the parent's are
+    assert os.listdir(cache_dir)
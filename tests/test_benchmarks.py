@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+
+import docx
+
+sys.path.insert(0,os.path.join(os.path.dirname(__file__),'..','benchmarks'))
+import bench_decoding
+import bench_math
+import bench_stages
+import bench_stream
+import bench_tables
+import bench_template
+import bench_words
+import bench_writer
+import corpus
+from overleaf2word import tex_to_word
+
+def test_corpus_converts(tmp_path) :
+    d = str(tmp_path)
+    tex_fn = corpus.make_corpus(d,paragraphs=20,sections=4,bib_entries=10,
+        lists=2,list_depth=3,images=1,image_size=(50,50))
+    tex_to_word(tex_fn,d,os.path.join(d,'refs.bib'))
+
+    doc = docx.Document(os.path.join(d,'main.docx'))
+    styles = set(p.style.name for p in doc.paragraphs)
+    assert {'Heading 1','Heading 2','List Bullet','List Number 2'} <= styles
+    assert len(doc.inline_shapes) == 1
+
+def test_bench_stages() :
+    results = bench_stages.run([5],repeat=1,bib_entries=5,images=0)
+    json.dumps(results)
+    stages = results['results'][0]['stages']
+    assert set(stages) == {'lex','bib_parse','bib_load','paragraphs','save','tex_to_word'}
+    assert all(_['seconds'] >= 0 for _ in stages.values())
+
+def test_bench_stream() :
+    res, = bench_stream.run([5],repeat=1)['results']
+    assert res['whole']['peak_bytes'] > 0 and res['stream']['peak_bytes'] > 0
+
+def test_bench_writer() :
+    res, = bench_writer.run([5],repeat=1)['results']
+    assert res['docx']['docx_bytes'] > 0 and res['ooxml']['docx_bytes'] > 0
+
+def test_bench_words() :
+    res, = bench_words.run([200],repeat=1)['results']
+    assert res['words'] == 200
+    assert res['buffer']['bytes_per_word'] < res['tuples']['bytes_per_word']
+
+def test_bench_template() :
+    res = bench_template.run(files=2)
+    setup = res['setup_seconds_per_file']
+    assert setup['copy'] > 0 and setup['load'] > 0
+    assert set(res['convert_seconds_per_file']) == {'cached','uncached'}
+
+def test_bench_math() :
+    res, = bench_math.run([5],repeat=1)['results']
+    assert res['equations'] == 26
+    assert all(res[_]['equations_per_second'] > 0 for _ in ('uncached','cold','warm'))
+
+def test_bench_decoding() :
+    res = bench_decoding.run(files=10,size=20000,foreign=0.5,repeat=1,chardet_files=2)
+    assert res['foreign'] > 0 and res['correct'] == 10
+    assert all(_ > 0 for _ in res['mb_per_second'].values())
+
+def test_bench_tables() :
+    res, = bench_tables.run([20],repeat=1)['results']
+    assert res['rows'] == 20
+    assert all(res[_]['rows_per_second'] > 0 for _ in ('parse','cell_api','docx','ooxml'))
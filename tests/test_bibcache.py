@@ -0,0 +1,29 @@
+import os
+
+import bibcache
+from conftest import SAMPLE_BIB
+
+def test_load_bib(tmp_path,cache_dir,monkeypatch) :
+    bib_fn = str(tmp_path/'refs.bib')
+    with open(bib_fn,'w') as f :
+        f.write(SAMPLE_BIB)
+
+    bibdb = bibcache.load_bib(bib_fn)
+    entry = bibdb['Cesar2013']
+    assert entry.cite == 'César 2013'
+    assert entry.ref == ['César, Jean et al. ','An amazing title. ',
+        'Nice Journal. ','12, ','12--23 ','(2013)','.']
+    assert os.listdir(os.path.join(cache_dir,'bib'))
+
+    # a second load in this process or a new one does not parse again
+    def fail(s) :
+        raise AssertionError('parsed again')
+    monkeypatch.setattr(bibcache,'parse_bib',fail)
+    assert bibcache.load_bib(bib_fn) is bibdb
+    bibcache._loaded.clear()
+    assert bibcache.load_bib(bib_fn) == bibdb
+
+def test_empty_bib(tmp_path) :
+    bib_fn = str(tmp_path/'refs.bib')
+    open(bib_fn,'w').close()
+    assert bibcache.load_bib(bib_fn) is None
@@ -0,0 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
+import os
+import zipfile
+
+import docx
+from PIL import Image
+import pytest
+
+from conftest import SAMPLE_BIB
+import includes
+from overleaf2word import Converter
+
+DOC = r'''\documentclass{article}
+\begin{document}
+\section{Part %(i)d}
+Some text number %(i)d with $x_{%(i)d}^2$ and a citation \cite{Cesar2013}
+
+\input{chapter%(j)d}
+
+\begin{itemize}
+\item first %(i)d
+\item second
+\end{itemize}
+
+\includegraphics{fig%(j)d.png}
+
+\begin{equation}
+\frac{a_{%(i)d}}{b} = \sum_{k=1}^{n} k
+\end{equation}
+
+A \textbf{bold} and \textit{italic} end \unknown{%(i)d}.
+
+\end{document}
+'''
+
+CHAPTER = r'''\subsection{Chapter %(j)d}
+Text of chapter %(j)d with $\alpha + %(j)d$.
+
+'''
+
+def make_docs(d,n) :
+    with open(os.path.join(d,'refs.bib'),'w') as f :
+        f.write(SAMPLE_BIB)
+    for j in range(3) :
+        with open(os.path.join(d,'chapter{}.tex'.format(j)),'w') as f :
+            f.write(CHAPTER%{'j':j})
+        Image.new('RGB',(40+j,30),'blue').save(
+            os.path.join(d,'fig{}.png'.format(j)))
+    fns = []
+    for i in range(n) :
+        fn = os.path.join(d,'doc{}.tex'.format(i))
+        with open(fn,'w') as f :
+            f.write(DOC%{'i':i,'j':i%3})
+        fns.append(fn)
+    return fns
+
+def parts(doc_fn) :
+    with zipfile.ZipFile(doc_fn) as zf :
+        return {_:zf.read(_) for _ in zf.namelist()}
+
+@pytest.mark.parametrize('writer',['docx','ooxml'])
+@pytest.mark.parametrize('tokenizer',['ply','scan'])
+def test_threads_match_serial(tmp_path,writer,tokenizer) :
+    d = str(tmp_path)
+    tex_fns = make_docs(d,8)
+    converter = Converter(os.path.join(d,'refs.bib'),writer=writer,
+        tokenizer=tokenizer,verbosity=0)
+
+    def out(kind,tex_fn,n=0) :
+        name = os.path.basename(tex_fn).replace('.tex','-{}.docx'.format(n))
+        return os.path.join(d,kind,name)
+    os.makedirs(os.path.join(d,'serial'))
+    os.makedirs(os.path.join(d,'threads'))
+    expected = {}
+    for fn in tex_fns :
+        assert converter.convert(fn,d,doc_fn=out('serial',fn))
+        expected[fn] = parts(out('serial',fn))
+
+    jobs = [(fn,n) for n in range(4) for fn in tex_fns]
+    def convert(job) :
+        fn, n = job
+        return converter.convert(fn,d,doc_fn=out('threads',fn,n))
+    with ThreadPoolExecutor(8) as pool :
+        assert all(pool.map(convert,jobs))
+    for fn, n in jobs :
+        assert parts(out('threads',fn,n)) == expected[fn]
+
+def test_threads_never_fork(tmp_path,monkeypatch) :
+    d = str(tmp_path)
+    tex_fns = []
+    for i in range(8) :
+        for j in range(4) :
+            with open(os.path.join(d,'part{}-{}.tex'.format(i,j)),'w') as f :
+                f.write('Part {} of doc {}.\n\n'.format(j,i))
+        fn = os.path.join(d,'doc{}.tex'.format(i))
+        with open(fn,'w') as f :
+            f.write('\n'.join(r'\input{{part{}-{}}}'.format(i,j) for j in range(4))
+                +'\n\n')
+        tex_fns.append(fn)
+
+    # even when tex_to_word would tokenize the sub-files in worker processes
+    monkeypatch.setattr(includes,'TOKEN_WORKERS',4)
+    monkeypatch.setattr(includes,'TOKEN_POOL_BYTES',0)
+    def no_pool(*args,**kwargs) :
+        raise AssertionError('forked a process pool from a thread')
+    monkeypatch.setattr(concurrent.futures,'ProcessPoolExecutor',no_pool)
+
+    converter = Converter(verbosity=0)
+    with ThreadPoolExecutor(8) as pool :
+        assert all(pool.map(lambda fn: converter.convert(fn,d),tex_fns))
+    for i, fn in enumerate(tex_fns) :
+        doc = docx.Document(fn.replace('.tex','.docx'))
+        assert [p.text.strip() for p in doc.paragraphs if p.text.strip()] == [
+            'Part {} of doc {}.'.format(j,i) for j in range(4)]
+
+def test_stream(tmp_path) :
+    d = str(tmp_path)
+    tex_fns = make_docs(d,3)
+    converter = Converter(os.path.join(d,'refs.bib'),stream=True,verbosity=0)
+    assert converter.tokenizer == 'scan'
+    whole = Converter(os.path.join(d,'refs.bib'),writer='ooxml',
+        tokenizer='scan',verbosity=0)
+    for fn in tex_fns :
+        assert converter.convert(fn,d,doc_fn=fn.replace('.tex','-stream.docx'))
+        assert whole.convert(fn,d)
+        assert parts(fn.replace('.tex','-stream.docx')) == parts(
+            fn.replace('.tex','.docx'))
@@ -0,0 +1,83 @@
+import io
+import os
+import zipfile
+
+from lxml import etree
+import pytest
+
+import decoding
+from diagnostics import Diagnostics, QUIET
+from overleaf2word import tex_to_word
+
+TEXT = 'Les r\u00e9sultats de l\u2019\u00e9tude sont tr\u00e8s \u00ab nets \u00bb, voil\u00e0.\n'
+
+@pytest.fixture
+def detections(monkeypatch) :
+    '''Count the samples given to chardet and their sizes'''
+    import chardet
+    sizes = []
+    detect = chardet.detect
+    def counted(data) :
+        sizes.append(len(data))
+        return detect(data)
+    monkeypatch.setattr(chardet,'detect',counted)
+    return sizes
+
+def test_utf8_fast_path(detections) :
+    assert decoding.decode(TEXT.encode('utf-8')) == TEXT
+    assert decoding.decode(b'plain ascii\r\nline\r') == 'plain ascii\nline\n'
+    assert decoding.decode('\ufeff\u00e9t\u00e9'.encode('utf-8')) == '\u00e9t\u00e9'
+    assert decoding.decode('\ufeffx\r\n'.encode('utf-16-le')) == 'x\n'
+    # decomposed accents are composed
+    assert decoding.decode('e\u0301t\u00e9'.encode('utf-8')) == '\u00e9t\u00e9'
+    assert detections == []
+
+def test_detect_once_per_content(detections) :
+    data = (TEXT*2000).encode('cp1252')
+    diag = Diagnostics('main.tex',QUIET)
+    assert decoding.decode(data,diag,'main.tex') == TEXT*2000
+    assert diag.counts() == {'encoding':1}
+    # on a bounded sample, not the whole file
+    assert detections == [decoding.SAMPLE_SIZE] and len(data) > 4*decoding.SAMPLE_SIZE
+
+    assert decoding.decode(data) == TEXT*2000
+    decoding._detected.clear()
+    # from the on-disk cache
+    assert decoding.decode(data) == TEXT*2000
+    assert len(detections) == 1
+
+    # bytes that are not even cp1252 still decode
+    assert decoding.decode(b'caf\xe9 \x81') == 'caf\u00e9 \x81'
+
+def test_open_text() :
+    data = (TEXT*10).replace('\n','\r\n').encode('cp1252')
+    diag = Diagnostics('main.tex',QUIET)
+    with decoding.open_text(io.BytesIO(data),diag,'main.tex') as f :
+        assert f.read() == TEXT*10
+    assert diag.counts() == {'encoding':1}
+    with decoding.open_text(io.BytesIO(TEXT.encode('utf-8'))) as f :
+        assert f.read() == TEXT
+
+def body_text(doc_fn) :
+    with zipfile.ZipFile(doc_fn) as zf :
+        body = etree.fromstring(zf.read('word/document.xml'))
+    return ''.join(body.itertext())
+
+@pytest.mark.parametrize('stream',[False,True])
+def test_latin1_project(tmp_path,stream) :
+    d = str(tmp_path)
+    with open(os.path.join(d,'main.tex'),'wb') as f :
+        f.write('\\begin{document}\r\n\\section{\u00c9t\u00e9}\r\nUn caf\u00e9 \\cite{Cesar2013}\r\n\r\n'
+            '\\input{chap}\r\n\\end{document}\r\n'.encode('latin-1'))
+    with open(os.path.join(d,'chap.tex'),'wb') as f :
+        f.write('Na\u00efve r\u00e9sum\u00e9.\n\n'.encode('cp1252'))
+    with open(os.path.join(d,'refs.bib'),'wb') as f :
+        f.write('@article{Cesar2013,\n  author = {C\u00e9sar, Jean},\n  year = {2013},\n}\n'.encode('latin-1'))
+    diag = Diagnostics('main.tex',QUIET)
+    tex_to_word(os.path.join(d,'main.tex'),d,os.path.join(d,'refs.bib'),
+        stream=stream,tokenizer='scan' if stream else None,diagnostics=diag)
+    text = body_text(os.path.join(d,'main.docx'))
+    assert '\u00c9t\u00e9' in text and 'Un caf\u00e9' in text
+    assert '(C\u00e9sar 2013)' in text and 'Na\u00efve r\u00e9sum\u00e9.' in text
+    assert '\r' not in text
+    assert diag.counts()['encoding'] == 2
@@ -0,0 +1,86 @@
+import json
+import os
+
+from batch import run_sources, diagnostics_report
+import diagnostics
+from diagnostics import Diagnostics
+from overleaf2word import tex_to_word
+
+TEX = r'''\documentclass{article}
+\usepackage{amsmath}
+\usepackage{graphicx}
+\usepackage{hyperref}
+\usepackage{natbib}
+\begin{document}
+\item outside of a list
+Some $x^2$, $\frac{y$ and $\weird{y}$ math.
+\begin{description}
+\item[a] described
+\end{description}
+\input{missing}
+\input{chapter}
+\end{document}
+'''
+
+def test_collected(tmp_path,capsys) :
+    d = str(tmp_path)
+    tex_fn = os.path.join(d,'main.tex')
+    with open(tex_fn,'w') as f :
+        f.write(TEX)
+    with open(os.path.join(d,'chapter.tex'),'w') as f :
+        f.write('Chapter\n\\unknown{arg}\n')
+    diag = Diagnostics(tex_fn,verbosity=diagnostics.QUIET)
+    tex_to_word(tex_fn,d,diagnostics=diag)
+    assert 'usepackage' not in capsys.readouterr().out
+
+    assert diag.total == 11
+    assert diag.counts() == {'unrecognized_command':6,'equation':1,
+        'math_command':1,'item_outside_list':1,'item_unknown_list':1,
+        'missing_include':1}
+
+    report = json.loads(diag.to_json())
+    assert report['file'] == tex_fn and report['total'] == 11
+    first = report['diagnostics'][0]
+    # most frequent first, only the first few locations are kept
+    assert (first['kind'],first['name'],first['count']) == (
+        'unrecognized_command','usepackage',4)
+    assert [_['line'] for _ in first['samples']] == [2,3,4]
+    assert first['samples'][0] == {'file':tex_fn,'line':2,
+        'text':'\\usepackage{amsmath}'}
+    unknown, = [_ for _ in report['diagnostics'] if _['name'] == 'unknown']
+    assert unknown['samples'] == [{'file':'chapter.tex','line':2,
+        'text':'\\unknown{arg}'}]
+    assert 'usepackage (line 2, 3, 4, ...)' in diag.summary()
+
+    # the default is a single summary
+    tex_to_word(tex_fn,d)
+    out = capsys.readouterr().out
+    assert out.count('usepackage') == 1 and '11 diagnostics in' in out
+
+def test_verbose_matches_summary(capsys) :
+    diag = Diagnostics('main.tex',verbosity=diagnostics.VERBOSE)
+    diag.add('unrecognized_command','usepackage',2,'\\usepackage{amsmath}')
+    diag.source = 'chapter.tex'
+    diag.add('encoding','cp1252',None,'chapter.tex')
+    diag.add('unrecognized_command','unknown',2,'\\unknown{arg}')
+    assert capsys.readouterr().out.splitlines() == [
+        'unrecognized command \\usepackage (line 2): \\usepackage{amsmath}',
+        'file is not UTF-8, decoded as cp1252: chapter.tex',
+        'unrecognized command \\unknown (line chapter.tex:2): \\unknown{arg}',
+    ]
+    assert diag.summary().splitlines()[1:] == [
+        '      1 unrecognized command \\usepackage (line 2)',
+        '      1 file is not UTF-8, decoded as cp1252',
+        '      1 unrecognized command \\unknown (line chapter.tex:2)',
+    ]
+
+def test_batch_report(repo_dir,project,capsys) :
+    results = run_sources([{'git_clone_url':project,'name':'p',
+                            'latex_paths':['main.tex']}],
+        verbosity=diagnostics.QUIET
+    )
+    assert 'unrecognized' not in capsys.readouterr().out
+    report = json.loads(json.dumps(diagnostics_report(results)))
+    f, = report['files']
+    assert f['repo'] == 'p' and f['file'] == 'main.tex'
+    assert report['counts'] == {'unrecognized_command':1}
@@ -0,0 +1,42 @@
+import io
+import os
+
+import docx
+from git import Repo
+from PIL import Image
+
+from conftest import SAMPLE_TEX, push_change
+import gitsource
+from overleaf2word import convert_revisions
+
+def png_bytes(width=100) :
+    buf = io.BytesIO()
+    Image.new('RGB',(width,20),'red').save(buf,format='PNG')
+    return buf.getvalue()
+
+def test_convert_revisions(tmp_path,bare_remote,monkeypatch) :
+    monkeypatch.setattr(gitsource,'_blobs',gitsource.OrderedDict())
+    url, work = bare_remote
+    work.create_tag('v1')
+    with open(os.path.join(work.working_dir,'fig.png'),'wb') as f :
+        f.write(png_bytes())
+    work.index.add(['fig.png'])
+    push_change(work,'main.tex',SAMPLE_TEX.replace(
+        'Some text','\\includegraphics{fig.png}\n\nChanged text'))
+    work.create_tag('v2')
+    work.git.push('origin','--tags')
+
+    bare = url[len('file://'):]
+    assert Repo(bare).bare
+    out_dir = str(tmp_path/'out')
+    written = convert_revisions(bare,['v1','v2'],['main.tex'],out_dir)
+    assert written == [os.path.join(out_dir,'v1','main.docx'),
+                       os.path.join(out_dir,'v2','main.docx')]
+
+    v1, v2 = [docx.Document(_) for _ in written]
+    assert 'Some text' in '\n'.join(p.text for p in v1.paragraphs)
+    assert 'Changed text' in '\n'.join(p.text for p in v2.paragraphs)
+    assert len(v1.inline_shapes) == 0
+    assert len(v2.inline_shapes) == 1
+    # two versions of main.tex, one bib and one image, the bib blob is shared
+    assert len(gitsource._blobs) == 4
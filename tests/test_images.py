@@ -0,0 +1,50 @@
+import io
+import os
+import shutil
+
+import docx
+from PIL import Image
+
+import images
+from overleaf2word import tex_to_word
+
+def image_bytes(size,fmt='PNG',mode='RGB') :
+    buf = io.BytesIO()
+    Image.new(mode,size,'blue').save(buf,format=fmt)
+    return buf.getvalue()
+
+def test_process_image(cache_dir) :
+    # 3000px at 72dpi would be way past the 6 inch maximum
+    pic = images.process_image(image_bytes((3000,1500),'TIFF'),dpi=150)
+    assert pic.width == 6
+    img = Image.open(io.BytesIO(pic.data))
+    assert img.format == 'PNG'
+    assert img.size == (900,450)
+    assert os.listdir(os.path.join(cache_dir,'images'))
+
+    pic = images.process_image(image_bytes((720,72),'JPEG'),dpi=150)
+    # no upscaling when the image is smaller than the target resolution
+    assert pic.width == 6
+    img = Image.open(io.BytesIO(pic.data))
+    assert img.format == 'JPEG' and img.size == (720,72)
+
+def test_small_image_unchanged() :
+    data = image_bytes((72,72))
+    pic = images.process_image(data)
+    assert pic == images.Picture(data,1)
+
+def test_identical_images_embedded_once(tmp_path) :
+    d = str(tmp_path)
+    with open(os.path.join(d,'a.png'),'wb') as f :
+        f.write(image_bytes((2000,100)))
+    shutil.copy(os.path.join(d,'a.png'),os.path.join(d,'b.png'))
+    tex_fn = os.path.join(d,'main.tex')
+    with open(tex_fn,'w') as f :
+        f.write('\\includegraphics{a.png}\n\\includegraphics[width=2in]{b.png}\n')
+    tex_to_word(tex_fn,d)
+
+    doc = docx.Document(os.path.join(d,'main.docx'))
+    assert len(doc.inline_shapes) == 2
+    image_parts = [_ for _ in doc.part.package.parts
+                   if _.partname.startswith('/word/media/')]
+    assert len(image_parts) == 1
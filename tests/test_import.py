@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_import_is_lazy(tmp_path) :
+    code = ('import sys, overleaf2word, tex2word, batch; '
+            'print(",".join(_ for _ in ("docx","git","PIL","bibtexparser",'
+            '"xml.sax","urllib.request","asyncio") if _ in sys.modules))')
+    env = dict(os.environ,PYTHONPATH=ROOT)
+    out = subprocess.check_output([sys.executable,'-c',code],cwd=str(tmp_path),
+        env=env,universal_newlines=True)
+    assert out.strip() == ''
+    # the prebuilt tables are used, nothing is written to the working dir
+    assert os.listdir(str(tmp_path)) == []
+
+def test_tables_up_to_date() :
+    # the prebuilt tables are trusted as is, so they have to be regenerated
+    # whenever the rules change
+    from ply import yacc
+    import overleaf2word, tex2word, tex2word_parsetab
+
+    for module in (overleaf2word,tex2word) :
+        rules = {}
+        for name, rule in vars(module).items() :
+            if name.startswith('t_') and name not in ('t_ignore','t_error') :
+                rules[name] = rule.__doc__ if callable(rule) else rule
+        master = ''.join(_[0].pattern for _ in module.lexer.lexstatere['INITIAL'])
+        assert master.count('(?P<t_') == len(rules)
+        for name, regex in rules.items() :
+            assert '(?P<{}>{})'.format(name,regex) in master
+
+    pinfo = yacc.ParserReflect(vars(tex2word))
+    pinfo.get_all()
+    assert pinfo.signature() == tex2word_parsetab._lr_signature
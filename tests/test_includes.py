@@ -0,0 +1,184 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
+import os
+
+import docx
+import pytest
+
+from diagnostics import Diagnostics, QUIET
+from gitsource import WorktreeSource
+import includes
+from includes import IncludeGraph, candidates, find_includes
+from manifest import Manifest
+from overleaf2word import tex_to_word
+
+MAIN_TEX = r'''\begin{document}
+First paragraph.
+
+\input{chapters/one}
+% \input{commented}
+\include{two}
+\input{missing}
+\input{chapters/one.tex}
+
+Last paragraph.
+
+\end{document}
+'''
+
+FILES = {
+    'main.tex':MAIN_TEX,
+    'chapters/one.tex':'Chapter one.\n\n',
+    # includes itself through three
+    'two.tex':'Chapter two.\n\n\\input{three}\n',
+    'three.tex':'Chapter three.\n\n\\input{two}\n',
+}
+
+def write_project(d,files=FILES) :
+    for fn, content in files.items() :
+        path = os.path.join(d,fn)
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        with open(path,'w') as f :
+            f.write(content)
+    return os.path.join(d,'main.tex')
+
+def test_find_includes() :
+    assert find_includes(MAIN_TEX) == [('input','chapters/one'),
+        ('include','two'),('input','missing'),('input','chapters/one.tex')]
+    assert candidates('include','two') == ['two.tex']
+    assert candidates('input','./a/b') == [os.path.join('a','b.tex'),
+        os.path.join('a','b')]
+    assert candidates('input','/etc/passwd') == []
+    assert candidates('include','a/../../b') == []
+
+def test_includes_converted(tmp_path) :
+    d = str(tmp_path)
+    tex_fn = write_project(d)
+    tex_to_word(tex_fn,d)
+
+    doc = docx.Document(os.path.join(d,'main.docx'))
+    pars = [p.text.strip() for p in doc.paragraphs]
+    breaks = [i for i,p in enumerate(doc.paragraphs)
+              if p._p.xpath('.//w:br[@w:type="page"]')]
+    texts = [_ for _ in pars if _]
+    assert texts == ['First paragraph.','Chapter one.','Chapter two.',
+        'Chapter three.','Chapter one.','Last paragraph.']
+    # \include is on pages of its own
+    assert len(breaks) == 2
+    assert pars.index('Chapter two.') > breaks[0]
+    assert pars.index('Chapter three.') < breaks[1] < pars.index('Last paragraph.')
+
+def test_graph_tokenizes_once(tmp_path) :
+    d = str(tmp_path)
+    write_project(d)
+    source = WorktreeSource(d)
+    root = [('input','chapters/one'),('include','two'),('input','chapters/one.tex')]
+
+    def load() :
+        graph = IncludeGraph(source,workers=2)
+        graph.load(sorted(set(graph.resolve(*_) for _ in root)))
+        return graph
+
+    graph = load()
+    assert graph.tokenized == 3
+    assert graph.edges['two.tex'] == ['three.tex']
+    assert graph.edges['three.tex'] == ['two.tex']
+    assert set(graph.hashes) == {os.path.join('chapters','one.tex'),'two.tex',
+        'three.tex'}
+
+    # only the chapter that changed is tokenized again
+    with open(os.path.join(d,'three.tex'),'a') as f :
+        f.write('More of chapter three.\n')
+    graph = load()
+    assert graph.tokenized == 1
+    toks = graph.tokens['three.tex']
+    assert [_.value for _ in toks if _.type == 'WORD'][-1] == 'three.'
+
+def test_tokenize_in_process(tmp_path,monkeypatch) :
+    d = str(tmp_path)
+    write_project(d)
+    root = [('input','chapters/one'),('include','two')]
+
+    def no_pool(*args,**kwargs) :
+        raise AssertionError('started a process pool')
+    monkeypatch.setattr(concurrent.futures,'ProcessPoolExecutor',no_pool)
+    # small files are tokenized here even if workers are asked for
+    graph = IncludeGraph(WorktreeSource(d),workers=4)
+    graph.load([graph.resolve(*_) for _ in root])
+    assert graph.tokenized == 3
+
+    # a pool of the caller is used when there is one
+    monkeypatch.setattr(includes,'_tokens',OrderedDict())
+    monkeypatch.setattr(includes.cache,'load_pickle',lambda *args: None)
+    mapped = []
+    class Executor(ThreadPoolExecutor) :
+        def map(self,fn,*iterables) :
+            mapped.append(fn)
+            return super(Executor,self).map(fn,*iterables)
+    with Executor(2) as executor :
+        graph = IncludeGraph(WorktreeSource(d),executor=executor)
+        graph.load([graph.resolve(*_) for _ in root])
+    assert graph.tokenized == 3 and mapped
+
+def test_tokenize_diagnostics(tmp_path,monkeypatch) :
+    import overleaf2word
+    d = str(tmp_path)
+    write_project(d)
+    root = [('input','chapters/one'),('include','two')]
+    # a tokenizer that finds a problem in every file
+    tokenize = overleaf2word.tokenize
+    def bad_tokenize(text,tokenizer=None,diagnostics=None) :
+        diagnostics.add('lexer_error',None,1,text.split()[0])
+        return tokenize(text,tokenizer,diagnostics)
+    monkeypatch.setattr(overleaf2word,'tokenize',bad_tokenize)
+    monkeypatch.setattr(includes.cache,'load_pickle',lambda *args: None)
+
+    for executor in (None,ThreadPoolExecutor(2)) :
+        monkeypatch.setattr(includes,'_tokens',OrderedDict())
+        diag = Diagnostics('main.tex',QUIET)
+        graph = IncludeGraph(WorktreeSource(d),diagnostics=diag,
+            executor=executor)
+        graph.load([graph.resolve(*_) for _ in root])
+        if executor is not None :
+            executor.shutdown()
+        assert diag.source == 'main.tex'
+        entry, = diag.as_dict()['diagnostics']
+        assert entry['count'] == 3
+        assert sorted(_['file'] for _ in entry['samples']) == [
+            os.path.join('chapters','one.tex'),'three.tex','two.tex']
+
+def test_manifest_follows_includes(tmp_path) :
+    d = str(tmp_path)
+    tex_fn = write_project(d)
+    manifest = Manifest(d)
+    assert tex_to_word(tex_fn,d,manifest=manifest)
+    assert set(manifest.entries['main.tex']) == {'main.tex',
+        os.path.join('chapters','one.tex'),'two.tex','three.tex'}
+    assert not tex_to_word(tex_fn,d,manifest=manifest)
+
+    with open(os.path.join(d,'chapters','one.tex'),'a') as f :
+        f.write('More of chapter one.\n')
+    assert tex_to_word(tex_fn,d,manifest=manifest)
+
+def test_includes_outside_project(tmp_path) :
+    secret = str(tmp_path/'secret.txt')
+    with open(secret,'w') as f :
+        f.write('Secret text.\n')
+    d = str(tmp_path/'project')
+    os.makedirs(d)
+    tex_fn = write_project(d,{'main.tex':'\\input{%s}\n\\input{../secret.txt}\n'
+        '\\input{chapters/../../secret.txt}\nVisible.\n\n' % secret})
+
+    diag = Diagnostics(tex_fn,verbosity=QUIET)
+    manifest = Manifest(d)
+    assert tex_to_word(tex_fn,d,manifest=manifest,diagnostics=diag)
+    doc = docx.Document(os.path.join(d,'main.docx'))
+    assert [p.text.strip() for p in doc.paragraphs if p.text.strip()] == ['Visible.']
+    assert diag.counts() == {'missing_include':3}
+    assert set(manifest.entries['main.tex']) == {'main.tex'}
+
+    source = WorktreeSource(d)
+    for fn in (secret,'../secret.txt') :
+        with pytest.raises(IOError) :
+            source.read(fn)
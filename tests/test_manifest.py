@@ -0,0 +1,57 @@
+import os
+
+from conftest import SAMPLE_TEX
+import diagnostics
+from diagnostics import Diagnostics
+from manifest import Manifest, input_hashes
+from overleaf2word import tex_to_word
+from batch import run_sources, OK, SKIPPED
+
+def write(path,content) :
+    with open(path,'w') as f :
+        f.write(content)
+
+def test_input_hashes(tmp_path) :
+    d = str(tmp_path)
+    write(os.path.join(d,'main.tex'),'\\includegraphics[width=3in]{fig.png}\n')
+    write(os.path.join(d,'refs.bib'),'')
+    hashes = input_hashes(os.path.join(d,'main.tex'),d,os.path.join(d,'refs.bib'))
+    assert sorted(hashes) == ['fig.png','main.tex','refs.bib']
+    assert hashes['fig.png'] is None
+
+def test_skip_unchanged(tmp_path,capsys) :
+    d = str(tmp_path)
+    tex_fn = os.path.join(d,'main.tex')
+    write(tex_fn,SAMPLE_TEX)
+    manifest = Manifest(d)
+    assert tex_to_word(tex_fn,d,manifest=manifest)
+    manifest.save()
+    capsys.readouterr()
+
+    manifest = Manifest(d)
+    assert not tex_to_word(tex_fn,d,manifest=manifest)
+    # only said when verbose
+    assert capsys.readouterr().out == ''
+    assert not tex_to_word(tex_fn,d,manifest=manifest,
+        diagnostics=Diagnostics(tex_fn,diagnostics.VERBOSE))
+    assert capsys.readouterr().out == 'unchanged, skipping {}\n'.format(tex_fn)
+
+    # touching the file without changing it is not a change
+    write(tex_fn,SAMPLE_TEX)
+    assert not tex_to_word(tex_fn,d,manifest=manifest)
+
+    write(tex_fn,SAMPLE_TEX+'\nmore\n')
+    assert tex_to_word(tex_fn,d,manifest=manifest)
+
+    # a missing docx is rebuilt too
+    manifest.save()
+    os.remove(os.path.join(d,'main.docx'))
+    assert tex_to_word(tex_fn,d,manifest=Manifest(d))
+
+def test_batch_skips_unchanged(repo_dir,project) :
+    sources = [{'git_clone_url':project,'name':'p','latex_paths':['main.tex']}]
+    for jobs in (1,2) :
+        for expected in (OK,SKIPPED) :
+            results = run_sources(sources,jobs=jobs)
+            assert results[-1].status == expected
+        os.remove(os.path.join(repo_dir,'p','main.docx'))
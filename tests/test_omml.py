@@ -0,0 +1,103 @@
+import os
+import zipfile
+
+from lxml import etree
+import pytest
+
+import omml
+from omml import FormulaCache, convert
+from overleaf2word import tex_to_word
+
+M = '{{{}}}'.format(omml.M_NS)
+
+def parse(tex) :
+    formula = convert(tex)
+    assert formula.error is None
+    return etree.fromstring(omml.inline_xml(formula.xml))
+
+def texts(elem) :
+    return ''.join(elem.itertext())
+
+def test_convert() :
+    f, = parse(r'\frac{a+1}{b}')
+    assert f.tag == M+'f'
+    assert texts(f.find(M+'num')) == 'a+1' and texts(f.find(M+'den')) == 'b'
+
+    # the operand of a sum goes up to the next relation
+    nary, rest = parse(r'\sum_{i=1}^{n} x_i^2 = y')
+    assert nary.find('.//'+M+'chr').get(M+'val') == '∑'
+    assert texts(nary.find(M+'sub')) == 'i=1'
+    assert texts(nary.find(M+'e')) == 'xi2'
+    assert texts(rest) == '=y'
+
+    d, = parse(r'\left( \begin{matrix} a & b \\ c & d \end{matrix} \right]')
+    assert d.find('.//'+M+'begChr').get(M+'val') == '('
+    assert d.find('.//'+M+'endChr').get(M+'val') == ']'
+    assert [texts(_) for _ in d.iter(M+'mr')] == ['ab','cd']
+
+    root = parse(r'\sqrt[3]{\alpha} \mathbb{R} \text{if } \lim_{x \to 0} \sin x')
+    assert [_.tag for _ in root] == [M+'rad',M+'r',M+'r',M+'func']
+    assert texts(root[0]) == '3α' and root[1].find('.//'+M+'scr') is not None
+    assert texts(root[2]) == 'if ' and root[2].find('.//'+M+'nor') is not None
+    assert root[3].find('.//'+M+'limLow') is not None
+
+    # rows of an aligned environment
+    arr, = parse('a &= b \\\\\n c &= d')
+    assert [texts(_) for _ in arr] == ['a=b','c=d']
+
+def test_unknown_and_errors() :
+    formula = convert(r'x \weird y')
+    assert formula.unknown == ('weird',) and '\\weird' in formula.xml
+    for tex in (r'\frac{a}{',r'x}',r'\left( x',r'\begin{matrix} a \end{cases}') :
+        formula = convert(tex)
+        assert formula.xml is None and formula.error
+
+def test_formula_cache() :
+    formulas = FormulaCache(size=2)
+    first = formulas.get('x^2')
+    # the key is the latex with its white space normalized
+    assert formulas.get(' x^2\n') is first
+    formulas.get('y')
+    formulas.get('z')
+    assert len(formulas) == 2 and (formulas.hits,formulas.misses) == (1,3)
+    assert formulas.get('x^2') is not first
+
+    formulas = FormulaCache(persist=True)
+    formulas.get(r'\alpha')
+    formulas.save()
+    loaded = FormulaCache(persist=True)
+    assert loaded.get(r'\alpha') == formulas.get(r'\alpha')
+    assert loaded.misses == 0
+
+TEX = r'''\begin{document}
+Pythagoras says $a^2+b^2=c^2$ and $x$, so
+\begin{equation}\label{eq:1}
+E = mc^2 \sum_{i} \frac{1}{i}
+\end{equation}
+and also \[ \int_0^1 f(x)\,dx \] in the end.
+
+\end{document}
+'''
+
+@pytest.mark.parametrize('writer',['docx','ooxml'])
+@pytest.mark.parametrize('tokenizer',['ply','scan'])
+@pytest.mark.parametrize('render_cache',[True,False])
+def test_equations_in_document(tmp_path,writer,tokenizer,render_cache) :
+    d = str(tmp_path)
+    tex_fn = os.path.join(d,'main.tex')
+    with open(tex_fn,'w') as f :
+        f.write(TEX)
+    tex_to_word(tex_fn,d,writer=writer,tokenizer=tokenizer,
+        render_cache=render_cache)
+    with zipfile.ZipFile(os.path.join(d,'main.docx')) as zf :
+        body = etree.fromstring(zf.read('word/document.xml'))[0]
+    W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+    pars = [(texts(_),[c.tag for c in _]) for _ in body.iter(W+'p')]
+    assert pars == [
+        ('Pythagoras says a2+b2=c2 and x, so ',
+         [W+'r',M+'oMath',W+'r',M+'oMath',W+'r']),
+        ('E=mc2i1i',[M+'oMathPara']),
+        ('and also ',[W+'r']),
+        ('01f(x)\u2009dx',[M+'oMathPara']),
+        ('in the end. ',[W+'r']),
+    ]
@@ -0,0 +1,183 @@
+import io
+import os
+import zipfile
+
+import docx
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.text.run import Run
+from lxml import etree
+from PIL import Image
+import pytest
+
+from conftest import SAMPLE_TEX, SAMPLE_BIB
+from ooxml import run_xml, _run_xml_slow
+from overleaf2word import tex_to_word
+
+TEX = SAMPLE_TEX.replace(r'\end{document}',r'''\title{A title}
+\subsection{Lists}
+\begin{itemize}
+\item one
+\begin{enumerate}
+\item nested & <escaped> "quoted"
+\end{enumerate}
+\end{itemize}
+Text \textit{it} and \textbf{bold} words, 50\% \$ \newline more \\ words
+\includegraphics{a.png}
+\includegraphics[width=2in]{b.png}
+\includegraphics{c.jpg}
+\clearpage
+\bibliography{refs}
+\end{document}''')
+
+def image_bytes(size,fmt,color) :
+    buf = io.BytesIO()
+    Image.new('RGB',size,color).save(buf,format=fmt)
+    return buf.getvalue()
+
+def dump(fn) :
+    doc = docx.Document(fn)
+    pars = [(p.style.name,[(r.text,r.style.name,r.bold,r.italic) for r in p.runs],
+             bool(p._p.xpath('.//w:br[@w:type="page"]')))
+            for p in doc.paragraphs]
+    shapes = [(_.width,_.height) for _ in doc.inline_shapes]
+    media = sorted(_.blob for _ in doc.part.package.parts
+                   if _.partname.startswith('/word/media/'))
+    return pars, shapes, media
+
+def write_project(d) :
+    files = {'main.tex':TEX,'refs.bib':SAMPLE_BIB,
+        'a.png':image_bytes((200,100),'PNG','blue'),
+        'b.png':image_bytes((200,100),'PNG','blue'),
+        'c.jpg':image_bytes((50,80),'JPEG','red'),
+    }
+    for fn, content in files.items() :
+        with open(os.path.join(d,fn),'wb' if isinstance(content,bytes) else 'w') as f :
+            f.write(content)
+
+def test_writers_equivalent(tmp_path) :
+    d = str(tmp_path)
+    write_project(d)
+    tex_fn = os.path.join(d,'main.tex')
+    bib_fn = os.path.join(d,'refs.bib')
+
+    docs = {}
+    for writer in ('docx','ooxml') :
+        doc_fn = os.path.join(d,'{}.docx'.format(writer))
+        tex_to_word(tex_fn,d,bib_fn,doc_fn=doc_fn,writer=writer)
+        docs[writer] = dump(doc_fn)
+
+    pars, shapes, media = docs['docx']
+    styles = set(_[0] for _ in pars)
+    assert {'Title','Heading 1','Heading 2','List Bullet','List Number 2'} <= styles
+    assert any(_[2] for _ in pars)
+    assert len(shapes) == 3 and len(media) == 2
+    assert docs['ooxml'] == docs['docx']
+
+    # nothing is left behind next to the doc
+    assert not [_ for _ in os.listdir(d) if _.endswith('.tmp')]
+    with zipfile.ZipFile(os.path.join(d,'ooxml.docx')) as zf :
+        assert zf.testzip() is None
+
+def test_unsaved_stream_removed(tmp_path) :
+    from ooxml import StreamingDocxWriter
+    doc_fn = str(tmp_path/'main.docx')
+    writer = StreamingDocxWriter(doc_fn)
+    writer.paragraph([('some text ',None,None)])
+    writer.close()
+    assert os.listdir(str(tmp_path)) == []
+
+def test_run_xml_other_props() :
+    # props run_xml doesn't know are set the way python-docx sets them
+    props = {'bold':True,'underline':True,'italic':False}
+    p = parse_xml('<w:p {}/>'.format(nsdecls('w')))
+    run = Run(p.add_r(),None)
+    run.text = 'some text '
+    for k,v in props.items() :
+        setattr(run,k,v)
+    expected = etree.tostring(p[0],encoding='unicode')
+    assert _run_xml_slow('some text ',None,props) == expected
+    assert '<w:b/>' in run_xml('bold',None,{'bold':True})
+
+def house_style(fn,header) :
+    from docx.shared import Pt
+    doc = docx.Document()
+    doc.styles['Heading 1'].font.size = Pt(30)
+    doc.sections[0].header.paragraphs[0].text = header
+    doc.save(fn)
+
+def test_house_template(tmp_path) :
+    from docx.shared import Pt
+    from manifest import Manifest
+    from ooxml import load_template
+    d = str(tmp_path)
+    house = os.path.join(d,'house.docx')
+    house_style(house,'House header')
+    tex_fn = os.path.join(d,'main.tex')
+    with open(tex_fn,'w') as f :
+        f.write(TEX.replace(r'\includegraphics','').replace(r'\bibliography{refs}',''))
+
+    docs = {}
+    for writer in ('docx','ooxml') :
+        doc_fn = os.path.join(d,'{}.docx'.format(writer))
+        tex_to_word(tex_fn,d,doc_fn=doc_fn,writer=writer,template=house)
+        doc = docx.Document(doc_fn)
+        assert doc.sections[0].header.paragraphs[0].text == 'House header'
+        assert doc.styles['Heading 1'].font.size == Pt(30)
+        docs[writer] = dump(doc_fn)
+    assert docs['ooxml'] == docs['docx']
+
+    # parsed once, and the documents made from it are copies
+    tmpl = load_template(house)
+    assert load_template(house) is tmpl
+    assert tmpl.doc.paragraphs == []
+    assert load_template() is not tmpl
+
+    # a changed template is read again and converts the file again
+    manifest = Manifest(d)
+    assert tex_to_word(tex_fn,d,manifest=manifest,template=house)
+    assert not tex_to_word(tex_fn,d,manifest=manifest,template=house)
+    house_style(house,'A new house header')
+    assert load_template(house) is not tmpl
+    assert tex_to_word(tex_fn,d,manifest=manifest,template=house)
+    doc = docx.Document(os.path.join(d,'main.docx'))
+    assert doc.sections[0].header.paragraphs[0].text == 'A new house header'
+
+@pytest.mark.parametrize('writer',['docx','ooxml'])
+def test_reproducible_output(tmp_path,writer,capsys) :
+    import diagnostics
+    from ooxml import ZIP_DATE
+    from profiling import Profile
+    d = str(tmp_path)
+    write_project(d)
+    tex_fn = os.path.join(d,'main.tex')
+    bib_fn = os.path.join(d,'refs.bib')
+    doc_fn = os.path.join(d,'main.docx')
+
+    def convert(**kwargs) :
+        prof = Profile()
+        tex_to_word(tex_fn,d,bib_fn,profile=prof,writer=writer,**kwargs)
+        with open(doc_fn,'rb') as f :
+            return f.read(), os.stat(doc_fn), prof.counts
+    data, st, counts = convert()
+    assert counts['docs_written'] == 1
+    with zipfile.ZipFile(io.BytesIO(data)) as zf :
+        assert {_.date_time for _ in zf.infolist()} == {ZIP_DATE}
+
+    # the same bytes, rendered again or from the render cache, leave the
+    # file alone
+    for render_cache in (False,True) :
+        again, st_again, counts = convert(render_cache=render_cache)
+        assert again == data
+        assert counts == dict(counts,docs_unchanged=1)
+        assert (st_again.st_ino,st_again.st_mtime_ns) == (st.st_ino,st.st_mtime_ns)
+    # and say so only when verbose
+    assert 'not written' not in capsys.readouterr().out
+    convert(diagnostics=diagnostics.Diagnostics(tex_fn,diagnostics.VERBOSE))
+    assert 'output unchanged, not written '+doc_fn in capsys.readouterr().out
+
+    with open(tex_fn,'a') as f :
+        f.write('\nA new paragraph.\n\n')
+    changed, _, counts = convert()
+    assert changed != data and counts['docs_written'] == 1
+    assert not [_ for _ in os.listdir(d) if _.endswith('.tmp')]
@@ -1,5 +1,4 @@
-from tex2word import tex_to_word, Text, Command, Comment
-from pprint import pprint
+from tex2word import tex_to_word, Text, Newline, Command, Comment
 
 def test_cmds() :
     assert tex_to_word(r'\cmd') == [Command(r'\cmd',None,None,None)]
@@ -19,7 +18,15 @@ def test_tabular() :
     1 & 2 & 3 \\ \hline
     \end{tabular}
     '''
-    res = tex_to_word(tex)
-    pprint(res)
-    assert False
+    hline = Command(r'\hline',None,None,None)
+    expected = [
+        Command(r'\begin',[Text('tabular')],[Text('l|l|l')],None),Newline(),
+        Text('a'),Text('&'),Command(r'\textbf',[Text('b')],None,None),
+        Text('&'),Text('c'),Newline(),hline,Newline(),
+        Text('1'),Text('&'),Text('2'),Text('&'),Text('3'),Newline(),
+        hline,Newline(),
+        Command(r'\end',[Text('tabular')],None,None),
+    ]
+    for engine in ('yacc','iterative') :
+        assert tex_to_word(tex,engine) == expected, engine
 
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import docx
+from lxml import etree
+
+sys.path.insert(0,os.path.join(os.path.dirname(__file__),'..','benchmarks'))
+import bench_paragraph
+from overleaf2word import (Text, Word, WordBuffer, add_paragraph, add_runs,
+    coalesce, tokenize)
+
+BOLD = {'bold':True}
+
+def test_coalesce() :
+    words = [Word(text='a'),Word(text='b'),
+        Text(text='c',type='textbf',style=None,props=BOLD),
+        Text(text='d',type='textbf',style=None,props=BOLD),
+        # same type, different props make a new run
+        Text(text='e',type='textbf',style=None,props={'bold':False}),
+        Word(text='\n'),Word(text='f'),
+    ]
+    assert coalesce(words) == [
+        ('a b ',None,None),
+        ('c d ',None,BOLD),
+        ('e ',None,{'bold':False}),
+        ('\n f ',None,None),
+    ]
+    assert coalesce([]) == []
+
+def test_word_buffer() :
+    tex = 'a 50\\% b\\$ c\n d'
+    for tokenizer in ('ply','scan') :
+        toks = [_ for _ in tokenize(tex,tokenizer) if _.type == 'WORD']
+        words = WordBuffer()
+        for tok in toks[:2] :
+            words.add_token(tok)
+        words.add(Text(text='c',type='textbf',style=None,props=BOLD))
+        words.add(Text(text='d',type='textbf',style=None,props=BOLD))
+        words.add(Word(text='\n'))
+        for tok in toks[2:] :
+            words.add_token(tok)
+        assert len(words) == 8
+        assert words.runs() == coalesce([
+            Word(text='a'),Word(text='50%'),
+            Text(text='c',type='textbf',style=None,props=BOLD),
+            Text(text='d',type='textbf',style=None,props=BOLD),
+            Word(text='\n'),Word(text='b$'),Word(text='c'),Word(text='d'),
+        ])
+        # escapes are only replaced in the text of tokens
+        assert WordBuffer([Word(text='50\\%')]).runs() == [('50\\% ',None,None)]
+    assert WordBuffer().runs() == []
+
+def test_add_runs_matches_python_docx() :
+    runs = [
+        ('plain text ',None,None),
+        (' leading space & <escapes> ',None,BOLD),
+        ('tab\there\nnew\rline ',None,{'italic':True,'bold':False}),
+        ('styled ','Body Text Char',{'italic':None}),
+        ('underlined ',None,{'underline':True,'bold':True}),
+    ]
+    doc = docx.Document()
+    expected = doc.add_paragraph()
+    for text,style,props in runs :
+        r = expected.add_run(text,style)
+        for k,v in (props or {}).items() :
+            setattr(r,k,v)
+    par = doc.add_paragraph()
+    add_runs(par,runs)
+    assert etree.tostring(par._p) == etree.tostring(expected._p)
+
+def test_add_paragraph_large() :
+    words = bench_paragraph.make_words(5000)
+    doc = docx.Document()
+    add_paragraph(doc,words)
+    par, = doc.paragraphs
+    assert len(par.runs) == len(coalesce(words))
+    assert par.runs[1].text == 'bold9 '
+    assert par.runs[1].bold
+    # add_paragraph leaves the words alone
+    assert len(words) == 5000
+
+def test_bench_paragraph() :
+    results = bench_paragraph.run([100,1000],repeat=1)
+    assert [_['words'] for _ in results['results']] == [100,1000]
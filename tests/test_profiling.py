@@ -0,0 +1,43 @@
+import json
+import os
+
+from conftest import SAMPLE_TEX
+from batch import run_sources, profile_report
+from overleaf2word import tex_to_word
+import profiling
+
+def test_profile_stages(tmp_path) :
+    d = str(tmp_path)
+    tex_fn = os.path.join(d,'main.tex')
+    with open(tex_fn,'w') as f :
+        f.write(SAMPLE_TEX)
+    prof = profiling.Profile(file='main.tex',cprofile_dir=os.path.join(d,'prof'))
+    tex_to_word(tex_fn,d,profile=prof)
+    report = prof.as_dict()
+    assert {'read','tokenize','paragraphs','save'} <= set(report['stages'])
+    assert report['total'] >= sum(report['stages'].values())
+    assert os.path.exists(report['cprofile'])
+
+def test_hooks(tmp_path,repo_dir,project) :
+    reports = []
+    hook = profiling.register_hook(reports.append)
+    try :
+        d = str(tmp_path)
+        tex_fn = os.path.join(d,'main.tex')
+        with open(tex_fn,'w') as f :
+            f.write(SAMPLE_TEX)
+        tex_to_word(tex_fn,d)
+        assert len(reports) == 1 and reports[0]['file'] == tex_fn
+
+        results = run_sources([{'git_clone_url':project,'name':'p',
+                                'latex_paths':['main.tex']}],jobs=2)
+    finally :
+        profiling.unregister_hook(hook)
+    assert [(_['repo'],_['file']) for _ in reports[1:]] == [('p',None),('p','main.tex')]
+    assert 'sync' in reports[1]['stages']
+
+    report = json.loads(json.dumps(profile_report(results)))
+    repo, = report['repos']
+    assert repo['sync']['stages']['sync'] > 0
+    assert repo['files'][0]['file'] == 'main.tex'
+    assert 'save' in report['stages']
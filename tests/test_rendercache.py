@@ -0,0 +1,65 @@
+import os
+
+import docx
+
+from conftest import SAMPLE_BIB
+import diagnostics
+from diagnostics import Diagnostics
+from overleaf2word import tex_to_word
+import profiling
+
+PARAGRAPHS = ['Paragraph {} with \\textbf{{bold}} and \\textit{{italic}} words.'
+              .format(i) for i in range(10)]
+PARAGRAPHS[3] = 'A citation \\cite{Cesar2013} in here.'
+
+def write(d,paragraphs,bib=SAMPLE_BIB) :
+    tex_fn = os.path.join(d,'main.tex')
+    with open(tex_fn,'w') as f :
+        f.write('\\begin{document}\n')
+        f.write('\n\n'.join(paragraphs))
+        f.write('\n\n\\end{document}\n')
+    with open(os.path.join(d,'refs.bib'),'w') as f :
+        f.write(bib)
+    return tex_fn
+
+def convert(d,tex_fn,**kwargs) :
+    prof = profiling.Profile()
+    tex_to_word(tex_fn,d,os.path.join(d,'refs.bib'),profile=prof,**kwargs)
+    doc = docx.Document(os.path.join(d,'main.docx'))
+    pars = [[(r.text,r.bold,r.italic) for r in p.runs] for p in doc.paragraphs]
+    # only the counts of the render cache, the profile counts other things too
+    counts = {_:prof.counts.get(_,0)
+              for _ in ('paragraphs_reused','paragraphs_rendered')}
+    return counts, pars
+
+def test_render_cache(tmp_path) :
+    d = str(tmp_path)
+    tex_fn = write(d,PARAGRAPHS)
+    counts, _ = convert(d,tex_fn)
+    # and the References entry
+    assert counts == {'paragraphs_reused':0,'paragraphs_rendered':11}
+
+    # one sentence edited
+    paragraphs = list(PARAGRAPHS)
+    paragraphs[5] = 'An edited \\textbf{paragraph}.'
+    tex_fn = write(d,paragraphs)
+    counts, pars = convert(d,tex_fn)
+    assert counts == {'paragraphs_reused':10,'paragraphs_rendered':1}
+    _, expected = convert(d,tex_fn,render_cache=False)
+    assert pars == expected
+
+    # the paragraph citing a changed bib entry and its reference are rendered
+    # again
+    tex_fn = write(d,paragraphs,SAMPLE_BIB.replace('{2013}','{2014}'))
+    counts, pars = convert(d,tex_fn,writer='ooxml')
+    assert counts == {'paragraphs_reused':9,'paragraphs_rendered':2}
+    assert '(César 2014)' in ''.join(_[0] for _ in pars[3])
+
+def test_counts_printed_when_verbose(tmp_path,capsys) :
+    d = str(tmp_path)
+    tex_fn = write(d,PARAGRAPHS)
+    tex_to_word(tex_fn,d,os.path.join(d,'refs.bib'))
+    assert 'rendered' not in capsys.readouterr().out
+    tex_to_word(tex_fn,d,os.path.join(d,'refs.bib'),
+        diagnostics=Diagnostics(tex_fn,diagnostics.VERBOSE))
+    assert 'rendered 0 paragraphs, reused 11' in capsys.readouterr().out
@@ -0,0 +1,189 @@
+import os
+import shutil
+import stat
+
+from git import Repo
+import pytest
+
+from batch import run_sources, OK, FAILED
+from conftest import SAMPLE_TEX, push_change
+import overleaf2word
+import sync
+from sync import GitError, GitTimeout, SyncEngine, remote_head, remote_host, sync_repo
+
+def test_sync_repo(tmp_path,bare_remote) :
+    url, work = bare_remote
+    repo_dir = str(tmp_path/'clone')
+    head = remote_head(url)
+    assert head == work.head.commit.hexsha
+
+    res = sync_repo(url,repo_dir)
+    assert res.changed and res.commit == head
+    assert os.path.exists(os.path.join(repo_dir,'.git','shallow'))
+
+    # remote has not moved since the last conversion, nothing to do
+    assert not sync_repo(url,repo_dir,last_commit=head).changed
+
+    new_head = push_change(work,'main.tex',SAMPLE_TEX+'\nnew text\n')
+    res = sync_repo(url,repo_dir,last_commit=head)
+    assert res.changed and res.commit == new_head
+    with open(os.path.join(repo_dir,'main.tex')) as f :
+        assert 'new text' in f.read()
+    assert len(list(Repo(repo_dir).iter_commits())) == 1
+
+def test_overleaf2word_noop(repo_dir,bare_remote,monkeypatch) :
+    url, work = bare_remote
+    overleaf2word.overleaf2word(url,'p',['main.tex'])
+    doc_fn = os.path.join(repo_dir,'p','main.docx')
+    assert os.path.exists(doc_fn)
+
+    def fail(*args,**kwargs) :
+        raise AssertionError('should not get here')
+    with monkeypatch.context() as m :
+        m.setattr(overleaf2word,'tex_to_word',fail)
+        m.setattr(overleaf2word.sync,'update',fail)
+        overleaf2word.overleaf2word(url,'p',['main.tex'])
+
+    # a file that was never converted needs the full treatment
+    push_change(work,'other.tex',SAMPLE_TEX)
+    overleaf2word.overleaf2word(url,'p',['main.tex','other.tex'])
+    assert os.path.exists(os.path.join(repo_dir,'p','other.docx'))
+
+def test_remote_host() :
+    assert remote_host('https://git.overleaf.com/abc') == 'git.overleaf.com'
+    assert remote_host('https://user:pw@Git.Overleaf.com:443/abc') == 'git.overleaf.com'
+    assert remote_host('ssh://git@example.com/a.git') == 'example.com'
+    assert remote_host('git@example.com:a/b.git') == 'example.com'
+    assert remote_host('example.org:a.git') == 'example.org'
+    for local in ('file:///srv/a.git','/srv/a.git','./a:b','C:\\a\\b.git') :
+        assert remote_host(local) == ''
+
+def git_wrapper(tmp_path,delay=0,fail_once=False) :
+    '''Write a git executable that logs each command, sleeps *delay* seconds
+    first for remotes with "slow" in their path and fails the first command
+    if *fail_once*. Returns (path, log path).'''
+    log = tmp_path/'git.log'
+    script = ['#!/bin/sh','echo "start $*" >> {}'.format(log)]
+    if fail_once :
+        flag = tmp_path/'failed'
+        script.append('if [ ! -e {0} ]; then touch {0}; exit 1; fi'.format(flag))
+    script += [
+        'case "$*" in *slow*) sleep {} ;; esac'.format(delay),
+        '{} "$@"; rc=$?'.format(shutil.which('git')),
+        'echo "end $*" >> {}'.format(log),
+        'exit $rc',
+    ]
+    fn = tmp_path/'git'
+    fn.write_text('\n'.join(script)+'\n')
+    fn.chmod(fn.stat().st_mode|stat.S_IEXEC)
+    return str(fn), log
+
+def slow_remote(url) :
+    bare = url[len('file://'):]
+    slow = bare.replace('remote.git','slow.git')
+    shutil.copytree(bare,slow)
+    return 'file://'+slow
+
+def test_engine_sync(tmp_path,bare_remote) :
+    url, work = bare_remote
+    head = work.head.commit.hexsha
+    git, log = git_wrapper(tmp_path)
+    repo_dirs = [str(tmp_path/'clone{}'.format(i)) for i in range(4)]
+    with SyncEngine(concurrency=2,git=git) as engine :
+        results = [_.result() for _ in
+            [engine.submit(url,d) for d in repo_dirs]]
+    assert all(r.changed and r.commit == head for r in results)
+    assert os.path.exists(os.path.join(repo_dirs[0],'.git','shallow'))
+
+    # at most two git commands at a time, and more than one at once
+    running = most = 0
+    for line in log.read_text().splitlines() :
+        running += 1 if line.startswith('start') else -1
+        most = max(most,running)
+    assert most == 2
+
+    with SyncEngine() as engine :
+        assert not engine.submit(url,repo_dirs[0],head).result().changed
+        new_head = push_change(work,'main.tex',SAMPLE_TEX+'\nnew text\n')
+        res = engine.submit(url,repo_dirs[0],head).result()
+    assert res.changed and res.commit == new_head
+    with open(os.path.join(repo_dirs[0],'main.tex')) as f :
+        assert 'new text' in f.read()
+    assert len(list(Repo(repo_dirs[0]).iter_commits())) == 1
+
+def test_engine_timeout_and_retry(tmp_path,bare_remote) :
+    url, work = bare_remote
+    slow = slow_remote(url)
+    git, log = git_wrapper(tmp_path,delay=30)
+    with SyncEngine(timeout=1,retries=1,backoff=0.01,git=git) as engine :
+        slow_fut = engine.submit(slow,str(tmp_path/'slow'))
+        fast_fut = engine.submit(url,str(tmp_path/'fast'))
+        assert fast_fut.result().changed
+        with pytest.raises(GitTimeout) :
+            slow_fut.result()
+    # tried twice, killed each time
+    lines = log.read_text().splitlines()
+    assert len([_ for _ in lines if _.startswith('start ls-remote '+slow)]) == 2
+    assert not [_ for _ in lines if _.startswith('end ls-remote '+slow)]
+    assert not os.path.exists(str(tmp_path/'slow'))
+
+    with SyncEngine(retries=0,git=git) as engine :
+        with pytest.raises(GitError) :
+            engine.submit('file://'+str(tmp_path/'nope'),str(tmp_path/'nope')).result()
+
+    (tmp_path/'flaky_git').mkdir()
+    git, log = git_wrapper(tmp_path/'flaky_git',fail_once=True)
+    with SyncEngine(retries=1,backoff=0.01,git=git) as engine :
+        assert engine.submit(url,str(tmp_path/'flaky')).result().changed
+
+def test_engine_per_host(tmp_path) :
+    # a git that takes a while to find nothing at any remote
+    log = tmp_path/'git.log'
+    fn = tmp_path/'git'
+    fn.write_text('\n'.join(['#!/bin/sh',
+        'echo "start $2" >> {}'.format(log),'sleep 0.2',
+        'echo "end $2" >> {}'.format(log)])+'\n')
+    fn.chmod(fn.stat().st_mode|stat.S_IEXEC)
+    urls = ['https://{}.example.com/{}.git'.format(host,i)
+            for host in ('a','b') for i in range(4)]
+    local = [str(tmp_path/'local{}.git'.format(i)) for i in range(4)]
+
+    engine = SyncEngine(concurrency=8,git=str(fn))
+    assert engine.per_host == 2
+    for _ in range(2) :
+        # the engine can be started again after it was closed
+        log.write_text('')
+        with engine :
+            futs = [engine.run(engine.remote_head(_)) for _ in urls+local]
+            assert [_.result() for _ in futs] == [None]*len(futs)
+        assert engine._slots is None and engine._hosts == {}
+
+        running = {}
+        most = {}
+        for line in log.read_text().splitlines() :
+            what, url = line.split()
+            host = remote_host(url)
+            running[host] = running.get(host,0)+(1 if what == 'start' else -1)
+            most[host] = max(most.get(host,0),running[host])
+        # local remotes are not held to per_host
+        assert most == {'a.example.com':2,'b.example.com':2,'':4}
+
+def test_batch_converts_as_repos_sync(repo_dir,bare_remote,tmp_path,monkeypatch) :
+    url, work = bare_remote
+    slow = slow_remote(url)
+    git, log = git_wrapper(tmp_path,delay=2)
+    monkeypatch.setattr(sync,'GIT',git)
+    sources = [
+        {'git_clone_url':slow,'name':'slow','latex_paths':['main.tex']},
+        {'git_clone_url':url,'name':'fast','latex_paths':['main.tex']},
+    ]
+    results = run_sources(sources)
+    order = [(r.project,r.path) for r in results]
+    assert all(r.status == OK for r in results)
+    # the fast repo is converted while the slow one is still syncing
+    assert order.index(('fast','main.tex')) < order.index(('slow',None))
+
+    results = run_sources([dict(sources[0],name='slow2')],sync_timeout=0.5,
+        sync_retries=0)
+    assert [r.status for r in results] == [FAILED]
+    assert 'timed out' in results[0].error
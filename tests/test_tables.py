@@ -0,0 +1,134 @@
+import os
+
+import docx
+import pytest
+
+from conftest import SAMPLE_TEX
+from diagnostics import Diagnostics, QUIET
+from overleaf2word import tex_to_word
+import tabular
+from tabular import Cell, Row
+
+TABLE = r'''
+Before the table.
+
+\begin{tabular}{|l|c|r|}
+\hline
+Name & \textbf{Count} & Share \\ \hline
+apples \& co & 12 & 50\% \\
+pears % and more
+  & $x^2$ & \emph{few} \\
+\multicolumn{2}{c}{total} & 100\% \\ \hline
+\end{tabular} After.
+
+'''
+
+def test_parse_spec() :
+    assert tabular.parse_spec('l|c|r') == (['left','center','right'],
+        [False,True,True,False])
+    assert tabular.parse_spec('|*{3}{c}|') == (['center']*3,
+        [True,False,False,True])
+    assert tabular.parse_spec('@{}lp{3cm}X>{\\bfseries}r@{}') == (
+        ['left','left','left','right'],[False]*5)
+
+def test_parse() :
+    table = tabular.parse('tabular',r'''{ll|}
+    \toprule a & \textbf{b} \\ \midrule
+    \multicolumn{2}{r}{c \& d} \\[2pt]
+    e & f & g \\ \bottomrule''')
+    assert table.columns == ['left','left','left']
+    assert table.borders == [False,False,True,False]
+    assert table.rows == [
+        Row([Cell('a',1,None),Cell(r'\textbf{b}',1,None)],True,True),
+        Row([Cell(r'c \& d',2,'right')],True,False),
+        Row([Cell('e',1,None),Cell('f',1,None),Cell('g',1,None)],False,True),
+    ]
+    # the width of tabular* comes before the spec
+    table = tabular.parse('tabular*',r'{\textwidth}[t]{rr} 1 & 2')
+    assert table.columns == ['right','right']
+    assert table.rows == [Row([Cell('1',1,None),Cell('2',1,None)],False,False)]
+
+@pytest.mark.parametrize('writer',['docx','ooxml'])
+@pytest.mark.parametrize('tokenizer',['ply','scan'])
+def test_table_document(tmp_path,writer,tokenizer) :
+    d = str(tmp_path)
+    tex_fn = os.path.join(d,'main.tex')
+    with open(tex_fn,'w') as f :
+        f.write(SAMPLE_TEX.replace(r'\end{document}',TABLE+r'\end{document}'))
+    doc_fn = os.path.join(d,'main.docx')
+    diag = Diagnostics(tex_fn,verbosity=QUIET)
+    tex_to_word(tex_fn,d,doc_fn=doc_fn,writer=writer,tokenizer=tokenizer,
+        diagnostics=diag)
+    problems = [(_['kind'],_['name']) for _ in diag.as_dict()['diagnostics']]
+    for name in ('begin','end','hline','multicolumn','emph') :
+        assert ('unrecognized_command',name) not in problems
+
+    doc = docx.Document(doc_fn)
+    assert len(doc.tables) == 1
+    table = doc.tables[0]
+    assert len(table.columns) == 3
+    assert [[c.text for c in row.cells] for row in table.rows] == [
+        ['Name','Count','Share'],
+        ['apples & co','12','50%'],
+        # the equation is math, not text
+        ['pears','','few'],
+        ['total','total','100%'],
+    ]
+    head = table.rows[0].cells
+    assert not head[0].paragraphs[0].runs[0].bold
+    assert head[1].paragraphs[0].runs[0].bold
+    assert table.rows[2].cells[2].paragraphs[0].runs[0].italic
+    assert head[1].paragraphs[0].alignment == 1
+    assert head[2].paragraphs[0].alignment == 2
+    # the equation is native Word math
+    assert table.rows[2].cells[1]._tc.xpath('.//m:oMath')
+    # \hline above the first row but not the third, a border on the left
+    # edge of each row
+    borders = head[0]._tc.xpath('./w:tcPr/w:tcBorders/*')
+    assert {_.tag.split('}')[1] for _ in borders} >= {'top','left'}
+    assert not table.rows[2].cells[0]._tc.xpath('./w:tcPr/w:tcBorders/w:top')
+
+    # the table is in between the paragraphs around it
+    body = [_.xpath('string(.)').strip() if _.tag.endswith('}p') else 'TABLE'
+            for _ in doc.element.body if not _.tag.endswith('}sectPr')]
+    assert body[-3:] == ['Before the table.','TABLE','After.']
+
+# the table of test_overleaf2word.test_tabular, and one with merged cells
+TABULAR = r'''\begin{document}
+\begin{tabular}{l|l|l}
+a & \textbf{b} & c \\ \hline
+1 & 2 & 3 \\ \hline
+\multicolumn{2}{r}{merged} & 4 \\
+\multicolumn{3}{c}{all} \\
+\end{tabular}
+
+\end{document}
+'''
+
+@pytest.mark.parametrize('writer',['docx','ooxml'])
+def test_tabular_docx(tmp_path,writer) :
+    d = str(tmp_path)
+    tex_fn = os.path.join(d,'main.tex')
+    with open(tex_fn,'w') as f :
+        f.write(TABULAR)
+    tex_to_word(tex_fn,d,writer=writer)
+
+    table, = docx.Document(os.path.join(d,'main.docx')).tables
+    assert (len(table.rows),len(table.columns)) == (4,3)
+    # python-docx repeats a merged cell for each column it covers
+    assert [[c.text for c in row.cells] for row in table.rows] == [
+        ['a','b','c'],['1','2','3'],['merged','merged','4'],['all','all','all']]
+    assert [len(row._tr.tc_lst) for row in table.rows] == [3,3,2,1]
+    assert table.rows[2].cells[0]._tc.grid_span == 2
+    assert table.rows[3].cells[0]._tc.grid_span == 3
+    assert table.rows[2].cells[0].paragraphs[0].alignment == 2
+    assert table.rows[3].cells[0].paragraphs[0].alignment == 1
+    assert [r.bold for r in table.rows[0].cells[1].paragraphs[0].runs] == [True]
+    # \hline under the first two rows, | between the columns
+    tcs = [row._tr.tc_lst for row in table.rows]
+    def sides(tc) :
+        return {_.tag.split('}')[1] for _ in tc.xpath('./w:tcPr/w:tcBorders/*')}
+    assert sides(tcs[0][0]) == {'bottom','right'}
+    assert sides(tcs[1][1]) == {'top','bottom','left','right'}
+    assert sides(tcs[2][1]) == {'top','left'}
+    assert sides(tcs[3][0]) == set()
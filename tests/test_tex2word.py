@@ -0,0 +1,68 @@
+import contextlib
+import io
+import os
+import pickle
+import random
+import sys
+
+sys.path.insert(0,os.path.join(os.path.dirname(__file__),'..','benchmarks'))
+import bench_parser
+from tex2word import tex_to_word, Text
+
+def parse_both(tex) :
+    '''Return the output and printed errors of both engines'''
+    res = []
+    for engine in ('yacc','iterative') :
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out) :
+            res.append((tex_to_word(tex,engine),out.getvalue()))
+    return res
+
+def test_engines_agree() :
+    cases = [
+        r'\cmd{arg1}[opt]{arg2} after',
+        '\\a{b}[c] d %x\ne',
+        r'\a{\b{c} d}[e \f] g \\ h',
+        # syntax errors start over after the bad token
+        r'a } b',
+        r'\cmd{} x y',
+        r'a b \cmd[x] c d',
+        r'a b c }',
+    ]
+    alphabet = ['a','b','\\c','{','}','[',']',',','\n','%x\n','\\\\','\\%']
+    rnd = random.Random(0)
+    for _ in range(2000) :
+        cases.append(' '.join(rnd.choice(alphabet)
+                              for _ in range(rnd.randint(0,12))))
+    for tex in cases :
+        yacc, iterative = parse_both(tex)
+        assert iterative == yacc, tex
+
+def test_large() :
+    tex = ' '.join(['word']*100000)
+    assert tex_to_word(tex) == [Text('word')]*100000
+
+def test_deeply_nested() :
+    depth = 5000
+    tex = r'\a{'*depth+'x'+'}'*depth
+    res = tex_to_word(tex)
+    for _ in range(depth) :
+        cmd, = res
+        assert cmd.name == r'\a'
+        res = cmd.arg1
+    assert res == [Text('x')]
+
+def test_many_commands() :
+    # the depth of the result does not grow with the number of commands, so
+    # it can be pickled and compared
+    tex = bench_parser.make_tex(100000,cmd_every=10,comment_every=50)
+    res = tex_to_word(tex)
+    assert bench_parser.depth(res) == 3
+    assert pickle.loads(pickle.dumps(res)) == res
+    assert len(repr(res)) > len(tex)
+
+def test_bench_parser() :
+    results = bench_parser.run([100,1000],repeat=1,yacc_max=1000)
+    small, large = results['results']
+    assert 'yacc' in small and 'yacc' not in large
+    assert small['iterative']['depth'] == small['yacc']['depth'] == 3
@@ -0,0 +1,90 @@
+import os
+import random
+import sys
+
+import docx
+
+sys.path.insert(0,os.path.join(os.path.dirname(__file__),'..','benchmarks'))
+import bench_tokenizer
+import corpus
+from conftest import SAMPLE_TEX
+from overleaf2word import tex_to_word, tokenize
+import tokenizer
+
+FIELDS = ('type','value','lexpos','lineno','command','opts','args',
+          'post_opts','rest')
+
+def fields(toks) :
+    return [tuple(getattr(t,_,None) for _ in FIELDS) for t in toks]
+
+def assert_same_tokens(tex) :
+    assert fields(tokenize(tex,'scan')) == fields(tokenize(tex,'ply')), tex
+
+def test_same_tokens_as_ply(tmp_path) :
+    assert_same_tokens(SAMPLE_TEX)
+    tex_fn = corpus.make_corpus(str(tmp_path),paragraphs=50,images=1,
+        image_size=(10,10))
+    with open(tex_fn) as f :
+        assert_same_tokens(f.read())
+
+    alphabet = ['a','bc','\\','\\\\','\\textbf{x}','\\textit{','\\cmd','*',
+        '[',']','{','}','$','%',' ','  ','\n','\t','\\%','\\$']
+    rnd = random.Random(0)
+    for _ in range(3000) :
+        assert_same_tokens(''.join(rnd.choice(alphabet)
+                                   for _ in range(rnd.randint(0,20))))
+
+def test_value_can_be_replaced() :
+    tok, = tokenize(r'50\%','scan')
+    tok.value = tok.value.replace(r'\%','%')
+    assert tok.value == '50%'
+
+def test_tex_to_word_scan(tmp_path) :
+    d = str(tmp_path)
+    tex_fn = corpus.make_corpus(d,paragraphs=20,bib_entries=10,images=0)
+    paragraphs = []
+    for tokenizer in ('ply','scan') :
+        tex_to_word(tex_fn,d,os.path.join(d,'refs.bib'),tokenizer=tokenizer)
+        doc = docx.Document(os.path.join(d,'main.docx'))
+        paragraphs.append([(p.style.name,p.text) for p in doc.paragraphs])
+    assert paragraphs[0] == paragraphs[1]
+
+def test_default_is_scan() :
+    # the words of its tokens are not copied out of the source
+    tok, = tokenize('word')
+    assert isinstance(tok,tokenizer.Token) and tok.src == 'word'
+
+def test_bench_tokenizer() :
+    results = bench_tokenizer.run([5],repeat=1)
+    res, = results['results']
+    assert res['ply']['tokens'] == res['scan']['tokens'] > 0
+
+def test_tokenize_stream() :
+    rnd = random.Random(1)
+    alphabet = ['a','bc','\\','\\\\','\\textbf{x}','\\cmd[o]{a}\n','$x$',
+        '%c\n',' ',' ',' ','\n','\\%','\\$']
+    for _ in range(500) :
+        tex = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0,100)))
+        toks = tokenize(tex,'ply')
+        if any(len(_.value) >= 20 for _ in toks) :
+            # longer tokens than the lookahead may be split
+            continue
+        size = rnd.randint(1,50)
+        chunks = [tex[i:i+size] for i in range(0,len(tex),size)]
+        assert fields(tokenizer.tokenize_stream(chunks,lookahead=20)) == \
+            fields(toks), tex
+
+def test_tex_to_word_stream(tmp_path,monkeypatch) :
+    # small chunks so the document is read in many pieces
+    monkeypatch.setattr(tokenizer,'CHUNK_SIZE',512)
+    monkeypatch.setattr(tokenizer,'LOOKAHEAD',128)
+    d = str(tmp_path)
+    tex_fn = corpus.make_corpus(d,paragraphs=30,bib_entries=10,images=1,
+        image_size=(20,20))
+    docs = []
+    for stream in (False,True) :
+        tex_to_word(tex_fn,d,os.path.join(d,'refs.bib'),stream=stream)
+        doc = docx.Document(os.path.join(d,'main.docx'))
+        docs.append(([(p.style.name,p.text) for p in doc.paragraphs],
+                     len(doc.inline_shapes)))
+    assert docs[0] == docs[1]
@@ -1,4 +1,5 @@
 from collections import namedtuple
+import os
 from ply import lex, yacc
 
 tokens = ('CMD',
@@ -63,7 +64,12 @@ def p_expression_newline(p):
 def p_expression_cmd(p):
     '''expression : command
                   | command expression'''
-    p[0] = [p[1]]+p[2:]
+    # what follows is a sibling, not nested under the command, so the depth
+    # of the tree does not grow with the number of commands
+    if len(p) == 2 :
+        p[0] = [p[1]]
+    else :
+        p[0] = [p[1]]+p[2]
 
 def p_expression_comment(p):
     '''expression : COMMENT
@@ -71,7 +77,7 @@ def p_expression_comment(p):
     if len(p) == 2 :
         p[0] = [Comment(p[1])]
     else :
-        p[0] = [Comment(p[1])]+p[2:]
+        p[0] = [Comment(p[1])]+p[2]
 
 def p_command_noarg(p):
     'command : CMD'
@@ -96,12 +102,160 @@ def p_error(p) :
     print('parsing error:')
     print(p)
 
-lexer = lex.lex()
-parser = yacc.yacc()
+# lexer and parser tables are prebuilt in tex2word_lextab.py and
+# tex2word_parsetab.py next to this file. delete them after changing the
+# grammar and they are written again on next import
+_here = os.path.dirname(os.path.abspath(__file__))
+lexer = lex.lex(optimize=1,lextab='tex2word_lextab',outputdir=_here)
+parser = yacc.yacc(optimize=1,debug=False,tabmodule='tex2word_parsetab',
+    outputdir=_here
+)
+
+# where a command is in its rules above. ARG1, OPT, ... mean that argument
+# is being parsed, AFTER_ARG1, ... that it was closed
+(CMD, ARG1, AFTER_ARG1, OPT, AFTER_OPT, OPTARG, ARG2, OPT2, AFTER_OPT2,
+ ARG3) = range(10)
+
+# command state -> token -> (state, closing literal of the argument opened)
+_OPEN = {
+    CMD:{'{':(ARG1,'}'),'[':(OPT,']')},
+    AFTER_ARG1:{'{':(ARG2,'}'),'[':(OPT2,']')},
+    AFTER_OPT:{'{':(OPTARG,'}')},
+    AFTER_OPT2:{'{':(ARG3,'}')},
+}
+# command state -> state once the argument is closed, None if that was the
+# last argument the command can have
+_CLOSED = {ARG1:AFTER_ARG1,OPT:AFTER_OPT,OPT2:AFTER_OPT2,
+           OPTARG:None,ARG2:None,ARG3:None}
+
+class _Frame(object) :
+    '''The expression being parsed at one level, the whole text or the {} or
+    [] argument of a command, plus the command it is in the middle of'''
+    __slots__ = ('close','items','state','name','args')
+
+    def __init__(self,close=None) :
+        self.close = close
+        self.items = []
+        self.state = None
+        self.name = None
+        self.args = []
+
+    def add(self,item) :
+        self.items.append(item)
+
+    def finish(self) :
+        '''Add the command being parsed with the arguments it got'''
+        name, args, state = self.name, self.args, self.state
+        if state == CMD :
+            cmd = Command(name,None,None,None)
+        elif state == AFTER_ARG1 :
+            cmd = Command(name,args[0],None,None)
+        elif state in (OPTARG,AFTER_OPT2) :
+            # AFTER_OPT2 is p_command_argopt
+            cmd = Command(name,args[1],None,args[0])
+        elif state == ARG2 :
+            cmd = Command(name,args[0],args[1],None)
+        else : # ARG3
+            cmd = Command(name,args[0],args[2],args[1])
+        self.state = None
+        self.args = []
+        self.add(cmd)
+
+    def shift(self,tok) :
+        '''Add *tok* to the expression, returns the frame of the argument it
+        opens if any, False if it is a syntax error'''
+        t = tok.type
+        if self.state is not None :
+            opened = _OPEN.get(self.state,{}).get(t)
+            if opened is not None :
+                self.state = opened[0]
+                return _Frame(opened[1])
+            if self.state == AFTER_OPT :
+                return False
+            # the command is done, tok comes after it
+            self.finish()
+        if t == 'WORD' :
+            self.add(Text(tok.value))
+        elif t == '\n' or t == 'MANUALNEWLINE' :
+            self.add(Newline())
+        elif t == 'COMMENT' :
+            self.add(Comment(tok.value))
+        elif t == 'CMD' :
+            self.state = CMD
+            self.name = tok.value
+        else :
+            return False
+
+    def done(self) :
+        '''Return whether the expression can end here, finishing the command
+        it is in'''
+        if self.state == AFTER_OPT :
+            return False
+        if self.state is not None :
+            self.finish()
+        return bool(self.items)
+
+def parse(tex) :
+    '''Parse *tex* into the same tree the yacc grammar builds, in one pass
+    over the tokens with an explicit stack of the open {} and [] arguments.
+
+    Syntax errors are recovered from the way ply does without error rules:
+    what was parsed so far and the bad token are thrown away and parsing
+    starts over after it. None is returned if the end of the text is reached
+    in the middle of an expression.'''
+    lexer_ = lexer.clone()
+    lexer_.input(tex)
+
+    stack = [_Frame()]
+    # like ply, errors are only reported again once 3 tokens were shifted
+    errorcount = 0
+    for tok in iter(lexer_.token,None) :
+        frame = stack[-1]
+        if tok.type == frame.close and frame.done() :
+            stack.pop()
+            parent = stack[-1]
+            parent.args.append(frame.items)
+            after = _CLOSED[parent.state]
+            if after is None :
+                parent.finish()
+            else :
+                parent.state = after
+            ok = True
+        else :
+            ok = frame.shift(tok)
+            if ok :
+                stack.append(ok)
+            ok = ok is not False
+        if ok :
+            if errorcount :
+                errorcount -= 1
+            continue
+
+        if errorcount == 0 :
+            p_error(tok)
+        errorcount = 3
+        stack = [_Frame()]
+
+    if len(stack) == 1 and stack[0].done() :
+        return stack[0].items
+    if errorcount == 0 :
+        p_error(None)
+    return None
+
+def parse_yacc(tex) :
+    '''Parse *tex* with the yacc grammar above. Its rules are right recursive
+    and copy the list at every step, so this is quadratic in the length of
+    the text, it is kept to check :func:`parse` against.'''
+    return parser.parse(tex)
 
-def tex_to_word(tex) :
+ENGINES = {'iterative':parse,'yacc':parse_yacc}
 
-    result = parser.parse(tex.strip())
+def tex_to_word(tex,engine='iterative') :
+    '''Parse *tex* into a list of Text, Newline, Comment and Command tuples
+    with the parser *engine*, one of ENGINES. The list is flat, only the
+    arguments of a command are nested lists, so the depth of the result is
+    the nesting of the {} and [] arguments in *tex*.'''
+    result = ENGINES[engine](tex.strip())
     return result
 
     #while True :
@@ -0,0 +1,10 @@
+# tex2word_lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('CMD', 'COLSPEC', 'COMMENT', 'MANUALNEWLINE', 'WORD'))
+_lexreflags   = 64
+_lexliterals  = '{}[],\n'
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_WORD>(?<!\\\\)[a-zA-Z0-9|:!&]+|\\\\%)|(?P<t_CMD>\\\\(?P<cmd>[a-zA-Z0-9]+))|(?P<t_COMMENT>[%].*)|(?P<t_COLSPEC>[lcr])|(?P<t_MANUALNEWLINE>\\\\\\\\)', [None, (None, 'WORD'), (None, 'CMD'), None, (None, 'COMMENT'), (None, 'COLSPEC'), (None, 'MANUALNEWLINE')])]}
+_lexstateignore = {'INITIAL': ' \t'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
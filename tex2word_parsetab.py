@@ -0,0 +1,46 @@
+
+# tex2word_parsetab.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = "CMD COLSPEC COMMENT MANUALNEWLINE WORDexpression : WORD\n                  | WORD expressionexpression : '\\n'\n                   | '\\n' expression\n                   | MANUALNEWLINE\n                   | MANUALNEWLINE expression\n                  expression : command\n                  | command expressionexpression : COMMENT\n                  | COMMENT expressioncommand : CMDcommand : CMD '{' expression '}'command : CMD '[' expression ']' '{' expression '}'command : CMD '{' expression '}' '[' expression ']'command : CMD '{' expression '}' '{' expression '}'command : CMD '{' expression '}' '[' expression ']' '{' expression '}'"
+    
+_lr_action_items = {'WORD':([0,2,3,4,5,6,7,13,14,17,19,20,21,25,26,27,28,30,],[2,2,2,2,2,2,-11,2,2,-12,2,2,2,-15,-14,-13,2,-16,]),'\n':([0,2,3,4,5,6,7,13,14,17,19,20,21,25,26,27,28,30,],[3,3,3,3,3,3,-11,3,3,-12,3,3,3,-15,-14,-13,3,-16,]),'MANUALNEWLINE':([0,2,3,4,5,6,7,13,14,17,19,20,21,25,26,27,28,30,],[4,4,4,4,4,4,-11,4,4,-12,4,4,4,-15,-14,-13,4,-16,]),'COMMENT':([0,2,3,4,5,6,7,13,14,17,19,20,21,25,26,27,28,30,],[6,6,6,6,6,6,-11,6,6,-12,6,6,6,-15,-14,-13,6,-16,]),'CMD':([0,2,3,4,5,6,7,13,14,17,19,20,21,25,26,27,28,30,],[7,7,7,7,7,7,-11,7,7,-12,7,7,7,-15,-14,-13,7,-16,]),'$end':([1,2,3,4,5,6,7,8,9,10,11,12,17,25,26,27,30,],[0,-1,-3,-5,-7,-9,-11,-2,-4,-6,-8,-10,-12,-15,-14,-13,-16,]),'}':([2,3,4,5,6,7,8,9,10,11,12,15,17,22,24,25,26,27,29,30,],[-1,-3,-5,-7,-9,-11,-2,-4,-6,-8,-10,17,-12,25,27,-15,-14,-13,30,-16,]),']':([2,3,4,5,6,7,8,9,10,11,12,16,17,23,25,26,27,30,],[-1,-3,-5,-7,-9,-11,-2,-4,-6,-8,-10,18,-12,26,-15,-14,-13,-16,]),'{':([7,17,18,26,],[13,19,21,28,]),'[':([7,17,],[14,20,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'expression':([0,2,3,4,5,6,13,14,19,20,21,28,],[1,8,9,10,11,12,15,16,22,23,24,29,]),'command':([0,2,3,4,5,6,13,14,19,20,21,28,],[5,5,5,5,5,5,5,5,5,5,5,5,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> expression","S'",1,None,None,None),
+  ('expression -> WORD','expression',1,'p_expression_word','tex2word.py',46),
+  ('expression -> WORD expression','expression',2,'p_expression_word','tex2word.py',47),
+  ('expression -> \n','expression',1,'p_expression_newline','tex2word.py',54),
+  ('expression -> \n expression','expression',2,'p_expression_newline','tex2word.py',55),
+  ('expression -> MANUALNEWLINE','expression',1,'p_expression_newline','tex2word.py',56),
+  ('expression -> MANUALNEWLINE expression','expression',2,'p_expression_newline','tex2word.py',57),
+  ('expression -> command','expression',1,'p_expression_cmd','tex2word.py',65),
+  ('expression -> command expression','expression',2,'p_expression_cmd','tex2word.py',66),
+  ('expression -> COMMENT','expression',1,'p_expression_comment','tex2word.py',70),
+  ('expression -> COMMENT expression','expression',2,'p_expression_comment','tex2word.py',71),
+  ('command -> CMD','command',1,'p_command_noarg','tex2word.py',78),
+  ('command -> CMD { expression }','command',4,'p_command_onearg','tex2word.py',81),
+  ('command -> CMD [ expression ] { expression }','command',7,'p_command_optarg','tex2word.py',84),
+  ('command -> CMD { expression } [ expression ]','command',7,'p_command_argopt','tex2word.py',87),
+  ('command -> CMD { expression } { expression }','command',7,'p_command_twoarg','tex2word.py',90),
+  ('command -> CMD { expression } [ expression ] { expression }','command',10,'p_command_argoptarg','tex2word.py',93),
+]
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+'''A faster tokenizer for the LaTeX read by overleaf2word.
+
+:func:`tokenize` yields the same tokens as the ply lexer in overleaf2word,
+same types, values, positions and command fields, in one forward scan over
+the source that looks at the first character of each token, instead of ply
+trying its rule regexes one after the other at every position. Tokens only
+hold offsets into the source, their value and command fields are sliced out
+when they are asked for.'''
+import re
+
+# the command rules of overleaf2word, with plain groups for the fields
+_TEXTFMT_RE = re.compile(r'\\(text(?:bf|it))\{([^}]*)\}')
+_COMMAND_RE = re.compile(
+    r'\\([a-zA-Z]+\*?)(?:\[([^]]+)\])?(?:{([^}]+)})?(\[[^]]+\])?(.*)'
+)
+# size of the chunks streamed input is read in, and how far past a token
+# the text has to have been read before the token is yielded. tokens longer
+# than LOOKAHEAD characters may come out differently when streaming
+CHUNK_SIZE = 1<<20
+LOOKAHEAD = 1<<16
+
+# (start,end) of no group, like the spans of the groups that did not match
+_NO_SPAN = (-1,-1)
+# characters other tokens than WORD can start with
+_SPECIAL = frozenset('\\$%')
+_SPECIAL_RE = re.compile(r'[\\$%]')
+
+class Token(object) :
+    '''A token of *src* from offset *start* to *end*. *spans* are the offsets
+    of the command, opts, args, post_opts and rest fields of a COMMAND, or
+    the command and args of a TEXTFMT. *base* is the offset of *src* in the
+    whole text when it is tokenized a chunk at a time.'''
+    __slots__ = ('type','src','start','end','lineno','spans','base','_value')
+
+    def __init__(self,type,src,start,end,lineno,spans=(),base=0) :
+        self.type = type
+        self.src = src
+        self.start = start
+        self.end = end
+        self.lineno = lineno
+        self.spans = spans
+        self.base = base
+        self._value = None
+
+    @property
+    def value(self) :
+        if self._value is None :
+            return self.src[self.start:self.end]
+        return self._value
+
+    @value.setter
+    def value(self,value) :
+        self._value = value
+
+    @property
+    def lexpos(self) :
+        return self.base+self.start
+
+    def _field(self,i) :
+        start, end = self.spans[i] if i < len(self.spans) else _NO_SPAN
+        if start < 0 :
+            return None
+        return self.src[start:end]
+
+    @property
+    def command(self) :
+        return self._field(0)
+
+    @property
+    def opts(self) :
+        return self._field(1) if self.type == 'COMMAND' else None
+
+    @property
+    def args(self) :
+        return self._field(2 if self.type == 'COMMAND' else 1)
+
+    @property
+    def post_opts(self) :
+        return self._field(3) if self.type == 'COMMAND' else None
+
+    @property
+    def rest(self) :
+        return self._field(4) if self.type == 'COMMAND' else None
+
+    def __repr__(self) :
+        return 'Token({},{!r},{},{})'.format(self.type,self.value,
+            self.lineno,self.lexpos
+        )
+
+def tokenize(src,lineno=1,pos=0,base=0) :
+    '''Yield the Tokens of the string *src* from offset *pos* on. At each
+    position the token ply would match is worked out from the first
+    character, trying the rules in the same order: TEXTFMT, COMMAND, NEWLINE,
+    MANUALNEWLINE, EQUATION, COMMENT and WORD. Spaces are skipped. Runs of
+    plain words, the bulk of most documents, are split off in one go.'''
+    n = len(src)
+    find = src.find
+    p = pos
+    # the next space, newline, $ and \, $ or % at or after p. they are only
+    # looked for again once p has moved past them so every character is only
+    # scanned once
+    sp = nl = dollar = special = -1
+    while p < n :
+        c = src[p]
+        if c == ' ' :
+            p += 1
+            continue
+        if c == '\n' :
+            yield Token('NEWLINE',src,p,p+1,lineno,(),base)
+            lineno += 1
+            p += 1
+            continue
+
+        if nl < p :
+            nl = find('\n',p)
+            if nl < 0 :
+                nl = n
+
+        if c in _SPECIAL :
+            tok = None
+            if c == '\\' :
+                m = _TEXTFMT_RE.match(src,p)
+                if m is not None :
+                    tok = Token('TEXTFMT',src,p,m.end(),lineno,m.regs[1:3],
+                        base)
+                else :
+                    m = _COMMAND_RE.match(src,p)
+                    if m is not None :
+                        tok = Token('COMMAND',src,p,m.end(),lineno,m.regs[1:6],
+                            base)
+                    elif src.startswith('\\\\',p) :
+                        tok = Token('MANUALNEWLINE',src,p,p+2,lineno,(),base)
+                        # the ply rule counts it as two lines
+                        lineno += 2
+            elif c == '$' :
+                if dollar <= p :
+                    dollar = find('$',p+1)
+                    if dollar < 0 :
+                        dollar = n
+                if dollar < n and dollar > p+1 and (p == 0 or src[p-1] != '\\') :
+                    tok = Token('EQUATION',src,p,dollar+1,lineno,(),base)
+            elif p == 0 or src[p-1] != '\\' :
+                tok = Token('COMMENT',src,p,nl,lineno,(),base)
+            if tok is not None :
+                yield tok
+                p = tok.end
+                continue
+            start = p
+        else :
+            # split the plain words up to the next character that may start
+            # another token
+            if special < p :
+                m = _SPECIAL_RE.search(src,p)
+                special = m.start() if m is not None else n
+            end = special if special < nl else nl
+            words = src[p:end].split(' ')
+            last = words.pop()
+            for word in words :
+                if word :
+                    yield Token('WORD',src,p,p+len(word),lineno,(),base)
+                p += len(word)+1
+            if not last :
+                continue
+            if end == nl :
+                yield Token('WORD',src,p,end,lineno,(),base)
+                p = end
+                continue
+            # the special character is in the middle of this word
+            start = p
+
+        # a word, up to the next space or newline
+        if sp < p :
+            sp = find(' ',p)
+            if sp < 0 :
+                sp = n
+        end = sp if sp < nl else nl
+        yield Token('WORD',src,start,end,lineno,(),base)
+        p = end
+
+def _next_lineno(tok) :
+    # the line tokenize carries on at after tok
+    if tok.type == 'NEWLINE' :
+        return tok.lineno+1
+    if tok.type == 'MANUALNEWLINE' :
+        return tok.lineno+2
+    return tok.lineno
+
+def read_chunks(f,size=None) :
+    '''Yield the contents of the open file *f* *size* characters at a time,
+    CHUNK_SIZE by default'''
+    size = size or CHUNK_SIZE
+    return iter(lambda: f.read(size),f.read(0))
+
+def tokenize_stream(chunks,lookahead=None) :
+    '''Yield the Tokens of the text made of the strings *chunks*, e.g. from
+    :func:`read_chunks`, while holding only the current chunk plus about
+    *lookahead* characters of it in memory. A token is only yielded once
+    the text has been read *lookahead* characters past its start, so the
+    tokens are the same :func:`tokenize` gives for the whole text as long as
+    none of them is longer than that, LOOKAHEAD by default.'''
+    lookahead = lookahead or LOOKAHEAD
+    buf = ''
+    # where tokenizing carries on in buf, the line it is on, and the offset
+    # of buf in the whole text
+    pos, lineno, base = 0, 1, 0
+    for chunk in chunks :
+        # keep the character before pos around for the lookbehinds
+        keep = max(pos-1,0)
+        buf = buf[keep:]+chunk
+        pos -= keep
+        base += keep
+        safe = len(buf)-lookahead
+        if pos >= safe :
+            continue
+        tok = None
+        for tok in tokenize(buf,lineno,pos,base) :
+            if tok.start >= safe :
+                pos, lineno = tok.start, tok.lineno
+                break
+            yield tok
+        else :
+            # only spaces left, if anything
+            pos = len(buf)
+            if tok is not None :
+                lineno = _next_lineno(tok)
+    for tok in tokenize(buf,lineno,pos,base) :
+        yield tok